@@ -0,0 +1,353 @@
+"""
+PDF Highlighter 2.0 - Command Line Interface
+Last Updated: 2026-10-19 11:08:03 UTC
+Author: 5446-boop
+
+Headless entry points that run without a display. With --metrics-file
+(or PDF_HIGHLIGHTER_METRICS) a command writes its metrics to that file,
+in the Prometheus text format or as JSON if the name ends in .json.
+With --fields (or PDF_HIGHLIGHTER_FIELDS) the fields of a page, its
+invoice and delivery number among them, are found by the specs in that
+JSON file instead of the built-in ones.
+
+Usage:
+    python -m src.cli watch <folder> [--workers N] [--interval S] [--once]
+    python -m src.cli serve [--port P] [--workers N]
+    python -m src.cli search <pdf>... --query Q [--pages 1-10,15]
+    python -m src.cli export <pdf>... -o <out.csv|out.jsonl> [--query Q] [--pages 1-10,15] [--skip-duplicates]
+    python -m src.cli duplicates <pdf>... [--cache-dir D]
+    python -m src.cli optimize <pdf>...
+    python -m src.cli split <pdf>... -o <folder> [--workers N]
+    python -m src.cli loadtest <endpoint> '<json body>' [--requests N] [--concurrency C]
+    python -m src.cli memprofile [--sizes 25,100,400] [--bound-kb N] [--no-render]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+def run_watch(args) -> int:
+    """Index PDFs dropped into a folder until interrupted."""
+    from .utils.folder_watcher import FolderWatcher
+
+    watcher = FolderWatcher(
+        args.folder,
+        cache_dir=args.cache_dir,
+        workers=args.workers,
+        interval=args.interval,
+        recursive=args.recursive
+    )
+    try:
+        stats = watcher.run(once=args.once)
+    except KeyboardInterrupt:
+        watcher.stop()
+        stats = watcher.stats
+    print(f"Indexed {stats.summary()}")
+    return 1 if stats.failures else 0
+
+def parse_pages(spec: str) -> List[int]:
+    """1-based page numbers from a list of pages and ranges like "1-10,15"."""
+    pages = []
+    for part in spec.split(","):
+        first, _, last = part.strip().partition("-")
+        try:
+            start = int(first)
+            end = int(last) if last else start
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Invalid page range: {part!r}")
+        pages.extend(range(start, end + 1))
+    return pages
+
+def run_search(args) -> int:
+    """Print search results as pages match, one line per page."""
+    from .utils.pdf_handler import PDFHandler, PDFError
+
+    found = 0
+    for filepath in args.pdf:
+        handler = PDFHandler()
+        try:
+            handler.load_document(filepath, background_index=False)
+            for result in handler.iter_search(args.query, args.pages, memoize=False):
+                found += 1
+                print(f"{filepath}:{result.page_num}: {result.total_matches} matches, "
+                      f"invoice {result.invoice_number or '-'}, delivery {result.delivery_number or '-'}",
+                      flush=True)
+        except PDFError as e:
+            logger.error(str(e))
+            return 1
+        finally:
+            handler.close()
+    return 0 if found else 1
+
+def run_export(args) -> int:
+    """Export search results, or every page's numbers, to CSV or JSONL."""
+    from .utils.pdf_handler import PDFHandler, PDFError
+    from .utils.fingerprint import DuplicateTracker
+    from .utils.result_export import ResultWriter, export_number_map, export_search
+
+    duplicates = DuplicateTracker() if args.skip_duplicates else None
+    with ResultWriter(args.output, args.format) as writer:
+        for filepath in args.pdf:
+            handler = PDFHandler()
+            try:
+                handler.load_document(filepath, background_index=False)
+                if args.query:
+                    export_search([handler], args.query, writer, pages=args.pages, duplicates=duplicates)
+                else:
+                    export_number_map(handler, writer, duplicates=duplicates)
+            except PDFError as e:
+                logger.error(str(e))
+                return 1
+            finally:
+                handler.close()
+    print(f"Wrote {writer.rows} rows to {args.output}")
+    if duplicates is not None:
+        print(f"Skipped {duplicates.summary()}")
+    return 0
+
+def run_duplicates(args) -> int:
+    """List the files and pages whose content appeared earlier in the list."""
+    from .utils.fingerprint import DuplicateTracker
+    from .utils.index_store import IndexStore
+    from .utils.pdf_handler import PDFHandler, PDFError
+
+    duplicates = DuplicateTracker()
+    store = IndexStore(args.cache_dir)
+    for filepath in args.pdf:
+        handler = PDFHandler(store)
+        try:
+            handler.load_document(filepath, background_index=False)
+            handler.build_index()  # Stores the page fingerprints for the next run
+            fingerprint = handler.file_fingerprint()
+            if fingerprint is None or duplicates.check_file(filepath, fingerprint) is None:
+                for page_idx in range(len(handler.doc)):
+                    duplicates.check_page(filepath, page_idx + 1, handler.page_fingerprint(page_idx))
+        except PDFError as e:
+            logger.error(str(e))
+            return 1
+        finally:
+            handler.close()
+    for duplicate in duplicates.duplicates:
+        print(duplicate.describe())
+    print(f"Found {duplicates.summary()}")
+    return 0
+
+def run_optimize(args) -> int:
+    """Rewrite PDFs compactly, with any edits left in their journals."""
+    from .utils.pdf_handler import PDFHandler, PDFError
+
+    failed = 0
+    for filepath in args.pdf:
+        handler = PDFHandler()
+        try:
+            handler.load_document(filepath, background_index=False)
+            if handler.save(optimize=True):
+                print(handler.last_save_report.summary())
+            else:
+                logger.error(f"Failed to optimize {filepath}")
+                failed += 1
+        except PDFError as e:
+            logger.error(str(e))
+            failed += 1
+        finally:
+            handler.close()
+    return 1 if failed else 0
+
+def run_split(args) -> int:
+    """Split PDFs into one file per invoice, each with a manifest."""
+    from .utils.invoice_split import split_by_invoice
+    from .utils.pdf_handler import PDFError
+
+    failed = 0
+    for filepath in args.pdf:
+        output_dir = args.output
+        if len(args.pdf) > 1:
+            output_dir = os.path.join(args.output, os.path.splitext(os.path.basename(filepath))[0])
+        try:
+            report = split_by_invoice(filepath, output_dir, workers=args.workers, cache_dir=args.cache_dir)
+        except PDFError as e:
+            logger.error(str(e))
+            failed += 1
+            continue
+        print(report.summary())
+        failed += len(report.failed)
+    return 1 if failed else 0
+
+def run_serve(args) -> int:
+    """Serve the local HTTP/JSON document API until interrupted."""
+    from .utils.doc_service import DocumentService
+
+    service = DocumentService(
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        max_open=args.max_open,
+        cache_dir=args.cache_dir
+    )
+    try:
+        asyncio.run(service.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+def run_loadtest(args) -> int:
+    """Measure throughput and latency of a running document service."""
+    from .utils.load_test import run_load_test
+
+    try:
+        body = json.loads(args.body)
+    except ValueError as e:
+        print(f"Invalid JSON body: {e}")
+        return 2
+    endpoint = args.endpoint if args.endpoint.startswith("/") else f"/{args.endpoint}"
+    report = asyncio.run(run_load_test(
+        endpoint, body,
+        host=args.host,
+        port=args.port,
+        requests=args.requests,
+        concurrency=args.concurrency
+    ))
+    print(report.summary())
+    return 1 if report.errors else 0
+
+def parse_sizes(spec: str) -> List[int]:
+    """Page counts from a comma-separated list like "50,200,800"."""
+    try:
+        sizes = [int(part) for part in spec.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid page counts: {spec!r}")
+    if len(sizes) < 2 or min(sizes) < 1:
+        raise argparse.ArgumentTypeError("Give at least two page counts of 1 or more")
+    return sizes
+
+def run_memprofile(args) -> int:
+    """Profile memory per stage on synthetic documents and check its growth."""
+    from .utils.memory_profile import DEFAULT_BOUND_KB_PER_PAGE, DEFAULT_SIZES, profile_memory
+
+    report = profile_memory(
+        args.sizes or DEFAULT_SIZES,
+        args.bound_kb if args.bound_kb is not None else DEFAULT_BOUND_KB_PER_PAGE,
+        render=not args.no_render,
+        workdir=args.workdir
+    )
+    print(report.summary())
+    return 1 if report.violations() else 0
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="pdf_highlighter", description="PDF Highlighter 2.0 headless tools")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log debug messages")
+    parser.add_argument("--metrics-file", default=None,
+                        help="write metrics to this file (.prom or .json) periodically and on exit")
+    parser.add_argument("--metrics-interval", type=float, default=60.0,
+                        help="seconds between metrics writes")
+    parser.add_argument("--fields", default=None,
+                        help="JSON file of field specs to extract instead of the built-in ones")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    watch = commands.add_parser("watch", help="pre-index PDFs arriving in a folder")
+    watch.add_argument("folder", help="folder to watch")
+    watch.add_argument("--workers", type=int, default=None, help="worker processes (default: CPUs - 1)")
+    watch.add_argument("--interval", type=float, default=2.0, help="seconds between folder scans")
+    watch.add_argument("--cache-dir", default=None, help="index cache directory")
+    watch.add_argument("--recursive", action="store_true", help="also watch subfolders")
+    watch.add_argument("--once", action="store_true", help="index the current contents and exit")
+    watch.set_defaults(func=run_watch)
+
+    search = commands.add_parser("search", help="print the pages matching a query as they are found")
+    search.add_argument("pdf", nargs="+", help="PDF files to search")
+    search.add_argument("--query", required=True, help="search text")
+    search.add_argument("--pages", type=parse_pages, default=None, help="pages to search, e.g. 1-10,15")
+    search.set_defaults(func=run_search)
+
+    export = commands.add_parser("export", help="export search results or page numbers")
+    export.add_argument("pdf", nargs="+", help="PDF files to export from")
+    export.add_argument("-o", "--output", required=True, help="output file")
+    export.add_argument("--query", default=None, help="search text (default: every page's numbers)")
+    export.add_argument("--pages", type=parse_pages, default=None, help="pages to search, e.g. 1-10,15")
+    export.add_argument("--format", choices=["csv", "jsonl"], default=None,
+                        help="output format (default: from the output file name)")
+    export.add_argument("--skip-duplicates", action="store_true",
+                        help="leave out files and pages whose content was exported before")
+    export.set_defaults(func=run_export)
+
+    duplicates = commands.add_parser("duplicates", help="report duplicate files and pages")
+    duplicates.add_argument("pdf", nargs="+", help="PDF files to compare, first occurrences first")
+    duplicates.add_argument("--cache-dir", default=None, help="index cache directory")
+    duplicates.set_defaults(func=run_duplicates)
+
+    optimize = commands.add_parser("optimize", help="rewrite PDFs compactly")
+    optimize.add_argument("pdf", nargs="+", help="PDF files to optimize in place")
+    optimize.set_defaults(func=run_optimize)
+
+    split = commands.add_parser("split", help="write one PDF per invoice")
+    split.add_argument("pdf", nargs="+", help="PDF files to split")
+    split.add_argument("-o", "--output", required=True,
+                       help="output folder (one subfolder per PDF when given several)")
+    split.add_argument("--workers", type=int, default=None, help="worker processes (default: CPUs - 1)")
+    split.add_argument("--cache-dir", default=None, help="index cache directory")
+    split.set_defaults(func=run_split)
+
+    serve = commands.add_parser("serve", help="serve the local HTTP/JSON document API")
+    serve.add_argument("--host", default="127.0.0.1", help="address to listen on (local only by default)")
+    serve.add_argument("--port", type=int, default=8765, help="port to listen on")
+    serve.add_argument("--workers", type=int, default=None, help="worker processes (default: CPUs - 1)")
+    serve.add_argument("--max-open", type=int, default=8, help="documents kept open per worker")
+    serve.add_argument("--cache-dir", default=None, help="index cache directory")
+    serve.set_defaults(func=run_serve)
+
+    loadtest = commands.add_parser("loadtest", help="load-test a running document service")
+    loadtest.add_argument("endpoint", help="endpoint to call, e.g. /search")
+    loadtest.add_argument("body", help="JSON request body")
+    loadtest.add_argument("--host", default="127.0.0.1")
+    loadtest.add_argument("--port", type=int, default=8765)
+    loadtest.add_argument("--requests", type=int, default=1000, help="total requests")
+    loadtest.add_argument("--concurrency", type=int, default=16, help="concurrent connections")
+    loadtest.set_defaults(func=run_loadtest)
+
+    memprofile = commands.add_parser("memprofile", help="profile memory use on synthetic documents")
+    memprofile.add_argument("--sizes", type=parse_sizes, default=None,
+                            help="page counts to profile (default: 25,100,400)")
+    memprofile.add_argument("--bound-kb", type=float, default=None,
+                            help="fail when a stage grows more KB per page than this")
+    memprofile.add_argument("--no-render", action="store_true", help="skip the page rendering stage")
+    memprofile.add_argument("--workdir", default=None, help="keep the synthetic documents in this folder")
+    memprofile.set_defaults(func=run_memprofile)
+
+    return parser
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.fields:
+        from .utils.field_extraction import FIELDS_ENV, load_field_specs
+        try:
+            load_field_specs(args.fields)
+        except (OSError, ValueError, TypeError) as e:
+            parser.error(f"Cannot read field specs from {args.fields}: {e}")
+        # Through the environment, so that worker processes use them too
+        os.environ[FIELDS_ENV] = os.path.abspath(args.fields)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format='[%(asctime)s UTC][%(levelname)s][%(name)s]: %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    from .utils.metrics import MetricsExporter, exporter_from_env
+
+    if args.metrics_file:
+        exporter = MetricsExporter(args.metrics_file, args.metrics_interval).start()
+    else:
+        exporter = exporter_from_env()
+    try:
+        return args.func(args)
+    finally:
+        if exporter is not None:
+            exporter.stop()
+
+if __name__ == "__main__":
+    sys.exit(main())
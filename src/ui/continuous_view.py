@@ -0,0 +1,416 @@
+"""
+PDF Highlighter 2.0 - Continuous Scroll View
+Last Updated: 2026-10-19 11:10:25 UTC
+Author: 5446-boop
+"""
+
+import bisect
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from PyQt5.QtCore import QObject, QThread, QRect, QTimer
+
+from .qt_imports import QWidget, QImage, QPainter, QColor, QSize, Qt, pyqtSignal
+from .page_canvas import rendered_page_to_qimage, paint_search_hits
+from ..utils.page_render import render_page
+from ..utils.render_service import RenderService
+from ..utils.mupdf_lock import MUPDF_LOCK
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+    logging.error("PyMuPDF not installed. Please install with: pip install PyMuPDF")
+
+logger = logging.getLogger(__name__)
+
+PAGE_SPACING = 10  # Pixels between pages
+RENDER_MARGIN = 2  # Pages rendered ahead of and behind the viewport
+MAX_CACHED_PAGES = 24  # Upper bound on rendered pages kept in memory
+
+def read_page_sizes(doc) -> List[Tuple[float, float]]:
+    """Get the size of every page in points without loading the pages."""
+    sizes = []
+    with MUPDF_LOCK:
+        for page_idx in range(len(doc)):
+            rect = doc.page_cropbox(page_idx)
+            width, height = rect.width, rect.height
+            try:
+                rotate = doc.xref_get_key(doc.page_xref(page_idx), "Rotate")
+                if rotate[0] == "int" and int(rotate[1]) % 180:
+                    width, height = height, width
+            except Exception:
+                pass
+            sizes.append((width, height))
+    return sizes
+
+class ContinuousLayout:
+    """Vertical layout of page slots computed from page sizes alone."""
+
+    def __init__(self, page_sizes: List[Tuple[float, float]], zoom: float):
+        self.page_sizes = page_sizes
+        self.zoom = zoom
+        self.tops: List[int] = []
+        self.width = 0
+        self.height = 0
+        self._compute()
+
+    def _compute(self):
+        y = PAGE_SPACING
+        self.tops = []
+        for width, height in self.page_sizes:
+            self.tops.append(y)
+            y += int(height * self.zoom) + PAGE_SPACING
+            self.width = max(self.width, int(width * self.zoom))
+        self.height = y
+        self.width += 2 * PAGE_SPACING
+
+    def page_rect(self, page_idx: int, view_width: int) -> QRect:
+        """Rectangle of a page slot, centered horizontally."""
+        width, height = self.page_sizes[page_idx]
+        width, height = int(width * self.zoom), int(height * self.zoom)
+        x = max(PAGE_SPACING, (view_width - width) // 2)
+        return QRect(x, self.tops[page_idx], width, height)
+
+    def page_at(self, y: int) -> int:
+        """Index of the page slot at the given y position, or the gap above it."""
+        return max(0, bisect.bisect_right(self.tops, y + PAGE_SPACING) - 1)
+
+    def visible_pages(self, top: int, bottom: int) -> range:
+        """Indexes of the pages intersecting the range [top, bottom]."""
+        if not self.tops:
+            return range(0)
+        return range(self.page_at(top), self.page_at(bottom) + 1)
+
+class PageRenderThread(QThread):
+    """Background renderer that works through the most recent page request.
+
+    Each request replaces the previous one, so pages that scrolled out of
+    view before their turn are never rendered.
+    """
+
+    page_rendered = pyqtSignal(int, float, object)  # page index, zoom, RenderedPage
+
+    def __init__(self, filepath: str, parent=None):
+        super().__init__(parent)
+        self.filepath = filepath
+        self._condition = threading.Condition()
+        self._queue: List[int] = []
+        self._zoom = 1.0
+        self._stopping = False
+
+    def request(self, page_indexes: List[int], zoom: float):
+        """Replace the queue of pages to render."""
+        with self._condition:
+            self._queue = list(page_indexes)
+            self._zoom = zoom
+            self._condition.notify()
+
+    def stop(self):
+        """Stop the thread and wait for it to finish."""
+        with self._condition:
+            self._stopping = True
+            self._queue = []
+            self._condition.notify()
+        self.wait()
+
+    def run(self):
+        """Render queued pages with a document of this thread's own."""
+        try:
+            with MUPDF_LOCK:
+                doc = fitz.open(self.filepath)
+        except Exception as e:
+            logger.error(f"Render thread could not open document: {e}")
+            return
+
+        try:
+            while True:
+                with self._condition:
+                    while not self._queue and not self._stopping:
+                        self._condition.wait()
+                    if self._stopping:
+                        break
+                    page_idx = self._queue.pop(0)
+                    zoom = self._zoom
+                try:
+                    with MUPDF_LOCK:
+                        rendered = render_page(doc[page_idx], zoom)
+                    self.page_rendered.emit(page_idx, zoom, rendered)
+                except Exception as e:
+                    logger.warning(f"Error rendering page {page_idx + 1}: {e}")
+        finally:
+            with MUPDF_LOCK:
+                doc.close()
+
+class SharedPageRenderer(QObject):
+    """Renders pages in a RenderService's worker processes.
+
+    Works like PageRenderThread: each request replaces the previous one.
+    At most one page per worker is in flight, so pages that scrolled out
+    of view before their turn are never sent to a worker. Rendered pages
+    arrive in shared memory and are wrapped without copying.
+    """
+
+    page_rendered = pyqtSignal(int, float, object)  # page index, zoom, RenderedPage
+    _finished = pyqtSignal(int, float, object)  # page index, zoom, future
+
+    def __init__(self, service: RenderService, filepath: str, parent=None):
+        super().__init__(parent)
+        self.service = service
+        self.filepath = filepath
+        self._queue: List[int] = []
+        self._zoom = 1.0
+        self._in_flight: Dict[Tuple[int, float], object] = {}  # (page index, zoom) -> future
+        self._stopping = False
+        # Futures finish on the service's collector thread; handle them on ours
+        self._finished.connect(self._on_finished)
+
+    def request(self, page_indexes: List[int], zoom: float):
+        """Replace the queue of pages to render."""
+        self._queue = list(page_indexes)
+        self._zoom = zoom
+        self._submit_next()
+
+    def _submit_next(self):
+        while self._queue and len(self._in_flight) < self.service.workers and not self._stopping:
+            key = (self._queue.pop(0), self._zoom)
+            if key in self._in_flight:
+                continue
+            future = self.service.submit(self.filepath, *key)
+            self._in_flight[key] = future
+            future.add_done_callback(lambda done, key=key: self._finished.emit(key[0], key[1], done))
+
+    def _on_finished(self, page_idx: int, zoom: float, future):
+        self._in_flight.pop((page_idx, zoom), None)
+        if self._stopping or future.cancelled():
+            return
+        try:
+            self.page_rendered.emit(page_idx, zoom, future.result())
+        except Exception as e:
+            logger.warning(f"Error rendering page {page_idx + 1}: {e}")
+        self._submit_next()
+
+    def stop(self):
+        """Drop queued pages and results still to come."""
+        self._stopping = True
+        self._queue = []
+        for future in list(self._in_flight.values()):
+            future.cancel()
+        self._in_flight.clear()
+
+class ContinuousCanvas(QWidget):
+    """All pages of a document stacked vertically, rendered on demand."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.layout_info: Optional[ContinuousLayout] = None
+        self.images: Dict[int, QImage] = {}  # page index -> rendered image
+        self.image_zoom = None
+        self.hits: Dict[int, Sequence[Tuple[float, float, float, float]]] = {}  # page index -> bboxes
+        self.current_hit: Optional[Tuple[int, int]] = None  # page index, hit index
+
+    def set_layout(self, layout_info: ContinuousLayout):
+        """Replace the page layout, dropping renders at other zoom levels."""
+        self.layout_info = layout_info
+        if self.image_zoom != layout_info.zoom:
+            self.images.clear()
+            self.image_zoom = layout_info.zoom
+        self.updateGeometry()
+        self.update()
+
+    def set_image(self, page_idx: int, image: QImage):
+        """Store a rendered page and repaint its slot."""
+        self.images[page_idx] = image
+        if self.layout_info:
+            self.update(self.layout_info.page_rect(page_idx, self.width()))
+
+    def set_hits(self, hits: Dict[int, Sequence[Tuple[float, float, float, float]]],
+                 current: Optional[Tuple[int, int]] = None):
+        """Set the search hits painted over the pages, in PDF points."""
+        self.hits = hits
+        self.current_hit = current
+        self.update()
+
+    def evict(self, keep: range):
+        """Drop rendered pages outside the given range."""
+        for page_idx in [idx for idx in self.images if idx not in keep]:
+            del self.images[page_idx]
+
+    def cache_size(self) -> int:
+        """Bytes of the rendered pages kept."""
+        return sum(image.sizeInBytes() for image in self.images.values())
+
+    def sizeHint(self) -> QSize:
+        """Size of the whole stacked document."""
+        if self.layout_info is None:
+            return QSize(0, 0)
+        return QSize(self.layout_info.width, self.layout_info.height)
+
+    def minimumSizeHint(self) -> QSize:
+        """Pages are laid out at full size, so the view needs all of it."""
+        return self.sizeHint()
+
+    def paintEvent(self, event):
+        """Paint rendered pages, and placeholders for the rest."""
+        if self.layout_info is None:
+            return
+
+        clip = event.rect()
+        painter = QPainter(self)
+        try:
+            for page_idx in self.layout_info.visible_pages(clip.top(), clip.bottom()):
+                rect = self.layout_info.page_rect(page_idx, self.width())
+                image = self.images.get(page_idx)
+                if image is not None:
+                    painter.drawImage(rect, image)
+                else:
+                    painter.fillRect(rect, QColor(235, 235, 235))
+                    painter.setPen(QColor(150, 150, 150))
+                    painter.drawText(rect, Qt.AlignCenter, f"Page {page_idx + 1}")
+                if page_idx in self.hits:
+                    current = None
+                    if self.current_hit and self.current_hit[0] == page_idx:
+                        current = self.current_hit[1]
+                    paint_search_hits(painter, self.hits[page_idx], self.layout_info.zoom,
+                                      rect.x(), rect.y(), current)
+        finally:
+            painter.end()
+
+class ContinuousPageController:
+    """Keeps a ContinuousCanvas in sync with its scroll area's viewport."""
+
+    def __init__(self, scroll_area, canvas: ContinuousCanvas,
+                 margin: int = RENDER_MARGIN, max_cached: int = MAX_CACHED_PAGES):
+        self.scroll_area = scroll_area
+        self.canvas = canvas
+        self.margin = margin
+        self.max_cached = max_cached
+        self.page_sizes: List[Tuple[float, float]] = []
+        self.render_service: Optional[RenderService] = None  # Render in-process if None
+        self.render_thread = None  # PageRenderThread or SharedPageRenderer
+        self.handler = None  # PDFHandler whose unsaved pages are rendered from memory, if set
+        self.scroll_area.verticalScrollBar().valueChanged.connect(self.update_viewport)
+
+    def load_document(self, doc, filepath: str, zoom: float):
+        """Lay out the document and start rendering it."""
+        self.stop()
+        self.page_sizes = read_page_sizes(doc)
+        if self.render_service is not None and self.render_service.available:
+            self.render_thread = SharedPageRenderer(self.render_service, filepath)
+        else:
+            self.render_thread = PageRenderThread(filepath)
+            self.render_thread.start(QThread.LowPriority)
+        self.render_thread.page_rendered.connect(self.on_page_rendered)
+        self.set_zoom(zoom)
+
+    def set_zoom(self, zoom: float):
+        """Re-layout the pages at a new zoom level."""
+        if not self.page_sizes:
+            return
+        self.canvas.set_layout(ContinuousLayout(self.page_sizes, zoom))
+        self.update_viewport()
+
+    def visible_range(self) -> range:
+        """Pages currently intersecting the viewport."""
+        layout_info = self.canvas.layout_info
+        if layout_info is None:
+            return range(0)
+        top = self.scroll_area.verticalScrollBar().value()
+        bottom = top + self.scroll_area.viewport().height()
+        return layout_info.visible_pages(top, bottom)
+
+    def current_page(self) -> int:
+        """Index of the topmost visible page."""
+        visible = self.visible_range()
+        return visible.start if visible else 0
+
+    def scroll_to_page(self, page_idx: int):
+        """Scroll so that the given page is at the top of the viewport."""
+        if self.canvas.layout_info is None:
+            return
+        top = self.canvas.layout_info.tops[page_idx] - PAGE_SPACING
+        scroll_bar = self.scroll_area.verticalScrollBar()
+        if top > scroll_bar.maximum():
+            # The scroll area has not caught up with a new layout yet
+            QTimer.singleShot(0, lambda: scroll_bar.setValue(top))
+        scroll_bar.setValue(top)
+
+    def ensure_visible(self, page_idx: int, bbox: Tuple[float, float, float, float]):
+        """Scroll so that a bbox on the given page is in view."""
+        layout_info = self.canvas.layout_info
+        if layout_info is None:
+            return
+        rect = layout_info.page_rect(page_idx, self.canvas.width())
+        x = rect.x() + int((bbox[0] + bbox[2]) / 2 * layout_info.zoom)
+        y = rect.y() + int((bbox[1] + bbox[3]) / 2 * layout_info.zoom)
+        self.scroll_area.ensureVisible(x, y, 50, 100)
+
+    def update_viewport(self, *_):
+        """Render what is in view, and evict what is far out of it."""
+        if self.render_thread is None or self.canvas.layout_info is None:
+            return
+
+        visible = self.visible_range()
+        if not visible:
+            return
+
+        keep = range(max(0, visible.start - self.margin),
+                     min(len(self.page_sizes), visible.stop + self.margin))
+        if len(keep) > self.max_cached:
+            keep = range(visible.start, min(visible.stop, visible.start + self.max_cached))
+        self.canvas.evict(keep)
+
+        # Visible pages first, then the margins nearest the viewport
+        wanted = [idx for idx in visible if idx in keep]
+        wanted += [idx for idx in keep if idx not in visible]
+        missing = [idx for idx in wanted if idx not in self.canvas.images]
+        if self.handler is not None:
+            # The render thread reads the file, which lacks the unsaved edits
+            unsaved = self.handler.unsaved_pages()
+            for page_idx in [idx for idx in missing if idx in unsaved]:
+                rendered = self.handler.render_unsaved_page(page_idx, self.canvas.layout_info.zoom)
+                if rendered is not None:
+                    self.canvas.set_image(page_idx, rendered_page_to_qimage(rendered))
+                    missing.remove(page_idx)
+        self.render_thread.request(missing, self.canvas.layout_info.zoom)
+
+    def trim_cache(self, needed: int) -> int:
+        """Drop rendered pages out of view, farthest first, until `needed` bytes are freed.
+
+        Visible pages are kept. Returns the number of bytes freed.
+        """
+        visible = self.visible_range()
+        center = (visible.start + visible.stop) / 2
+        freed = 0
+        for page_idx in sorted(self.canvas.images, key=lambda idx: -abs(idx + 0.5 - center)):
+            if freed >= needed:
+                break
+            if page_idx not in visible:
+                freed += self.canvas.images.pop(page_idx).sizeInBytes()
+        return freed
+
+    def on_page_rendered(self, page_idx: int, zoom: float, rendered):
+        """Accept a render from the thread if it is still wanted."""
+        layout_info = self.canvas.layout_info
+        if layout_info is None or zoom != layout_info.zoom:
+            return
+        visible = self.visible_range()
+        if page_idx < visible.start - self.margin or page_idx >= visible.stop + self.margin:
+            return
+        if self.handler is not None and page_idx in self.handler.unsaved_pages():
+            return  # Rendered from the file before the page was edited
+        self.canvas.set_image(page_idx, rendered_page_to_qimage(rendered))
+
+    def refresh_page(self, page_idx: int):
+        """Render a page again after it was edited in memory."""
+        self.canvas.images.pop(page_idx, None)
+        self.update_viewport()
+
+    def stop(self):
+        """Stop rendering and release all rendered pages."""
+        if self.render_thread is not None:
+            self.render_thread.page_rendered.disconnect(self.on_page_rendered)
+            self.render_thread.stop()
+            self.render_thread = None
+        self.canvas.images.clear()
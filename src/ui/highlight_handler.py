@@ -1,13 +1,13 @@
 """
 PDF Highlighter 2.0 - Highlight Handler
-Last Updated: 2025-02-24 18:22:24 UTC
+Last Updated: 2026-10-19 11:10:25 UTC
 Author: 5446-boop
 """
 
 import logging
 import traceback
-from PyQt5.QtCore import Qt
 from PyQt5.QtWidgets import QMessageBox
+from ..utils.edit_journal import OP_HIGHLIGHT
 from ..utils.pdf_handler import PDFError
 
 logger = logging.getLogger(__name__)
@@ -16,33 +16,50 @@ class HighlightHandler:
     def __init__(self, main_window):
         self.main_window = main_window
 
+    def optimizing(self) -> bool:
+        """Check for a running optimization, which edits would have to wait for."""
+        if self.main_window.optimize_future is not None:
+            self.main_window.statusBar().showMessage("Optimizing, try again when it is done", 5000)
+            return True
+        return False
+
+    def handler_for_row(self, row):
+        """PDF handler of the document a result row belongs to."""
+        filepath = self.main_window.results_table.result_filepath(row)
+        return self.main_window.workspace.handler_for(filepath) or self.main_window.pdf_handler
+
+    def refresh_view(self, handler, page_num: int):
+        """Show an edit in the viewer if it is on the document shown."""
+        if handler.filepath and handler.filepath == self.main_window.pdf_view.filepath:
+            self.main_window.pdf_view.refresh_page(page_num - 1)
+
     def add_highlight(self, row, text):
         """Add highlights to all instances of text on the specified page."""
+        if self.optimizing():
+            return
         try:
-            page_item = self.main_window.results_table.item(row, 0)
-            color_item = self.main_window.results_table.item(row, 4)
-            
-            if not page_item or not color_item:
-                logger.warning(f"Missing items - page_item: {bool(page_item)}, color_item: {bool(color_item)}")
+            results = self.main_window.results_table.store
+            if not 0 <= row < len(results):
+                logger.warning(f"No result in row {row}")
                 return
                 
-            page_num = int(page_item.text().split('/')[0])
-            bboxes = page_item.data(Qt.UserRole)
+            page_num = results.page_nums[row]
             
-            if not color_item.data(Qt.UserRole + 1):  # If not already highlighted
+            if row not in results.highlight_colors:  # If not already highlighted
                 logger.debug(f"Adding highlights on page {page_num} for '{text}'")
-                xrefs = self.main_window.pdf_handler.highlight_text(
+                handler = self.handler_for_row(row)
+                recorded = handler.highlight_text(
                     page_num, 
-                    bboxes, 
+                    results.bboxes(row).tolist(), 
                     self.main_window.color_picker.get_color(), 
                     text
                 )
-                if xrefs:
-                    self.main_window.results_table.update_highlight_status(
-                        color_item, 
-                        True, 
+                if recorded:
+                    self.main_window.results_table.set_highlight(
+                        row, 
                         self.main_window.color_picker.get_color()
                     )
+                    self.refresh_view(handler, page_num)
                     self.main_window.search_handler.refresh_search_results()
                     
         except Exception as e:
@@ -50,23 +67,25 @@ class HighlightHandler:
 
     def remove_highlight(self, row):
         """Remove all highlights from the specified page."""
+        if self.optimizing():
+            return
         try:
             logger.debug(f"Attempting to remove highlights for row {row}")
             
-            page_item = self.main_window.results_table.item(row, 0)
-            color_item = self.main_window.results_table.item(row, 4)
-            
-            if not page_item or not color_item:
-                logger.warning(f"Missing items - page_item: {bool(page_item)}, color_item: {bool(color_item)}")
+            results = self.main_window.results_table.store
+            if not 0 <= row < len(results):
+                logger.warning(f"No result in row {row}")
                 return
             
             # Get the page number and search text
-            page_num = int(page_item.text().split('/')[0])
+            page_num = results.page_nums[row]
             text = self.main_window.search_input.text().strip()
             
             logger.debug(f"Removing highlights for text '{text}' on page {page_num}")
-            if self.main_window.pdf_handler.remove_highlight_by_text(page_num, text):
-                self.main_window.results_table.update_highlight_status(color_item, False)
+            handler = self.handler_for_row(row)
+            if handler.remove_highlight_by_text(page_num, text):
+                self.main_window.results_table.set_highlight(row, None)
+                self.refresh_view(handler, page_num)
                 logger.info(f"Successfully removed highlights from page {page_num}")
                 self.main_window.search_handler.refresh_search_results()
             else:
@@ -75,16 +94,63 @@ class HighlightHandler:
         except Exception as e:
             logger.error(f"Error removing highlights: {traceback.format_exc()}")
 
+    def undo_edit(self):
+        """Take back the last unsaved highlight edit of the active document."""
+        self._step_edit(undo=True)
+
+    def redo_edit(self):
+        """Apply the last highlight edit taken back again."""
+        self._step_edit(undo=False)
+
+    def _step_edit(self, undo: bool):
+        if self.optimizing():
+            return
+        try:
+            handler = self.main_window.pdf_handler
+            if not (handler.can_undo() if undo else handler.can_redo()):
+                self.main_window.statusBar().showMessage(
+                    "Nothing to undo" if undo else "Nothing to redo", 3000)
+                return
+            entry = handler.undo() if undo else handler.redo()
+            if entry is None:
+                self.main_window.statusBar().showMessage(
+                    "Could not undo the last edit" if undo else "Could not redo the last edit", 5000)
+                return
+
+            # Highlighted afterwards if a highlight was redone or a removal undone
+            highlighted = (entry.op == OP_HIGHLIGHT) != undo
+            if not highlighted:
+                color = None
+            elif entry.op == OP_HIGHLIGHT:
+                color = entry.color
+            else:
+                color = next((removed.color for removed in entry.removed if removed.color), (1, 1, 0))
+            results = self.main_window.results_table.store
+            for row in results.rows_for_file(handler.filepath):
+                if results.page_nums[row] == entry.page_num:
+                    self.main_window.results_table.set_highlight(row, color)
+
+            self.refresh_view(handler, entry.page_num)
+            action = "Undid" if undo else "Redid"
+            self.main_window.statusBar().showMessage(f"{action} {entry.op} on page {entry.page_num}", 3000)
+            self.main_window.search_handler.refresh_search_results()
+        except Exception as e:
+            logger.error(f"Error stepping through edits: {traceback.format_exc()}")
+
     def save_pdf(self):
         """Save PDF with highlights."""
-        if not self.main_window.pdf_handler.filepath:
+        if self.optimizing():
+            return
+        handlers = list(self.main_window.workspace.handlers.values())
+        if not handlers:
             self.main_window.show_error("Save Error", "No PDF file loaded")
             return
         
         reply = QMessageBox.question(
             self.main_window,
             'Save PDF',
-            'Do you want to overwrite the existing file?',
+            'Do you want to overwrite the existing file?' if len(handlers) == 1 else
+            f'Do you want to overwrite the {len(handlers)} open files?',
             QMessageBox.Yes | QMessageBox.Cancel,
             QMessageBox.Cancel
         )
@@ -92,10 +158,11 @@ class HighlightHandler:
         if reply == QMessageBox.Yes:
             try:
                 logger.debug("Saving PDF with highlights")
-                if self.main_window.pdf_handler.save():
-                    logger.info(f"Successfully saved PDF to: {self.main_window.pdf_handler.filepath}")
-                else:
-                    raise PDFError("Failed to save PDF")
+                for handler in handlers:
+                    if self.main_window.save_document(handler):
+                        logger.info(f"Successfully saved PDF to: {handler.filepath}")
+                    else:
+                        raise PDFError(f"Failed to save PDF: {handler.filepath}")
             except Exception as e:
                 self.main_window.show_error("Save Error", str(e))
                 logger.error(f"Error saving PDF: {e}")
\ No newline at end of file
@@ -1,23 +1,32 @@
 """
 PDF Highlighter 2.0 - Main Window
-Last Updated: 2025-02-23 11:38:03 UTC
+Last Updated: 2026-10-19 11:10:25 UTC
 Author: 5446-boop
 """
 
+import os
 import sys
 import logging
+import threading
 import traceback
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout,
     QLabel, QPushButton, QLineEdit,
     QTextEdit, QFileDialog, QSplitter,
     QMessageBox, QMenuBar, QMenu, QAction,
-    QCheckBox
+    QCheckBox, QInputDialog
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 
 from ..utils.log_handler import QtLogHandler
 from ..utils.pdf_handler import PDFHandler, PDFError
+from ..utils.workspace import Workspace
+from ..utils.render_service import RenderService
+from ..utils.metrics import exporter_from_env
+from ..utils.resource_budget import budget_from_env, CHECK_INTERVAL, POOL_RENDER, POOL_TEXT
+from ..utils.result_export import (
+    ResultWriter, export_search, export_number_map, FORMAT_CSV, FORMAT_JSONL
+)
 
 from .base_window import BaseWindow
 from .widgets.about_dialog import AboutDialog
@@ -32,10 +41,47 @@ class MainWindow(BaseWindow):
         super().__init__()
         try:
             self.setup_logging()
-            self.pdf_handler = PDFHandler()
+            self.workspace = Workspace()
+            self.render_service = RenderService()
             self.search_handler = SearchHandler(self)
             self.highlight_handler = HighlightHandler(self)
             self.setup_ui()
+            self.pdf_view.set_render_service(self.render_service)
+            
+            # Polls the background text indexer for the status bar
+            self.index_timer = QTimer(self)
+            self.index_timer.setInterval(250)
+            self.index_timer.timeout.connect(self.update_index_status)
+            
+            # Export running on the workspace's worker pool
+            self.export_future = None
+            self.export_path = None
+            self.export_cancel = threading.Event()
+            self.export_timer = QTimer(self)
+            self.export_timer.setInterval(250)
+            self.export_timer.timeout.connect(self.check_export)
+            
+            # Optimizing save running on the workspace's worker pool
+            self.optimize_future = None
+            self.optimize_handler = None
+            self.optimize_on_close = False
+            self.optimize_timer = QTimer(self)
+            self.optimize_timer.setInterval(250)
+            self.optimize_timer.timeout.connect(self.check_optimize)
+            
+            # Metrics file, if PDF_HIGHLIGHTER_METRICS names one
+            self.metrics_exporter = exporter_from_env()
+            
+            # One memory limit over the MuPDF store, rendered pages and text indexes
+            self.memory_budget = budget_from_env()
+            self.memory_budget.add_pool(POOL_RENDER, self.pdf_view.render_cache_size,
+                                        self.pdf_view.trim_render_cache)
+            self.memory_budget.add_pool(POOL_TEXT, self.workspace.text_index_size,
+                                        self.workspace.release_text_indexes)
+            self.memory_timer = QTimer(self)
+            self.memory_timer.setInterval(int(CHECK_INTERVAL * 1000))
+            self.memory_timer.timeout.connect(self.memory_budget.enforce)
+            self.memory_timer.start()
             logger.info("Application started")
         except Exception as e:
             error_msg = f"Error initializing MainWindow: {str(e)}\n\n{traceback.format_exc()}"
@@ -43,6 +89,11 @@ class MainWindow(BaseWindow):
             print("\nERROR:", error_msg)
             raise
 
+    @property
+    def pdf_handler(self) -> PDFHandler:
+        """Handler of the active document."""
+        return self.workspace.active_handler()
+
     def setup_logging(self):
         """Setup logging configuration."""
         root_logger = logging.getLogger()
@@ -112,33 +163,285 @@ class MainWindow(BaseWindow):
         about_dialog.exec_()
 
     def select_pdf(self):
-        """Handle PDF file selection."""
-        file_path, _ = QFileDialog.getOpenFileName(
+        """Handle PDF file selection, adding the files to the workspace."""
+        file_paths, _ = QFileDialog.getOpenFileNames(
             self,
-            "Select PDF File",
+            "Select PDF Files",
             "",
             "PDF Files (*.pdf);;All Files (*.*)"
         )
         
-        if file_path:
+        for file_path in file_paths:
             try:
-                if self.pdf_handler.load_document(file_path):
-                    self.path_label.setText(file_path)
-                    logger.info(f"Loaded PDF: {file_path}")
-                    self.results_table.setRowCount(0)
+                self.workspace.open_document(file_path)
+                logger.info(f"Loaded PDF: {file_path}")
             except PDFError as e:
                 self.show_error("PDF Error", str(e))
                 logger.error(f"Error loading PDF: {e}")
             except Exception as e:
                 self.show_error("Error", f"Unexpected error: {str(e)}")
                 logger.error(f"Unexpected error: {e}")
+        
+        if self.workspace.handler_for(self.workspace.active_path) and file_paths:
+            self.search_handler.clear_results()
+            self.activate_document(self.workspace.active_path)
+            self.index_timer.start()
+            self.update_index_status()
+
+    def activate_document(self, filepath):
+        """Make an open document the active one and show it in the viewer."""
+        if not self.workspace.set_active(filepath):
+            return
+        filepath = self.workspace.active_path
+        if self.pdf_view.filepath != filepath:
+            self.pdf_view.load_document(filepath, self.workspace.handler_for(filepath))
+        count = len(self.workspace)
+        self.path_label.setText(
+            filepath if count == 1 else f"{filepath} ({count} documents open)"
+        )
+
+    def page_count(self, filepath) -> int:
+        """Number of pages of an open document, 0 if it is not open."""
+        handler = self.workspace.handler_for(filepath)
+        return len(handler.doc) if handler and handler.doc else 0
+
+    def close_active_document(self):
+        """Close the active document, saving its pending edits."""
+        handler = self.pdf_handler
+        if not handler.filepath:
+            return
+        filepath = handler.filepath
+        self.cancel_export()
+        self.save_pending_edits(handler, closing=True)
+        self.pdf_view.close_document()
+        self.workspace.close_document(filepath)
+        self.search_handler.clear_results()
+        logger.info(f"Closed PDF: {filepath}")
+        if self.workspace.active_path:
+            self.activate_document(self.workspace.active_path)
+        else:
+            self.path_label.setText("No file selected")
+
+    def update_index_status(self):
+        """Show the progress of background text indexing."""
+        indexed = total = 0
+        for handler in self.workspace.handlers.values():
+            done, pages = handler.indexing_progress()
+            indexed += done
+            total += pages
+        if total and indexed < total:
+            self.statusBar().showMessage(f"Indexing text: {indexed}/{total} pages")
+        else:
+            self.index_timer.stop()
+            if total:
+                self.statusBar().showMessage(f"Text index ready ({total} pages)", 5000)
+
+    def export_results(self):
+        """Export the current search's results, or the active document's page numbers.
+
+        Rows are streamed to the file by a background worker.
+        """
+        if self.export_future is not None:
+            self.show_error("Export Error", "An export is already running")
+            return
+        if not len(self.workspace):
+            self.show_error("Export Error", "Please load a PDF file first")
+            return
+        
+        path, selected_filter = QFileDialog.getSaveFileName(
+            self,
+            "Export Results",
+            "",
+            "CSV Files (*.csv);;JSON Lines (*.jsonl)"
+        )
+        if not path:
+            return
+        fmt = FORMAT_JSONL if "jsonl" in selected_filter else FORMAT_CSV
+        if not os.path.splitext(path)[1]:
+            path += f".{fmt}"
+        
+        try:
+            writer = ResultWriter(path, fmt)
+        except (OSError, ValueError) as e:
+            self.show_error("Export Error", str(e))
+            return
+        
+        query = self.search_input.text().strip()
+        self.export_cancel.clear()
+        if query:
+            handlers = list(self.workspace.handlers.values())
+            job = lambda: export_search(handlers, query, writer, self.export_cancel)
+            logger.info(f"Exporting results for '{query}' to {path}")
+        else:
+            handler = self.pdf_handler
+            job = lambda: export_number_map(handler, writer, self.export_cancel)
+            logger.info(f"Exporting page numbers of {handler.filepath} to {path}")
+        
+        self.export_path = path
+        self.export_future = self.workspace.executor.submit(self._run_export, job, writer)
+        self.export_timer.start()
+        self.statusBar().showMessage(f"Exporting to {path}...")
+
+    @staticmethod
+    def _run_export(job, writer) -> int:
+        """Run an export job on a worker thread, closing its file afterwards."""
+        try:
+            return job()
+        finally:
+            writer.close()
+
+    def check_export(self):
+        """Report the outcome of a finished export."""
+        future = self.export_future
+        if future is None or not future.done():
+            return
+        self.export_timer.stop()
+        self.export_future = None
+        try:
+            rows = future.result()
+            self.statusBar().showMessage(f"Exported {rows} rows to {self.export_path}", 5000)
+        except Exception as e:
+            logger.error(f"Export failed: {traceback.format_exc()}")
+            self.show_error("Export Error", str(e))
+
+    def cancel_export(self):
+        """Stop a running export and wait for its worker to let go."""
+        if self.export_future is not None:
+            self.export_cancel.set()
+            try:
+                self.export_future.result()
+            except Exception:
+                pass
+            self.check_export()
+
+    def optimize_document(self):
+        """Rewrite the active PDF compactly, with its pending edits, in the background."""
+        if self.optimize_future is not None:
+            self.show_error("Optimize Error", "An optimization is already running")
+            return
+        handler = self.pdf_handler
+        if not handler.filepath:
+            self.show_error("Optimize Error", "No PDF file loaded")
+            return
+        
+        # The viewer lets go of the file but keeps showing the current page
+        if handler.filepath == self.pdf_view.filepath:
+            self.pdf_view.release_document()
+        self.optimize_handler = handler
+        self.optimize_future = self.workspace.executor.submit(handler.save, True)
+        self.optimize_timer.start()
+        self.statusBar().showMessage(f"Optimizing {handler.filepath}...")
+
+    def check_optimize(self):
+        """Reload the viewer and report the outcome of a finished optimization."""
+        future = self.optimize_future
+        if future is None or not future.done():
+            return
+        self.optimize_timer.stop()
+        handler = self.optimize_handler
+        self.optimize_future = None
+        self.optimize_handler = None
+        if handler.filepath and handler.filepath == self.pdf_view.filepath:
+            self.pdf_view.reload_document()
+        try:
+            if not future.result():
+                raise PDFError(f"Failed to optimize PDF: {self.pdf_view.filepath}")
+            report = handler.last_save_report
+            self.statusBar().showMessage(report.summary(), 10000)
+        except Exception as e:
+            logger.error(f"Optimization failed: {traceback.format_exc()}")
+            self.show_error("Optimize Error", str(e))
+
+    def wait_for_optimize(self):
+        """Let a running optimization finish."""
+        if self.optimize_future is not None:
+            try:
+                self.optimize_future.result()
+            except Exception:
+                pass
+            self.check_optimize()
+
+    def set_optimize_on_close(self, enabled: bool):
+        """Optimize edited documents when they are closed."""
+        self.optimize_on_close = enabled
+
+    def ask_optimize_after_edits(self):
+        """Ask after how many saved edits a save should optimize the file."""
+        edits, accepted = QInputDialog.getInt(
+            self,
+            "Optimize After Edits",
+            "Optimize when saving after this many edits (0 = never):",
+            self.workspace.optimize_after_edits, 0, 100000
+        )
+        if accepted:
+            self.workspace.set_optimize_after_edits(edits)
+
+    def ask_memory_budget(self):
+        """Ask for the memory limit of the MuPDF store, rendered pages and text indexes."""
+        limit_mb, accepted = QInputDialog.getInt(
+            self,
+            "Memory Budget",
+            "Memory for the MuPDF store, rendered pages and text indexes (MB):",
+            self.memory_budget.limit_mb, 64, 1024 * 1024
+        )
+        if accepted:
+            self.memory_budget.set_limit_mb(limit_mb)
+            self.memory_budget.enforce()
+
+    def show_memory_usage(self):
+        """Show what the memory budget covers holds now."""
+        QMessageBox.information(self, "Memory Usage", self.memory_budget.breakdown().summary())
+
+    def update_hit_label(self, current, total):
+        """Show the position of the current search hit."""
+        self.hit_label.setText(f"Match {current} of {total}" if total else "No matches")
+        self.prev_hit_btn.setEnabled(total > 1)
+        self.next_hit_btn.setEnabled(total > 1)
+
+    def save_document(self, handler=None, optimize: bool = False) -> bool:
+        """Save an open PDF (the active one by default) and refresh the viewer."""
+        handler = handler or self.pdf_handler
+        viewed = handler.filepath is not None and handler.filepath == self.pdf_view.filepath
+        
+        # The viewer must let go of the file before it can be replaced
+        if viewed:
+            self.pdf_view.release_document()
+        try:
+            return handler.save(optimize)
+        finally:
+            if viewed:
+                self.pdf_view.reload_document()
+
+    def save_pending_edits(self, handler=None, closing: bool = False):
+        """Write journaled highlight edits to one or all open PDFs.
+
+        When closing with optimize-on-close set, documents edited since
+        their last optimization are optimized too.
+        """
+        self.wait_for_optimize()
+        handlers = [handler] if handler else list(self.workspace.handlers.values())
+        for handler in handlers:
+            optimize = closing and self.optimize_on_close and (
+                handler.has_pending_edits() or handler.edits_since_optimize > 0
+            )
+            if handler.has_pending_edits() or optimize:
+                logger.info(f"Saving pending highlight edits to {handler.filepath}")
+                if not self.save_document(handler, optimize):
+                    logger.error("Failed to save pending edits; they remain in the journal")
 
     def closeEvent(self, event):
         """Handle window close event."""
         try:
             logger.debug("Closing application")
-            if self.pdf_handler:
-                self.pdf_handler.close()
+            self.memory_timer.stop()
+            self.search_handler.cancel_search()
+            self.cancel_export()
+            self.save_pending_edits(closing=True)
+            self.pdf_view.close_document()
+            self.render_service.shutdown()
+            self.workspace.close_all()
+            if self.metrics_exporter is not None:
+                self.metrics_exporter.stop()
             logger.info("Application closed successfully")
         except Exception as e:
             logger.error(f"Error during application shutdown: {e}")
@@ -0,0 +1,120 @@
+"""
+PDF Highlighter 2.0 - Page Canvas Widget
+Last Updated: 2026-10-19 09:38:18 UTC
+Author: 5446-boop
+"""
+
+import logging
+from typing import Optional, Sequence, Tuple
+
+from PyQt5.QtCore import QRectF
+
+from .qt_imports import QWidget, QImage, QPainter, QColor, QSize, Qt
+from ..utils.page_render import RenderedPage, FORMAT_RGBA8888
+from ..utils.bbox_ops import scale
+
+logger = logging.getLogger(__name__)
+
+_QIMAGE_FORMATS = {
+    FORMAT_RGBA8888: QImage.Format_RGBA8888,
+}
+
+HIT_COLOR = QColor(255, 235, 0, 90)  # Translucent yellow
+CURRENT_HIT_COLOR = QColor(255, 140, 0, 130)  # Translucent orange
+CURRENT_HIT_BORDER = QColor(220, 80, 0)
+
+def paint_search_hits(painter: QPainter, bboxes: Sequence[Tuple[float, float, float, float]],
+                      zoom: float, x: float = 0, y: float = 0,
+                      current: Optional[int] = None):
+    """Paint search hits over a page image drawn at (x, y).
+
+    bboxes may be any sequence, such as a view into a ResultStore; they
+    are mapped to widget coordinates in one batch.
+    """
+    rects = [QRectF(*rect) for rect in scale(bboxes, zoom, x, y)]
+    painter.save()
+    try:
+        painter.setPen(Qt.NoPen)
+        for index, rect in enumerate(rects):
+            if index != current:
+                painter.fillRect(rect, HIT_COLOR)
+        if current is not None and 0 <= current < len(rects):
+            rect = rects[current]
+            painter.fillRect(rect, CURRENT_HIT_COLOR)
+            painter.setPen(CURRENT_HIT_BORDER)
+            painter.drawRect(rect)
+    finally:
+        painter.restore()
+
+def rendered_page_to_qimage(rendered: RenderedPage) -> QImage:
+    """Wrap a rendered page's sample buffer in a QImage without copying it.
+
+    The QImage only borrows the buffer, so the RenderedPage (and with it
+    the pixmap) is attached to the image to keep it alive.
+    """
+    image = QImage(
+        rendered.samples,
+        rendered.width,
+        rendered.height,
+        rendered.stride,
+        _QIMAGE_FORMATS.get(rendered.format, QImage.Format_RGB888)
+    )
+    image._rendered_page = rendered
+    return image
+
+class PageCanvas(QWidget):
+    """Widget that paints a rendered page directly from its sample buffer."""
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rendered_page: Optional[RenderedPage] = None
+        self.image: Optional[QImage] = None
+        self.zoom = 1.0
+        self.hits: Sequence[Tuple[float, float, float, float]] = []
+        self.current_hit: Optional[int] = None
+
+    def set_page(self, rendered: Optional[RenderedPage], zoom: float = 1.0):
+        """Show a page rendered at the given zoom, or nothing if None."""
+        self.rendered_page = rendered
+        self.zoom = zoom
+        self.image = rendered_page_to_qimage(rendered) if rendered else None
+        self.updateGeometry()
+        self.update()
+
+    def set_hits(self, bboxes: Sequence[Tuple[float, float, float, float]],
+                 current: Optional[int] = None):
+        """Set the search hits painted over the page, in PDF points."""
+        self.hits = bboxes
+        self.current_hit = current
+        self.update()
+
+    def page_origin(self) -> Tuple[int, int]:
+        """Top-left corner of the page image within the widget."""
+        if self.image is None:
+            return 0, 0
+        return (max(0, (self.width() - self.image.width()) // 2),
+                max(0, (self.height() - self.image.height()) // 2))
+
+    def sizeHint(self) -> QSize:
+        """Size of the current page image."""
+        if self.image is None:
+            return QSize(0, 0)
+        return self.image.size()
+
+    def minimumSizeHint(self) -> QSize:
+        """The page is never drawn scaled, so it needs its full size."""
+        return self.sizeHint()
+
+    def paintEvent(self, event):
+        """Paint the page image centered in the widget."""
+        if self.image is None:
+            return
+
+        painter = QPainter(self)
+        try:
+            x, y = self.page_origin()
+            painter.drawImage(x, y, self.image)
+            if self.hits:
+                paint_search_hits(painter, self.hits, self.zoom, x, y, self.current_hit)
+        finally:
+            painter.end()
@@ -1,15 +1,21 @@
 """
 PDF Highlighter 2.0 - PDF View Widget
-Last Updated: 2025-02-22 21:23:20 UTC
+Last Updated: 2026-10-19 11:10:25 UTC
 """
 
 import logging
 from pathlib import Path
 
 from .qt_imports import (
-    QWidget, QVBoxLayout, QLabel, QScrollArea,
-    QRubberBand, QImage, QPixmap, Qt, pyqtSignal
+    QWidget, QVBoxLayout, QScrollArea,
+    QRubberBand, Qt, pyqtSignal
 )
+from .page_canvas import PageCanvas
+from .continuous_view import ContinuousCanvas, ContinuousPageController, SharedPageRenderer
+from ..utils.mupdf_lock import MUPDF_LOCK
+from ..utils.page_render import render_page
+from ..utils.render_service import RenderService
+from ..utils.result_store import HitIndex
 
 try:
     import fitz  # PyMuPDF
@@ -25,14 +31,26 @@ class PDFView(QWidget):
     # Define signals
     page_changed = pyqtSignal(int, int)  # current_page, total_pages
     zoom_changed = pyqtSignal(float)
+    hit_changed = pyqtSignal(int, int)  # current_hit (1-based, 0 if none), total_hits
     
     def __init__(self, parent=None):
         super().__init__(parent)
         
         # Initialize variables
         self.doc = None
+        self.filepath = None
+        self.handler = None  # PDFHandler whose unsaved edits are shown, if set
         self.current_page = 0
         self.zoom_level = 1.0
+        self.continuous = False
+        
+        # Worker processes rendering the current page, if set
+        self.render_service = None
+        self.page_renderer = None
+        
+        # Search hits as (page index, bbox in PDF points), painted as an overlay
+        self.search_hits = HitIndex()
+        self.current_hit = -1
         
         # Setup UI
         self.setup_ui()
@@ -47,68 +65,313 @@ class PDFView(QWidget):
         self.scroll_area.setWidgetResizable(True)
         self.scroll_area.setAlignment(Qt.AlignCenter)
         
-        # Create display label
-        self.display_label = QLabel()
-        self.display_label.setAlignment(Qt.AlignCenter)
-        self.scroll_area.setWidget(self.display_label)
+        # Create page canvas
+        self.page_canvas = PageCanvas()
+        self.scroll_area.setWidget(self.page_canvas)
+        
+        # Canvas for continuous scrolling, swapped in by set_continuous_mode
+        self.continuous_canvas = ContinuousCanvas()
+        self.continuous_controller = ContinuousPageController(
+            self.scroll_area, self.continuous_canvas
+        )
+        self.scroll_area.verticalScrollBar().valueChanged.connect(self.on_scroll)
         
         layout.addWidget(self.scroll_area)
         
-    def load_document(self, filepath: str) -> bool:
-        """Load a PDF document."""
+    def set_render_service(self, service: RenderService):
+        """Render pages in a RenderService's worker processes from now on."""
+        self.render_service = service
+        self.continuous_controller.render_service = service
+        
+    def _start_page_renderer(self):
+        self._stop_page_renderer()
+        if self.render_service is not None and self.render_service.available and self.filepath:
+            self.page_renderer = SharedPageRenderer(self.render_service, self.filepath)
+            self.page_renderer.page_rendered.connect(self.on_page_rendered)
+        
+    def _stop_page_renderer(self):
+        if self.page_renderer is not None:
+            self.page_renderer.page_rendered.disconnect(self.on_page_rendered)
+            self.page_renderer.stop()
+            self.page_renderer = None
+        
+    def load_document(self, filepath: str, handler=None) -> bool:
+        """Load a PDF document.
+
+        Pages the handler has edited in memory since its last save are
+        rendered from its document; the rest from the file.
+        """
         if fitz is None:
             logger.error("PyMuPDF is not installed")
             return False
             
         try:
-            self.doc = fitz.open(filepath)
+            self.continuous_controller.stop()
+            with MUPDF_LOCK:
+                self.doc = fitz.open(filepath)
+            self.filepath = filepath
+            self.handler = handler
+            self.continuous_controller.handler = handler
             self.current_page = 0
-            self.update_view()
+            self._start_page_renderer()
+            self.clear_search_hits()
+            if self.continuous:
+                self.continuous_controller.load_document(self.doc, filepath, self.zoom_level)
+            else:
+                self.update_view()
             self.page_changed.emit(1, len(self.doc))
             return True
         except Exception as e:
             logger.error(f"Error loading document: {e}")
             return False
             
+    def release_document(self):
+        """Close the file, e.g. so it can be replaced, keeping the view state."""
+        self.continuous_controller.stop()
+        self._stop_page_renderer()
+        if self.doc:
+            with MUPDF_LOCK:
+                self.doc.close()
+        self.doc = None
+        if self.render_service is not None and self.filepath:
+            self.render_service.release(self.filepath)
+        
+    def close_document(self):
+        """Stop background rendering and close the document."""
+        self.release_document()
+        self.filepath = None
+        self.handler = None
+        self.continuous_controller.handler = None
+        self.current_page = 0
+        self.page_canvas.set_page(None)
+        self.clear_search_hits()
+        
+    def reload_document(self):
+        """Reopen the document from disk, keeping the page and search hits."""
+        if not self.filepath:
+            return
+        filepath, page = self.filepath, self.current_page
+        hits, current_hit = self.search_hits, self.current_hit
+        if self.load_document(filepath, self.handler):
+            self.search_hits = hits
+            self.current_hit = current_hit
+            self.go_to_page(page)
+            self.update_hit_overlay()
+            if hits:
+                self.hit_changed.emit(current_hit + 1, len(hits))
+        
+    def render_cache_size(self) -> int:
+        """Bytes of rendered pages kept by the view."""
+        image = self.page_canvas.image
+        return self.continuous_canvas.cache_size() + (image.sizeInBytes() if image is not None else 0)
+
+    def trim_render_cache(self, needed: int) -> int:
+        """Drop rendered pages out of view until `needed` bytes are freed; returns bytes freed."""
+        freed = 0
+        if self.continuous and self.page_canvas.image is not None:
+            # The single page canvas is hidden while scrolling continuously
+            freed = self.page_canvas.image.sizeInBytes()
+            self.page_canvas.set_page(None)
+        return freed + self.continuous_controller.trim_cache(needed - freed)
+
+    def set_continuous_mode(self, enabled: bool):
+        """Switch between single-page and continuous vertical scrolling."""
+        if enabled == self.continuous:
+            return
+        
+        page = self.current_page
+        self.continuous = enabled
+        self.scroll_area.takeWidget()
+        if enabled:
+            self.scroll_area.setWidget(self.continuous_canvas)
+            if self.doc:
+                self.continuous_controller.load_document(
+                    self.doc, self.filepath, self.zoom_level
+                )
+                self.current_page = page
+                self.continuous_controller.scroll_to_page(page)
+            self.update_hit_overlay()
+        else:
+            self.continuous_controller.stop()
+            self.scroll_area.setWidget(self.page_canvas)
+            self.update_view()
+    
+    def on_scroll(self, value: int):
+        """Track the topmost visible page while scrolling continuously."""
+        if not self.continuous or not self.doc:
+            return
+        page = self.continuous_controller.current_page()
+        if page != self.current_page:
+            self.current_page = page
+            self.page_changed.emit(self.current_page + 1, len(self.doc))
+    
     def update_view(self):
         """Update the current page view."""
         if not self.doc:
             return
+        
+        if self.continuous:
+            page = self.current_page
+            self.continuous_controller.set_zoom(self.zoom_level)
+            self.continuous_controller.scroll_to_page(page)
+            return
             
         try:
-            # Get current page
-            page = self.doc[self.current_page]
-            
-            # Create matrix for zoom
-            matrix = fitz.Matrix(self.zoom_level, self.zoom_level)
-            
-            # Get page pixmap
-            pix = page.get_pixmap(matrix=matrix)
-            
-            # Convert to QImage
-            img = QImage(pix.samples, pix.width, pix.height,
-                        pix.stride, QImage.Format_RGB888)
-            
-            # Convert to QPixmap and display
-            pixmap = QPixmap.fromImage(img)
-            self.display_label.setPixmap(pixmap)
+            rendered = None
+            if self.handler is not None:
+                rendered = self.handler.render_unsaved_page(self.current_page, self.zoom_level)
+            if rendered is None:
+                if self.page_renderer is not None and self.render_service.available:
+                    # Keep showing the previous page until the workers deliver this one
+                    self.page_renderer.request([self.current_page], self.zoom_level)
+                    return
+                # Render the current page at the zoom level and paint straight from the samples
+                with MUPDF_LOCK:
+                    rendered = render_page(self.doc[self.current_page], self.zoom_level)
+            self.page_canvas.set_page(rendered, self.zoom_level)
+            self.update_hit_overlay()
             
         except Exception as e:
             logger.error(f"Error updating view: {e}")
     
+    def on_page_rendered(self, page_idx: int, zoom: float, rendered):
+        """Show a page rendered by the workers if it is still the one wanted."""
+        if self.continuous or page_idx != self.current_page or zoom != self.zoom_level:
+            return
+        if self.handler is not None and page_idx in self.handler.unsaved_pages():
+            return  # Rendered from the file before the page was edited
+        self.page_canvas.set_page(rendered, zoom)
+        self.update_hit_overlay()
+        if 0 <= self.current_hit < len(self.search_hits):
+            hit_page, bbox = self.search_hits[self.current_hit]
+            if hit_page == page_idx:
+                self.ensure_hit_visible(bbox)
+    
+    def refresh_page(self, page_idx: int):
+        """Show a page again after the handler edited it in memory."""
+        if not self.doc:
+            return
+        if self.continuous:
+            self.continuous_controller.refresh_page(page_idx)
+        elif page_idx == self.current_page:
+            self.update_view()
+    
     def next_page(self):
         """Go to next page."""
         if self.doc and self.current_page < len(self.doc) - 1:
-            self.current_page += 1
-            self.update_view()
-            self.page_changed.emit(self.current_page + 1, len(self.doc))
+            self.go_to_page(self.current_page + 1)
     
     def previous_page(self):
         """Go to previous page."""
         if self.doc and self.current_page > 0:
-            self.current_page -= 1
+            self.go_to_page(self.current_page - 1)
+    
+    def go_to_page(self, page_idx: int):
+        """Show the page with the given 0-based index."""
+        if not self.doc or not 0 <= page_idx < len(self.doc):
+            return
+        self.current_page = page_idx
+        if self.continuous:
+            self.continuous_controller.scroll_to_page(page_idx)
+        else:
             self.update_view()
-            self.page_changed.emit(self.current_page + 1, len(self.doc))
+        self.page_changed.emit(self.current_page + 1, len(self.doc))
+    
+    def set_search_hits(self, hits: HitIndex):
+        """Preview search results as an overlay, without touching the PDF."""
+        if hits and hits.same_hits(self.search_hits):
+            # Re-run of the same search, keep the user's place
+            self.update_hit_overlay()
+            return
+        self.search_hits = hits
+        self.current_hit = -1
+        if self.search_hits:
+            self.show_hit(0)
+        else:
+            self.update_hit_overlay()
+            self.hit_changed.emit(0, 0)
+    
+    def clear_search_hits(self):
+        """Remove the search hit overlay."""
+        self.set_search_hits(HitIndex())
+    
+    def next_hit(self):
+        """Move to the next search hit, wrapping around at the end."""
+        if self.search_hits:
+            self.show_hit((self.current_hit + 1) % len(self.search_hits))
+    
+    def previous_hit(self):
+        """Move to the previous search hit, wrapping around at the start."""
+        if self.search_hits:
+            self.show_hit((self.current_hit - 1) % len(self.search_hits))
+    
+    def show_page_hits(self, page_num: int):
+        """Move to the first search hit on a 1-based page."""
+        index = self.search_hits.first_on_page(page_num - 1)
+        if index is not None:
+            self.show_hit(index)
+        else:
+            self.go_to_page(page_num - 1)
+    
+    def show_hit(self, index: int):
+        """Emphasize a search hit and scroll it into view."""
+        self.current_hit = index
+        page_idx, bbox = self.search_hits[index]
+        if page_idx != self.current_page:
+            self.go_to_page(page_idx)
+        self.update_hit_overlay()
+        
+        if self.continuous:
+            self.continuous_controller.ensure_visible(page_idx, bbox)
+        else:
+            self.ensure_hit_visible(bbox)
+        self.hit_changed.emit(index + 1, len(self.search_hits))
+    
+    def ensure_hit_visible(self, bbox):
+        """Scroll a bbox on the single page shown into view."""
+        x, y = self.page_canvas.page_origin()
+        self.scroll_area.ensureVisible(
+            x + int((bbox[0] + bbox[2]) / 2 * self.zoom_level),
+            y + int((bbox[1] + bbox[3]) / 2 * self.zoom_level),
+            50, 100
+        )
+    
+    @staticmethod
+    def _page_overlay(entries, current_hit: int):
+        """Bboxes of one page and the position of the current hit among them.
+
+        A page with a single result row is painted straight from the
+        store's view of its bboxes.
+        """
+        if len(entries) == 1:
+            first, bboxes = entries[0]
+            inside = first <= current_hit < first + len(bboxes)
+            return bboxes, current_hit - first if inside else None
+        
+        bboxes, current = [], None
+        for first, view in entries:
+            if first <= current_hit < first + len(view):
+                current = len(bboxes) + current_hit - first
+            bboxes.extend(view)
+        return bboxes, current
+
+    def update_hit_overlay(self):
+        """Repaint the hit overlay from the cached page images."""
+        pages = self.search_hits.by_page()
+        if self.continuous:
+            hits = {}
+            current = None
+            for page_idx, entries in pages.items():
+                hits[page_idx], page_current = self._page_overlay(entries, self.current_hit)
+                if page_current is not None:
+                    current = (page_idx, page_current)
+            self.continuous_canvas.set_hits(hits, current)
+        else:
+            entries = pages.get(self.current_page)
+            if entries:
+                self.page_canvas.set_hits(*self._page_overlay(entries, self.current_hit))
+            else:
+                self.page_canvas.set_hits([], None)
     
     def zoom_in(self):
         """Increase zoom level."""
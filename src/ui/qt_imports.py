@@ -1,6 +1,6 @@
 """
 PDF Highlighter 2.0 - Qt Import Centralizer
-Last Updated: 2025-02-23 01:00:37 UTC
+Last Updated: 2026-10-19 09:02:55 UTC
 Author: 5446-boop
 """
 
@@ -18,9 +18,12 @@ from PyQt5.QtWidgets import (
     QColorDialog,
     QFileDialog,
     QSplitter,
-    QApplication
+    QApplication,
+    QScrollArea,
+    QRubberBand
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImage, QPixmap, QPainter, QColor
+from PyQt5.QtCore import Qt, QSize, pyqtSignal
 
 # Make all imports available at module level
 __all__ = [
@@ -38,5 +41,13 @@ __all__ = [
     'QFileDialog',
     'QSplitter',
     'QApplication',
-    'Qt'
+    'QScrollArea',
+    'QRubberBand',
+    'QImage',
+    'QPixmap',
+    'QPainter',
+    'QColor',
+    'Qt',
+    'QSize',
+    'pyqtSignal'
 ]
\ No newline at end of file
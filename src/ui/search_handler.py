@@ -1,101 +1,182 @@
 """
 PDF Highlighter 2.0 - Search Handler
-Last Updated: 2025-02-23 11:38:03 UTC
+Last Updated: 2026-10-19 09:43:44 UTC
 Author: 5446-boop
 """
 
 import logging
+import time
 import traceback
-from PyQt5.QtWidgets import QTableWidgetItem
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import QTimer
+
+from ..utils.result_store import HitIndex, ResultStore
 
 logger = logging.getLogger(__name__)
 
 class SearchHandler:
+    LIVE_SEARCH_DELAY_MS = 250  # Debounce delay after the last keystroke
+    LIVE_SEARCH_SLICE_SECONDS = 0.02  # Search time per event loop turn
+    SEARCH_POLL_MS = 50  # Interval for collecting workspace search results
+    
     def __init__(self, main_window):
         self.main_window = main_window
         
+        # Search over all open documents, run by the workspace's worker pool
+        self.workspace_search = None
+        self.search_timer = QTimer()
+        self.search_timer.setInterval(self.SEARCH_POLL_MS)
+        self.search_timer.timeout.connect(self.collect_search_results)
+        
+        # Search-as-you-type state
+        self.live_timer = QTimer()
+        self.live_timer.setSingleShot(True)
+        self.live_timer.timeout.connect(self.start_live_search)
+        self.live_generation = 0
+        self.live_search = None
+        self.live_query = None
+        self.last_live_query = None  # Last query whose live search completed
+        
+    @property
+    def results(self) -> ResultStore:
+        """Results shown in the table, across all documents."""
+        return self.main_window.results_table.store
+
     def search_text(self):
-        """Handle text search."""
+        """Handle text search across all open documents."""
+        self.cancel_live_search()
+        self.cancel_search()
         text = self.main_window.search_input.text().strip()
         if not text:
             self.main_window.show_error("Search Error", "Please enter search text")
             return
             
-        logger.info(f"Searching for: '{text}'")
+        logger.info(f"Searching for: '{text}' in {len(self.main_window.workspace)} documents")
         try:
-            results = self.main_window.pdf_handler.search_text(text)
-            self.main_window.results_table.setRowCount(0)
-            
-            for result in results:
-                row = self.main_window.results_table.rowCount()
-                self.main_window.results_table.insertRow(row)
-                self.add_result_to_table(row, result)
-                
-            if not results:
-                logger.info(f"No matches found for '{text}'")
-                self.main_window.show_error("Search Results", f"No matches found for '{text}'")
+            self.clear_results()
+            # Lookup mode stops at the first match, scanning likely pages first
+            limit = 1 if self.main_window.first_match_checkbox.isChecked() else None
+            self.workspace_search = self.main_window.workspace.start_search(text, limit)
+            self.search_timer.start()
                 
         except Exception as e:
             self.main_window.show_error("Search Error", str(e))
             logger.error(f"Search error: {traceback.format_exc()}")
 
-    def add_result_to_table(self, row, result):
-        """Add a search result to the table."""
+    def collect_search_results(self):
+        """Add the results found so far to the table, and finish when done."""
+        search = self.workspace_search
+        if search is None:
+            self.search_timer.stop()
+            return
+        
+        self.append_results(search.drain())
+        if not search.is_done():
+            return
+        
+        self.search_timer.stop()
+        self.workspace_search = None
+        self.show_results_in_viewer()
+        logger.info(f"Search complete - found results on {len(self.results)} pages")
+        if search.limit and self.results:
+            self.main_window.results_table.selectRow(0)  # Go straight to the match
+        if not self.results:
+            logger.info(f"No matches found for '{search.query}'")
+            self.main_window.show_error("Search Results", f"No matches found for '{search.query}'")
+
+    def cancel_search(self):
+        """Stop collecting results of the running workspace search."""
+        self.search_timer.stop()
+        if self.workspace_search is not None:
+            self.workspace_search.cancel()
+            self.workspace_search = None
+
+    def clear_results(self):
+        """Empty the results table and the viewer's hit overlay."""
+        self.main_window.results_table.clear_results()
+        self.main_window.pdf_view.clear_search_hits()
+
+    def append_results(self, results):
+        """Append a batch of results to the table."""
+        self.main_window.results_table.append_results(results)
+
+    def show_results_in_viewer(self):
+        """Preview the active document's hits; nothing is written to the PDF."""
+        active_path = self.main_window.workspace.active_path
+        self.main_window.pdf_view.set_search_hits(
+            HitIndex(self.results, self.results.rows_for_file(active_path))
+        )
+
+    def on_search_text_changed(self, _text):
+        """Restart the debounce timer of the live search on every keystroke."""
+        if not self.main_window.live_search_checkbox.isChecked():
+            return
+        self.cancel_live_search()
+        self.live_timer.start(self.LIVE_SEARCH_DELAY_MS)
+
+    def cancel_live_search(self):
+        """Abandon the running live search; its pending slices become no-ops."""
+        self.live_timer.stop()
+        self.live_generation += 1
+        if self.live_search is not None:
+            self.live_search.close()
+            self.live_search = None
+
+    def start_live_search(self):
+        """Start a live search for the current text, narrowing if possible."""
+        self.cancel_search()
+        text = self.main_window.search_input.text().strip()
+        self.clear_results()
+        if not text or not len(self.main_window.workspace):
+            return
+        
+        # Extending the previous query only needs the pages it matched
+        self.live_query = text
+        self.live_search = self.iter_live_results(text, self.last_live_query)
+        generation = self.live_generation
+        QTimer.singleShot(0, lambda: self.continue_live_search(generation))
+
+    def iter_live_results(self, text, narrow_from):
+        """Search the open documents one after the other, page by page."""
+        for handler in list(self.main_window.workspace.handlers.values()):
+            yield from handler.iter_page_results(text, narrow_from=narrow_from)
+
+    def continue_live_search(self, generation):
+        """Run one time slice of the live search and show its results."""
+        if generation != self.live_generation or self.live_search is None:
+            return
+        
+        deadline = time.perf_counter() + self.LIVE_SEARCH_SLICE_SECONDS
+        found = []
         try:
-            # Page number (format: XXX/YYY)
-            total_pages = len(self.main_window.pdf_handler.doc)
-            page_item = QTableWidgetItem(result.format_page_number(total_pages))
-            page_item.setData(Qt.UserRole, result.bboxes)
-            page_item.setFlags(page_item.flags() & ~Qt.ItemIsEditable)
-            self.main_window.results_table.setItem(row, 0, page_item)
-            
-            # Total matches on page
-            matches_item = QTableWidgetItem(str(result.total_matches))
-            matches_item.setFlags(matches_item.flags() & ~Qt.ItemIsEditable)
-            matches_item.setTextAlignment(Qt.AlignCenter)
-            self.main_window.results_table.setItem(row, 1, matches_item)
-            
-            # Delivery number
-            dev_no_item = QTableWidgetItem(result.delivery_number or "N/A")
-            dev_no_item.setFlags(dev_no_item.flags() & ~Qt.ItemIsEditable)
-            self.main_window.results_table.setItem(row, 2, dev_no_item)
-            
-            # Invoice number
-            fak_no_item = QTableWidgetItem(result.invoice_number or "N/A")
-            fak_no_item.setFlags(fak_no_item.flags() & ~Qt.ItemIsEditable)
-            self.main_window.results_table.setItem(row, 3, fak_no_item)
-            
-            # Highlight color status
-            color_item = QTableWidgetItem()
-            color_item.setFlags(Qt.ItemIsEnabled)
-            self.main_window.results_table.update_highlight_status(
-                color_item,
-                result.highlight_color is not None,
-                result.highlight_color
-            )
-            if result.annot_xrefs:
-                color_item.setData(Qt.UserRole, result.annot_xrefs)
-            self.main_window.results_table.setItem(row, 4, color_item)
-            
-            # Highlight button
-            highlight_btn = self.main_window.results_table.create_action_button("Highlight")
-            highlight_btn.clicked.connect(
-                lambda: self.main_window.highlight_handler.add_highlight(row, result.text)
-            )
-            self.main_window.results_table.setCellWidget(row, 5, highlight_btn)
-            
-            # Remove button
-            remove_btn = self.main_window.results_table.create_action_button("Remove")
-            remove_btn.clicked.connect(
-                lambda: self.main_window.highlight_handler.remove_highlight(row)
-            )
-            self.main_window.results_table.setCellWidget(row, 6, remove_btn)
-            
-            logger.debug(f"Added result for page {result.page_num} with {result.total_matches} matches")
-            
+            for _, result in self.live_search:
+                if result is not None:
+                    found.append(result)
+                if time.perf_counter() >= deadline:
+                    self.append_results(found)
+                    QTimer.singleShot(0, lambda: self.continue_live_search(generation))
+                    return
         except Exception as e:
-            logger.error(f"Error adding result to table: {traceback.format_exc()}")
+            logger.error(f"Live search error: {traceback.format_exc()}")
+            self.live_search = None
+            return
+        
+        self.append_results(found)
+        self.live_search = None
+        self.last_live_query = self.live_query
+        self.show_results_in_viewer()
+        logger.info(f"Live search for '{self.live_query}' found results on "
+                    f"{len(self.results)} pages")
+
+    def show_selected_result(self):
+        """Show the hits of the selected result row in the viewer."""
+        row = self.main_window.results_table.selected_row()
+        if row is None:
+            return
+        filepath = self.results.filepath(row)
+        if filepath and filepath != self.main_window.workspace.active_path:
+            self.main_window.activate_document(filepath)
+            self.show_results_in_viewer()
+        self.main_window.pdf_view.show_page_hits(self.results.page_nums[row])
 
     def refresh_search_results(self):
         """Refresh the search results to show current highlight status."""
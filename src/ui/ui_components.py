@@ -1,6 +1,6 @@
 """
 PDF Highlighter 2.0 - UI Components
-Last Updated: 2025-02-23 11:38:03 UTC
+Last Updated: 2026-10-19 10:31:00 UTC
 Author: 5446-boop
 """
 
@@ -8,12 +8,14 @@ from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout,
     QLabel, QPushButton, QLineEdit,
     QTextEdit, QSplitter, QCheckBox,
-    QMenuBar, QMenu, QAction
+    QMenuBar, QMenu, QAction, QActionGroup
 )
 from PyQt5.QtCore import Qt
 
 from .widgets.color_picker import ColorPicker
 from .widgets.results_table import ResultsTable
+from .pdf_view import PDFView
+from ..utils.pdf_handler import ANNOT_MODE_RECT, ANNOT_MODE_LINE, ANNOT_MODE_PAGE
 
 def setup_ui_components(window):
     """Setup all UI components for the main window."""
@@ -28,36 +30,106 @@ def setup_ui_components(window):
     # Create left panel
     left_panel = create_left_panel(window)
     
+    # Create viewer panel
+    viewer_panel = create_viewer_panel(window)
+    
     # Create right panel
     right_panel = create_right_panel(window)
     
     # Create splitter and add panels
     splitter = QSplitter(Qt.Horizontal)
     splitter.addWidget(left_panel)
+    splitter.addWidget(viewer_panel)
     splitter.addWidget(right_panel)
-    splitter.setSizes([400, 600])
+    splitter.setSizes([300, 500, 300])
     
     # Add splitter and results table to main layout
     main_layout.addWidget(splitter)
     
     # Create results table
-    window.results_table = ResultsTable()
+    window.results_table = ResultsTable(page_count=window.page_count)
+    window.results_table.selection_changed.connect(window.search_handler.show_selected_result)
+    window.results_table.highlight_requested.connect(window.highlight_handler.add_highlight)
+    window.results_table.remove_requested.connect(window.highlight_handler.remove_highlight)
     main_layout.addWidget(window.results_table)
 
 def create_menu_bar(window):
-    """Create the menu bar with File and Settings menus."""
+    """Create the menu bar with File, Edit and Settings menus."""
     menubar = window.menuBar()
     
     # File Menu
     file_menu = menubar.addMenu('File')
     
+    save_action = QAction('Save', window)
+    save_action.setShortcut('Ctrl+S')
+    save_action.triggered.connect(window.highlight_handler.save_pdf)
+    file_menu.addAction(save_action)
+    
+    optimize_action = QAction('Optimize and Save', window)
+    optimize_action.triggered.connect(window.optimize_document)
+    file_menu.addAction(optimize_action)
+    
+    export_action = QAction('Export Results...', window)
+    export_action.setShortcut('Ctrl+E')
+    export_action.triggered.connect(window.export_results)
+    file_menu.addAction(export_action)
+    
+    close_doc_action = QAction('Close Document', window)
+    close_doc_action.setShortcut('Ctrl+W')
+    close_doc_action.triggered.connect(window.close_active_document)
+    file_menu.addAction(close_doc_action)
+    
     exit_action = QAction('Exit', window)
     exit_action.setShortcut('Ctrl+Q')
     exit_action.triggered.connect(window.close)
     file_menu.addAction(exit_action)
     
+    # Edit Menu, stepping through the highlight edits made since the last save
+    edit_menu = menubar.addMenu('Edit')
+    
+    undo_action = QAction('Undo', window)
+    undo_action.setShortcut('Ctrl+Z')
+    undo_action.triggered.connect(window.highlight_handler.undo_edit)
+    edit_menu.addAction(undo_action)
+    
+    redo_action = QAction('Redo', window)
+    redo_action.setShortcut('Ctrl+Y')
+    redo_action.triggered.connect(window.highlight_handler.redo_edit)
+    edit_menu.addAction(redo_action)
+    
     # Settings Menu (right-aligned)
     settings_menu = QMenu('Settings', window)
+    
+    # How highlights are written on save; the compact modes keep files small
+    annotation_menu = settings_menu.addMenu('Highlight Annotations')
+    annotation_group = QActionGroup(window)
+    for label, mode in [('One Per Match', ANNOT_MODE_RECT),
+                        ('One Per Line (Compact)', ANNOT_MODE_LINE),
+                        ('One Per Page (Compact)', ANNOT_MODE_PAGE)]:
+        mode_action = QAction(label, window, checkable=True)
+        mode_action.setChecked(mode == window.workspace.annotation_mode)
+        mode_action.triggered.connect(lambda _checked, mode=mode: window.workspace.set_annotation_mode(mode))
+        annotation_group.addAction(mode_action)
+        annotation_menu.addAction(mode_action)
+    
+    # When files are rewritten compactly, besides File > Optimize and Save
+    optimize_close_action = QAction('Optimize on Close', window, checkable=True)
+    optimize_close_action.toggled.connect(window.set_optimize_on_close)
+    settings_menu.addAction(optimize_close_action)
+    optimize_edits_action = QAction('Optimize After Edits...', window)
+    optimize_edits_action.triggered.connect(window.ask_optimize_after_edits)
+    settings_menu.addAction(optimize_edits_action)
+    settings_menu.addSeparator()
+    
+    # Memory limit of long sessions, and what is held now
+    memory_budget_action = QAction('Memory Budget...', window)
+    memory_budget_action.triggered.connect(window.ask_memory_budget)
+    settings_menu.addAction(memory_budget_action)
+    memory_usage_action = QAction('Memory Usage...', window)
+    memory_usage_action.triggered.connect(window.show_memory_usage)
+    settings_menu.addAction(memory_usage_action)
+    settings_menu.addSeparator()
+    
     about_action = QAction('About', window)
     about_action.triggered.connect(window.show_about_dialog)
     settings_menu.addAction(about_action)
@@ -93,6 +165,15 @@ def create_left_panel(window):
     search_layout.addWidget(window.search_btn)
     left_layout.addWidget(search_group)
     
+    # Search as you type
+    window.live_search_checkbox = QCheckBox("Search as you type")
+    window.search_input.textChanged.connect(window.search_handler.on_search_text_changed)
+    left_layout.addWidget(window.live_search_checkbox)
+    
+    # Lookup of a unique value such as an invoice number
+    window.first_match_checkbox = QCheckBox("Stop at first match")
+    left_layout.addWidget(window.first_match_checkbox)
+    
     # Color picker
     window.color_picker = ColorPicker()
     left_layout.addWidget(window.color_picker)
@@ -100,6 +181,42 @@ def create_left_panel(window):
     left_layout.addStretch()
     return left_panel
 
+def create_viewer_panel(window):
+    """Create the viewer panel with the page view and match navigation."""
+    viewer_panel = QWidget()
+    viewer_layout = QVBoxLayout(viewer_panel)
+    
+    # Match navigation
+    nav_controls = QHBoxLayout()
+    window.prev_hit_btn = QPushButton("Previous Match")
+    window.prev_hit_btn.setEnabled(False)
+    nav_controls.addWidget(window.prev_hit_btn)
+    
+    window.hit_label = QLabel("No matches")
+    window.hit_label.setAlignment(Qt.AlignCenter)
+    nav_controls.addWidget(window.hit_label)
+    
+    window.next_hit_btn = QPushButton("Next Match")
+    window.next_hit_btn.setEnabled(False)
+    nav_controls.addWidget(window.next_hit_btn)
+    
+    nav_controls.addStretch()
+    
+    # Continuous scroll checkbox
+    window.continuous_checkbox = QCheckBox("Continuous Scroll")
+    nav_controls.addWidget(window.continuous_checkbox)
+    viewer_layout.addLayout(nav_controls)
+    
+    # Page view
+    window.pdf_view = PDFView()
+    window.prev_hit_btn.clicked.connect(window.pdf_view.previous_hit)
+    window.next_hit_btn.clicked.connect(window.pdf_view.next_hit)
+    window.pdf_view.hit_changed.connect(window.update_hit_label)
+    window.continuous_checkbox.toggled.connect(window.pdf_view.set_continuous_mode)
+    viewer_layout.addWidget(window.pdf_view)
+    
+    return viewer_panel
+
 def create_right_panel(window):
     """Create the right panel with debug checkbox and log output."""
     right_panel = QWidget()
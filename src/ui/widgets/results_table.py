@@ -1,66 +1,215 @@
 """
 PDF Highlighter 2.0 - Results Table Widget
-Last Updated: 2025-02-24 17:55:36 UTC
+Last Updated: 2026-10-19 09:36:03 UTC
 """
 
-from PyQt5.QtWidgets import QTableWidget, QTableWidgetItem, QPushButton, QHeaderView
-from PyQt5.QtCore import Qt
+import os
+from typing import Callable, Iterable, Optional, Tuple
+
+from PyQt5.QtWidgets import (
+    QTableView, QHeaderView, QStyledItemDelegate, QStyleOptionButton,
+    QStyle, QApplication, QAbstractItemView
+)
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel, pyqtSignal
 from PyQt5.QtGui import QColor
 import logging
 
+from ...utils.pdf_handler import SearchResult
+from ...utils.result_store import ResultStore
+
 logger = logging.getLogger(__name__)
 
-class ResultsTable(QTableWidget):
-    def __init__(self, parent=None):
+COLUMNS = [
+    "Page",          # Format: "001/100"
+    "Matches",       # Total matches on page
+    "Dev. No.",     # Delivery Number
+    "Fak. No.",     # Invoice Number
+    "Color",        # Highlight color
+    "",            # Highlight button column
+    "",            # Remove button column
+    "File"         # Document the result belongs to
+]
+(COL_PAGE, COL_MATCHES, COL_DELIVERY, COL_INVOICE,
+ COL_COLOR, COL_HIGHLIGHT, COL_REMOVE, COL_FILE) = range(len(COLUMNS))
+
+BUTTON_LABELS = {COL_HIGHLIGHT: "Highlight", COL_REMOVE: "Remove"}
+
+class ResultsModel(QAbstractTableModel):
+    """Table model that reads cells straight from a ResultStore's columns.
+
+    No per-cell items are created; Qt asks for the cells it paints. The
+    UserRole of every column is its sort key.
+    """
+
+    def __init__(self, page_count: Optional[Callable[[Optional[str]], int]] = None, parent=None):
+        super().__init__(parent)
+        self.store = ResultStore()
+        self.page_count = page_count or (lambda filepath: 0)
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.store)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return COLUMNS[section]
+        return super().headerData(section, orientation, role)
+
+    def flags(self, index):
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        store = self.store
+
+        if role == Qt.DisplayRole:
+            if column == COL_PAGE:
+                return f"{store.page_nums[row]}/{self.page_count(store.filepath(row))}"
+            if column == COL_MATCHES:
+                return str(store.match_counts[row])
+            if column == COL_DELIVERY:
+                return store.delivery_number(row) or "N/A"
+            if column == COL_INVOICE:
+                return store.invoice_number(row) or "N/A"
+            if column == COL_COLOR:
+                return "✓" if row in store.highlight_colors else ""
+            if column in BUTTON_LABELS:
+                return BUTTON_LABELS[column]
+            if column == COL_FILE:
+                return os.path.basename(store.filepath(row) or "")
+        elif role == Qt.UserRole:
+            if column == COL_PAGE:
+                return store.page_nums[row]
+            if column == COL_MATCHES:
+                return store.match_counts[row]
+            if column == COL_DELIVERY:
+                return store.delivery_number(row) or ""
+            if column == COL_INVOICE:
+                return store.invoice_number(row) or ""
+            if column == COL_COLOR:
+                return store.annot_xrefs.get(row)
+            if column == COL_FILE:
+                return store.filepath(row) or ""
+        elif role == Qt.UserRole + 1 and column == COL_COLOR:
+            return row in store.highlight_colors
+        elif role == Qt.BackgroundRole and column == COL_COLOR:
+            color = store.highlight_colors.get(row)
+            return QColor.fromRgbF(*color) if color else None
+        elif role == Qt.TextAlignmentRole and column in (COL_MATCHES, COL_COLOR):
+            return Qt.AlignCenter
+        elif role == Qt.ToolTipRole and column == COL_FILE:
+            return store.filepath(row)
+        return None
+
+    def append_results(self, results: Iterable[SearchResult]) -> None:
+        """Add results as rows at the end."""
+        results = list(results)
+        if not results:
+            return
+        first = len(self.store)
+        self.beginInsertRows(QModelIndex(), first, first + len(results) - 1)
+        self.store.extend(results)
+        self.endInsertRows()
+
+    def clear(self) -> None:
+        """Drop all rows, with the store holding them."""
+        self.beginResetModel()
+        self.store = ResultStore()
+        self.endResetModel()
+
+    def set_highlight(self, row: int, color: Optional[Tuple[float, float, float]]) -> None:
+        """Update the highlight status shown for a row."""
+        self.store.set_highlight(row, color)
+        index = self.index(row, COL_COLOR)
+        self.dataChanged.emit(index, index)
+
+class ButtonDelegate(QStyledItemDelegate):
+    """Paints the action columns as push buttons; clicks go through the view."""
+
+    def paint(self, painter, option, index):
+        button = QStyleOptionButton()
+        button.rect = option.rect.adjusted(2, 2, -2, -2)
+        button.text = index.data(Qt.DisplayRole)
+        button.state = QStyle.State_Enabled | QStyle.State_Raised
+        QApplication.style().drawControl(QStyle.CE_PushButton, button, painter)
+
+class ResultsTable(QTableView):
+    highlight_requested = pyqtSignal(int, str)  # store row, search text
+    remove_requested = pyqtSignal(int)  # store row
+    selection_changed = pyqtSignal()
+
+    def __init__(self, parent=None, page_count: Optional[Callable[[Optional[str]], int]] = None):
         super().__init__(parent)
+        self.results_model = ResultsModel(page_count, self)
+        self.proxy_model = QSortFilterProxyModel(self)
+        self.proxy_model.setSourceModel(self.results_model)
+        self.proxy_model.setSortRole(Qt.UserRole)
+        self.setModel(self.proxy_model)
+        self.button_delegate = ButtonDelegate(self)
         self.setup_table()
+        self.clicked.connect(self.on_clicked)
+        self.selectionModel().selectionChanged.connect(lambda *_: self.selection_changed.emit())
 
     def setup_table(self):
         """Initialize the table with the required columns."""
-        # Define columns
-        columns = [
-            "Page",          # Format: "001/100"
-            "Matches",       # Total matches on page
-            "Dev. No.",     # Delivery Number
-            "Fak. No.",     # Invoice Number
-            "Color",        # Highlight color
-            "",            # Highlight button column
-            ""             # Remove button column
-        ]
-        
-        self.setColumnCount(len(columns))
-        self.setHorizontalHeaderLabels(columns)
-        
         # Set column properties
-        self.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeToContents)  # Page
-        self.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeToContents)  # Matches
-        self.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)          # Dev. No.
-        self.horizontalHeader().setSectionResizeMode(3, QHeaderView.Stretch)          # Fak. No.
-        self.horizontalHeader().setSectionResizeMode(4, QHeaderView.ResizeToContents)  # Color
-        self.horizontalHeader().setSectionResizeMode(5, QHeaderView.ResizeToContents)  # Highlight
-        self.horizontalHeader().setSectionResizeMode(6, QHeaderView.ResizeToContents)  # Remove
-        
-        # Enable sorting
+        self.horizontalHeader().setSectionResizeMode(COL_PAGE, QHeaderView.ResizeToContents)
+        self.horizontalHeader().setSectionResizeMode(COL_MATCHES, QHeaderView.ResizeToContents)
+        self.horizontalHeader().setSectionResizeMode(COL_DELIVERY, QHeaderView.Stretch)
+        self.horizontalHeader().setSectionResizeMode(COL_INVOICE, QHeaderView.Stretch)
+        self.horizontalHeader().setSectionResizeMode(COL_COLOR, QHeaderView.ResizeToContents)
+        self.horizontalHeader().setSectionResizeMode(COL_HIGHLIGHT, QHeaderView.Fixed)
+        self.horizontalHeader().setSectionResizeMode(COL_REMOVE, QHeaderView.Fixed)
+        self.horizontalHeader().setSectionResizeMode(COL_FILE, QHeaderView.ResizeToContents)
+        self.setColumnWidth(COL_HIGHLIGHT, 84)
+        self.setColumnWidth(COL_REMOVE, 84)
+        for column in BUTTON_LABELS:
+            self.setItemDelegateForColumn(column, self.button_delegate)
+
+        # Enable sorting, keeping the order results arrive in until a header is clicked
         self.setSortingEnabled(True)
-        
+        self.sortByColumn(-1, Qt.AscendingOrder)
+
         # Set selection behavior
-        self.setSelectionBehavior(QTableWidget.SelectRows)
-        self.setSelectionMode(QTableWidget.SingleSelection)
-
-    def create_action_button(self, text: str) -> QPushButton:
-        """Create a button for the action columns."""
-        button = QPushButton(text)
-        button.setFixedWidth(80)
-        return button
-
-    def update_highlight_status(self, item: QTableWidgetItem, is_highlighted: bool, color: tuple = None):
-        """Update the highlight status cell."""
-        if is_highlighted and color:
-            item.setBackground(QColor.fromRgbF(*color))
-            item.setText("✓")
-        else:
-            item.setBackground(QColor(255, 255, 255))
-            item.setText("")
-        
-        item.setData(Qt.UserRole + 1, is_highlighted)
-        item.setTextAlignment(Qt.AlignCenter)
\ No newline at end of file
+        self.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+
+    @property
+    def store(self) -> ResultStore:
+        """Results shown in the table."""
+        return self.results_model.store
+
+    def append_results(self, results: Iterable[SearchResult]):
+        self.results_model.append_results(results)
+
+    def clear_results(self):
+        self.results_model.clear()
+
+    def source_row(self, view_row: int) -> int:
+        """Store row shown at a (possibly sorted) view row."""
+        return self.proxy_model.mapToSource(self.proxy_model.index(view_row, 0)).row()
+
+    def selected_row(self) -> Optional[int]:
+        """Store row of the selected result."""
+        rows = self.selectionModel().selectedRows()
+        return self.proxy_model.mapToSource(rows[0]).row() if rows else None
+
+    def result_filepath(self, row: int):
+        """Full path of the document a result row belongs to."""
+        return self.store.filepath(row) if 0 <= row < len(self.store) else None
+
+    def set_highlight(self, row: int, color: Optional[Tuple[float, float, float]]):
+        """Update the highlight status cell of a row."""
+        self.results_model.set_highlight(row, color)
+
+    def on_clicked(self, index):
+        """Turn clicks on the action columns into requests."""
+        row = self.proxy_model.mapToSource(index).row()
+        if index.column() == COL_HIGHLIGHT:
+            self.highlight_requested.emit(row, self.store.text(row) or "")
+        elif index.column() == COL_REMOVE:
+            self.remove_requested.emit(row)
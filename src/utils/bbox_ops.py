@@ -0,0 +1,167 @@
+"""
+PDF Highlighter 2.0 - Batched Bbox Operations
+Last Updated: 2026-10-19 09:40:10 UTC
+Author: 5446-boop
+
+Operations on all the bboxes of a page at once. With NumPy installed,
+inputs of more than a few rects are handled as one (n, 4) array; without
+it, or for a handful of rects, the same results come from plain Python.
+"""
+
+import logging
+from typing import Iterable, List, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # Optional: only speeds up pages with many rects
+    np = None
+
+logger = logging.getLogger(__name__)
+
+BBox = Tuple[float, float, float, float]
+
+VECTOR_MIN = 16  # Fewer rects than this are faster without NumPy
+
+def _use_numpy(*counts: int) -> bool:
+    return np is not None and max(counts, default=0) >= VECTOR_MIN
+
+def as_array(rects) -> "np.ndarray":
+    """Rects as an (n, 4) float64 array.
+
+    A view into a ResultStore is wrapped without copying; anything else
+    yielding (x0, y0, x1, y1) rect-likes, such as fitz.Rect, is copied.
+    """
+    coords = getattr(rects, "coords", None)
+    if isinstance(coords, memoryview):
+        return np.frombuffer(coords, dtype=np.float64).reshape(-1, 4)
+    if isinstance(rects, np.ndarray):
+        return rects.astype(np.float64, copy=False).reshape(-1, 4)
+    return np.array([tuple(rect) for rect in rects], dtype=np.float64).reshape(-1, 4)
+
+def to_tuples(rects: Iterable) -> List[BBox]:
+    """Rect-likes as plain (x0, y0, x1, y1) float tuples."""
+    return [(float(x0), float(y0), float(x1), float(y1)) for x0, y0, x1, y1 in rects]
+
+def first_overlap(rects: Sequence, others: Sequence) -> List[int]:
+    """For each rect, the index of the first of others it touches, or -1.
+
+    Rects sharing only an edge count as overlapping.
+    """
+    if not len(rects) or not len(others):
+        return [-1] * len(rects)
+    if not _use_numpy(len(rects) * len(others)):
+        found = []
+        for x0, y0, x1, y1 in to_tuples(rects):
+            for index, (ox0, oy0, ox1, oy1) in enumerate(to_tuples(others)):
+                if not (x1 < ox0 or x0 > ox1 or y1 < oy0 or y0 > oy1):
+                    found.append(index)
+                    break
+            else:
+                found.append(-1)
+        return found
+
+    a, b = as_array(rects)[:, None, :], as_array(others)[None, :, :]
+    hits = ~((a[..., 2] < b[..., 0]) | (a[..., 0] > b[..., 2]) |
+             (a[..., 3] < b[..., 1]) | (a[..., 1] > b[..., 3]))
+    return np.where(hits.any(axis=1), hits.argmax(axis=1), -1).tolist()
+
+def overlaps_any(rects: Sequence, others: Sequence) -> List[bool]:
+    """For each rect, whether it touches any of others."""
+    return [index >= 0 for index in first_overlap(rects, others)]
+
+def dedupe(rects: Sequence, decimals: int = 2) -> List[BBox]:
+    """Rects without repeats, in their original order.
+
+    Rects equal after rounding to `decimals` places count as repeats.
+    """
+    if not _use_numpy(len(rects)):
+        seen = set()
+        unique = []
+        for rect in to_tuples(rects):
+            key = tuple(round(value, decimals) for value in rect)
+            if key not in seen:
+                seen.add(key)
+                unique.append(rect)
+        return unique
+
+    array = as_array(rects)
+    _, first = np.unique(np.round(array, decimals), axis=0, return_index=True)
+    return to_tuples(array[np.sort(first)].tolist())
+
+def merge_lines(rects: Sequence, max_gap: float = 1.0, line_tolerance: float = 2.0) -> List[BBox]:
+    """Merge rects that touch on the same text line into one rect each.
+
+    Rects are on the same line when their vertical centers round to the
+    same multiple of `line_tolerance`, and adjacent when the horizontal gap
+    between them is at most `max_gap`. The result is in reading order.
+    """
+    if not len(rects):
+        return []
+    if not _use_numpy(len(rects)):
+        keyed = sorted(
+            (round((y0 + y1) / 2 / line_tolerance), x0, (x0, y0, x1, y1))
+            for x0, y0, x1, y1 in to_tuples(rects)
+        )
+        merged: List[list] = []
+        current_line = None
+        for line, _, (x0, y0, x1, y1) in keyed:
+            if merged and line == current_line and x0 <= merged[-1][2] + max_gap:
+                last = merged[-1]
+                last[1], last[2], last[3] = min(last[1], y0), max(last[2], x1), max(last[3], y1)
+            else:
+                merged.append([x0, y0, x1, y1])
+                current_line = line
+        return [tuple(rect) for rect in merged]
+
+    array = as_array(rects)
+    lines = np.round((array[:, 1] + array[:, 3]) / 2 / line_tolerance)
+    array = array[np.lexsort((array[:, 0], lines))]
+    lines = np.sort(lines)
+
+    # Running right edge within each line: lift every line above the last
+    new_line = np.empty(len(array), dtype=bool)
+    new_line[0] = True
+    new_line[1:] = lines[1:] != lines[:-1]
+    line_ids = np.cumsum(new_line)
+    span = array[:, 2].max() - array[:, 0].min() + max_gap + 1
+    reach = np.maximum.accumulate(array[:, 2] + line_ids * span) - line_ids * span
+
+    starts = new_line.copy()
+    starts[1:] |= array[1:, 0] > reach[:-1] + max_gap
+    first = np.flatnonzero(starts)
+    merged = np.column_stack((
+        np.minimum.reduceat(array[:, 0], first),
+        np.minimum.reduceat(array[:, 1], first),
+        np.maximum.reduceat(array[:, 2], first),
+        np.maximum.reduceat(array[:, 3], first),
+    ))
+    return to_tuples(merged.tolist())
+
+def line_groups(rects: Sequence, line_tolerance: float = 2.0) -> List[List[BBox]]:
+    """Rects grouped by text line, as in merge_lines, in reading order."""
+    lines = {}
+    for rect in sorted(to_tuples(rects), key=lambda r: (round((r[1] + r[3]) / 2 / line_tolerance), r[0])):
+        lines.setdefault(round((rect[1] + rect[3]) / 2 / line_tolerance), []).append(rect)
+    return list(lines.values())
+
+def scale(rects: Sequence, zoom: float, x: float = 0, y: float = 0) -> List[BBox]:
+    """Map rects in PDF points to (left, top, width, height) on a page at (x, y)."""
+    if not _use_numpy(len(rects)):
+        return [(x + x0 * zoom, y + y0 * zoom, (x1 - x0) * zoom, (y1 - y0) * zoom)
+                for x0, y0, x1, y1 in to_tuples(rects)]
+
+    array = as_array(rects) * zoom
+    array[:, 2:] -= array[:, :2]
+    array[:, 0] += x
+    array[:, 1] += y
+    return to_tuples(array.tolist())
+
+def right_of(rects: Sequence, gap: float, width: float, rise: float, height: float) -> List[BBox]:
+    """A label box right of each rect: `gap` past its right edge, `rise` above its top."""
+    if not _use_numpy(len(rects)):
+        return [(x1 + gap, y0 - rise, x1 + gap + width, y0 - rise + height)
+                for _, y0, x1, _ in to_tuples(rects)]
+
+    array = as_array(rects)
+    left, top = array[:, 2] + gap, array[:, 1] - rise
+    return to_tuples(np.column_stack((left, top, left + width, top + height)).tolist())
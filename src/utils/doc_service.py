@@ -0,0 +1,412 @@
+"""
+PDF Highlighter 2.0 - Local Document Service
+Last Updated: 2026-10-19 10:54:58 UTC
+Author: 5446-boop
+
+A small HTTP/JSON service for other local tools. Endpoints (all POST with a
+JSON body, answering JSON unless noted):
+
+    /search           {"path", "query", "limit"?} -> {"results": [...]}
+    /extract-numbers  {"path", "pages"?} -> {"pages": [{"page", "invoice_number", "delivery_number", "fields"}]}
+    /highlight        {"path", "query" | "page" + "bboxes", "color"?, "annotation_mode"?} -> {"highlighted", "saved"}
+    /render-page      {"path", "page", "zoom"?} -> image/png
+    /health           (GET) -> {"status": "ok"}
+
+Pages are 1-based, as everywhere else in the application.
+"""
+
+import asyncio
+import dataclasses
+import json
+import logging
+import os
+import signal
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+from .field_extraction import INVOICE_NUMBER, DELIVERY_NUMBER
+from .index_store import IndexStore
+from .metrics import registry
+from .page_render import render_page
+from .pdf_handler import PDFError, PDFHandler, ANNOT_MODE_RECT, ANNOTATION_MODES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 1024 * 1024
+DEFAULT_COLOR = (1, 1, 0)  # Yellow, as in the color picker
+
+# Requests are timed here; the work they do is counted in the worker processes
+REQUEST_SECONDS = registry.histogram(
+    "pdf_highlighter_service_request_seconds", "Document service request time by endpoint and status",
+    ("endpoint", "status"))
+
+class RequestError(Exception):
+    """A request the service cannot serve, with its HTTP status."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+    def __reduce__(self):
+        # Raised in worker processes, so it must survive pickling
+        return (RequestError, (self.status, str(self)))
+
+class DocumentPool:
+    """LRU pool of open documents, one PDFHandler each.
+
+    A pooled document is reopened when its file changed on disk since it
+    was opened, so a pool never serves stale content.
+    """
+
+    def __init__(self, max_open: int = 8, index_store: Optional[IndexStore] = None):
+        self.max_open = max_open
+        self.index_store = index_store or IndexStore()
+        self._handlers: "OrderedDict[str, Tuple[PDFHandler, Tuple[int, int]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, filepath: str) -> PDFHandler:
+        """Open handler of a document, loading it if needed.
+
+        Raises PDFError if the document cannot be loaded.
+        """
+        filepath = os.path.abspath(filepath)
+        try:
+            stat = os.stat(filepath)
+        except OSError as e:
+            raise PDFError(f"Cannot access {filepath}: {e}")
+        stamp = (stat.st_size, stat.st_mtime_ns)
+
+        entry = self._handlers.get(filepath)
+        if entry is not None and entry[1] == stamp:
+            self._handlers.move_to_end(filepath)
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        self.discard(filepath)
+        handler = PDFHandler(self.index_store)
+        handler.load_document(filepath, background_index=False)
+        self._handlers[filepath] = (handler, stamp)
+        while len(self._handlers) > self.max_open:
+            _, (oldest, _) = self._handlers.popitem(last=False)
+            oldest.close()
+        return handler
+
+    def refresh(self, filepath: str) -> None:
+        """Re-stamp a document after saving it through its handler."""
+        filepath = os.path.abspath(filepath)
+        entry = self._handlers.get(filepath)
+        if entry is not None:
+            stat = os.stat(filepath)
+            self._handlers[filepath] = (entry[0], (stat.st_size, stat.st_mtime_ns))
+
+    def discard(self, filepath: str) -> None:
+        """Close a pooled document."""
+        entry = self._handlers.pop(os.path.abspath(filepath), None)
+        if entry is not None:
+            entry[0].close()
+
+    def close_all(self) -> None:
+        for handler, _ in self._handlers.values():
+            handler.close()
+        self._handlers.clear()
+
+    def __len__(self) -> int:
+        return len(self._handlers)
+
+# Jobs below run in the worker processes, each with a pool of its own
+
+_worker_pool: Optional[DocumentPool] = None
+
+def _init_worker(max_open: int, cache_dir: Optional[str]) -> None:
+    global _worker_pool
+    _worker_pool = DocumentPool(max_open, IndexStore(cache_dir))
+
+def _check_page(handler: PDFHandler, page_num: int) -> None:
+    if page_num < 1 or page_num > len(handler.doc):
+        raise RequestError(400, f"Page {page_num} out of range 1-{len(handler.doc)}")
+
+def search_job(path: str, query: str, limit: Optional[int] = None) -> List[Dict]:
+    """Search a document, or look up its first `limit` matches; results as JSON-ready dicts."""
+    handler = _worker_pool.get(path)
+    results = handler.lookup(query, limit) if limit else handler.search_text(query)
+    return [dataclasses.asdict(result) for result in results]
+
+def extract_numbers_job(path: str, pages: Optional[List[int]] = None) -> List[Dict]:
+    """Invoice and delivery number, and all other fields, of the given pages or of all pages."""
+    handler = _worker_pool.get(path)
+    page_nums = range(1, len(handler.doc) + 1) if pages is None else pages
+    extracted = []
+    for page_num in page_nums:
+        _check_page(handler, page_num)
+        fields = handler.page_fields(handler.doc[page_num - 1])
+        extracted.append({
+            "page": page_num,
+            "invoice_number": fields.get(INVOICE_NUMBER),
+            "delivery_number": fields.get(DELIVERY_NUMBER),
+            "fields": fields
+        })
+    return extracted
+
+def highlight_job(path: str, color: Tuple[float, float, float], query: Optional[str] = None,
+                  page: Optional[int] = None, bboxes: Optional[List] = None,
+                  annotation_mode: str = ANNOT_MODE_RECT) -> Dict:
+    """Highlight every match of a query, or the given boxes of one page, and save."""
+    handler = _worker_pool.get(path)
+    handler.annotation_mode = annotation_mode
+    if query:
+        targets = [(result.page_num, result.bboxes, result.text)
+                   for result in handler.search_text(query)]
+    else:
+        _check_page(handler, page)
+        targets = [(page, [tuple(bbox) for bbox in bboxes], "")]
+
+    highlighted = sum(
+        len(boxes) for page_num, boxes, text in targets
+        if handler.highlight_text(page_num, boxes, color, text)
+    )
+    saved = handler.save() if handler.has_pending_edits() else True
+    if saved:
+        _worker_pool.refresh(path)
+    else:
+        _worker_pool.discard(path)
+    return {"highlighted": highlighted, "saved": saved}
+
+def render_page_job(path: str, page: int, zoom: float = 1.0) -> bytes:
+    """PNG of one page."""
+    handler = _worker_pool.get(path)
+    _check_page(handler, page)
+    return render_page(handler.doc[page - 1], zoom).to_png()
+
+class DocumentService:
+    """Asyncio HTTP server that hands document work to a process pool.
+
+    The event loop only parses requests and writes responses; every job
+    runs in a worker process with its own warm DocumentPool. Requests that
+    modify a file are serialized per file, so two workers never save the
+    same document at once.
+    """
+
+    STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found",
+                   413: "Payload Too Large", 422: "Unprocessable Entity",
+                   500: "Internal Server Error"}
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 workers: Optional[int] = None, max_open: int = 8,
+                 cache_dir: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.max_open = max_open
+        self.cache_dir = cache_dir
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self._write_locks: Dict[str, asyncio.Lock] = {}
+        self._stopping: Optional[asyncio.Event] = None
+        self._jobs: Set[Future] = set()  # Submitted to the pool and not finished
+        self.requests_served = 0
+        self.routes = {
+            "/search": self._search,
+            "/extract-numbers": self._extract_numbers,
+            "/highlight": self._highlight,
+            "/render-page": self._render_page,
+        }
+
+    async def start(self) -> None:
+        """Start the worker pool and listen for connections."""
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self.max_open, self.cache_dir)
+        )
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        logger.info(f"Document service listening on http://{self.host}:{self.port} "
+                    f"with {self.workers} workers")
+
+    async def serve_forever(self) -> None:
+        """Serve until stop() is called or the process gets SIGTERM."""
+        self._stopping = asyncio.Event()
+        await self.start()
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, self.stop)
+        except (NotImplementedError, AttributeError):
+            pass  # No signal handlers on Windows event loops
+        try:
+            await self._stopping.wait()
+        finally:
+            self.close()
+
+    def stop(self) -> None:
+        """Make serve_forever() return."""
+        if self._stopping is not None:
+            self._stopping.set()
+
+    def close(self) -> None:
+        """Stop listening and shut the worker pool down."""
+        if self.server is not None:
+            self.server.close()
+        if self.executor is not None:
+            for job in list(self._jobs):
+                job.cancel()  # Only those not started yet; the rest run to the end
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        logger.info(f"Document service stopped after {self.requests_served} requests")
+
+    async def _run(self, job, *args):
+        future = self.executor.submit(job, *args)
+        self._jobs.add(future)
+        future.add_done_callback(self._jobs.discard)
+        return await asyncio.wrap_future(future)
+
+    @staticmethod
+    def _require(body: Dict, key: str, kind):
+        value = body.get(key)
+        if not isinstance(value, kind):
+            raise RequestError(400, f"Missing or invalid '{key}'")
+        return value
+
+    @staticmethod
+    def _is_number(value) -> bool:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+    @classmethod
+    def _numbers(cls, value, count: int, key: str) -> Tuple[float, ...]:
+        """A JSON list of `count` numbers as a tuple."""
+        if not (isinstance(value, list) and len(value) == count and all(map(cls._is_number, value))):
+            raise RequestError(400, f"'{key}' must be a list of {count} numbers")
+        return tuple(value)
+
+    async def _search(self, body: Dict):
+        path = self._require(body, "path", str)
+        query = self._require(body, "query", str)
+        limit = body.get("limit")
+        if limit is not None and not (isinstance(limit, int) and limit > 0):
+            raise RequestError(400, "'limit' must be a positive integer")
+        return {"results": await self._run(search_job, path, query, limit)}
+
+    async def _extract_numbers(self, body: Dict):
+        path = self._require(body, "path", str)
+        pages = body.get("pages")
+        if pages is not None and not (isinstance(pages, list) and
+                                      all(isinstance(page, int) for page in pages)):
+            raise RequestError(400, "Invalid 'pages'")
+        return {"pages": await self._run(extract_numbers_job, path, pages)}
+
+    async def _highlight(self, body: Dict):
+        path = os.path.abspath(self._require(body, "path", str))
+        color = body.get("color")
+        color = DEFAULT_COLOR if color is None else self._numbers(color, 3, "color")
+        if not all(0 <= component <= 1 for component in color):
+            raise RequestError(400, "'color' components must be between 0 and 1")
+        query = body.get("query")
+        if query is not None and not isinstance(query, str):
+            raise RequestError(400, "Invalid 'query'")
+        bboxes = None
+        if not query:
+            self._require(body, "page", int)
+            bboxes = [self._numbers(bbox, 4, f"bboxes[{i}]")
+                      for i, bbox in enumerate(self._require(body, "bboxes", list))]
+        annotation_mode = body.get("annotation_mode", ANNOT_MODE_RECT)
+        if annotation_mode not in ANNOTATION_MODES:
+            raise RequestError(400, f"'annotation_mode' must be one of {', '.join(ANNOTATION_MODES)}")
+        lock = self._write_locks.setdefault(path, asyncio.Lock())
+        async with lock:
+            return await self._run(highlight_job, path, color, query,
+                                   body.get("page"), bboxes, annotation_mode)
+
+    async def _render_page(self, body: Dict):
+        path = self._require(body, "path", str)
+        page = self._require(body, "page", int)
+        zoom = body.get("zoom", 1.0)
+        if not (self._is_number(zoom) and 0.1 <= zoom <= 8.0):
+            raise RequestError(400, "Zoom must be a number between 0.1 and 8")
+        return await self._run(render_page_job, path, page, zoom)
+
+    async def _dispatch(self, method: str, target: str, body: bytes) -> Tuple[int, str, bytes]:
+        """Route one request to its endpoint."""
+        if target == "/health":
+            return 200, "application/json", b'{"status": "ok"}'
+        handler = self.routes.get(target)
+        if handler is None:
+            raise RequestError(404, f"Unknown endpoint {target}")
+        if method != "POST":
+            raise RequestError(400, f"{target} expects POST")
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            raise RequestError(400, "Body is not valid JSON")
+        if not isinstance(request, dict):
+            raise RequestError(400, "Body must be a JSON object")
+
+        try:
+            result = await handler(request)
+        except PDFError as e:
+            raise RequestError(422, str(e))
+        if isinstance(result, bytes):
+            return 200, "image/png", result
+        return 200, "application/json", json.dumps(result).encode("utf-8")
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve requests on one keep-alive connection."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = (headers.get("connection", "").lower() != "close" and
+                              version == "HTTP/1.1")
+                started = time.perf_counter()
+                body = None
+                try:
+                    length = headers.get("content-length", "0")
+                    if not length.isdigit():
+                        raise RequestError(400, "Invalid Content-Length")
+                    if int(length) > MAX_BODY_BYTES:
+                        raise RequestError(413, "Request body too large")
+                    body = await reader.readexactly(int(length)) if int(length) else b""
+                    status, content_type, payload = await self._dispatch(method, target, body)
+                except RequestError as e:
+                    status, content_type = e.status, "application/json"
+                    payload = json.dumps({"error": str(e)}).encode("utf-8")
+                except Exception as e:
+                    logger.error(f"Error serving {target}: {e}")
+                    status, content_type = 500, "application/json"
+                    payload = json.dumps({"error": str(e)}).encode("utf-8")
+                # The next request cannot be found after a body left unread
+                keep_alive = keep_alive and body is not None
+
+                self.requests_served += 1
+                endpoint = target if target in self.routes or target == "/health" else "other"
+                REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, status=str(status))
+                writer.write(
+                    f"HTTP/1.1 {status} {self.STATUS_TEXT.get(status, '')}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                    .encode("latin-1") + payload
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
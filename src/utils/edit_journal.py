@@ -0,0 +1,188 @@
+"""
+PDF Highlighter 2.0 - Edit Journal
+Last Updated: 2026-10-19 10:37:05 UTC
+Author: 5446-boop
+"""
+
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, asdict, field
+from typing import Dict, List, Tuple, Optional
+
+logger = logging.getLogger(__name__)
+
+OP_HIGHLIGHT = "highlight"
+OP_REMOVE = "remove"
+OP_UNDO = "undo"  # Takes back the last edit in effect
+OP_REDO = "redo"  # Restores the last edit taken back
+
+@dataclass
+class RemovedHighlight:
+    """What it takes to recreate a deleted highlight annotation."""
+    vertices: List[Tuple[float, float]]
+    color: Optional[Tuple[float, float, float]]
+    opacity: float
+    info: Dict[str, str]
+
+@dataclass
+class JournalEntry:
+    """A single recorded highlight edit."""
+    op: str  # OP_HIGHLIGHT, OP_REMOVE, OP_UNDO or OP_REDO
+    page_num: int  # 1-based page number
+    timestamp: str  # Local time of the edit, "%Y-%m-%d %H:%M:%S"
+    text: str = ""  # Search text the edit was made for
+    rects: List[Tuple[float, float, float, float]] = field(default_factory=list)
+    color: Optional[Tuple[float, float, float]] = None  # RGB values
+    xrefs: Optional[List[int]] = None  # Annotation xrefs, known once applied
+    removed: List[RemovedHighlight] = field(default_factory=list)  # Deleted by a removal, not journaled
+
+    def to_json(self) -> str:
+        """Serialize the entry as a single journal line."""
+        data = asdict(self)
+        del data["removed"]
+        return json.dumps(data, separators=(",", ":"))
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "JournalEntry":
+        """Build an entry from a decoded journal line."""
+        color = data.get("color")
+        return cls(
+            op=data["op"],
+            page_num=int(data["page_num"]),
+            timestamp=data["timestamp"],
+            text=data.get("text", ""),
+            rects=[tuple(rect) for rect in data.get("rects", [])],
+            color=tuple(color) if color is not None else None,
+            xrefs=data.get("xrefs")
+        )
+
+def replay_undo(entries: List[JournalEntry]) -> Tuple[List[JournalEntry], List[JournalEntry]]:
+    """Edits in effect and edits taken back (last undone last) after a run of entries."""
+    done: List[JournalEntry] = []
+    undone: List[JournalEntry] = []
+    for entry in entries:
+        if entry.op == OP_UNDO:
+            if done:
+                undone.append(done.pop())
+        elif entry.op == OP_REDO:
+            if undone:
+                done.append(undone.pop())
+        else:
+            done.append(entry)
+            undone.clear()
+    return done, undone
+
+def pdf_stamp(pdf_path: str) -> Optional[Dict[str, int]]:
+    """Size and modification time of a PDF, None if it cannot be read."""
+    try:
+        stat = os.stat(pdf_path)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    except OSError:
+        return None
+
+class EditJournal:
+    """Append-only journal of highlight edits stored next to the PDF.
+
+    Every edit, undo and redo costs one fsync'd line. The journal is cleared once its
+    entries have been applied and the document saved, so a journal that is
+    still present on load holds edits lost by a crash. Its first line
+    records the size and modification time the PDF had when the journal
+    was opened, so that edits are not replayed onto a file changed since.
+    """
+
+    SUFFIX = ".journal"
+    STALE_SUFFIX = ".stale"
+
+    def __init__(self, pdf_path: str):
+        self.path = f"{os.path.abspath(pdf_path)}{self.SUFFIX}"
+        self.pdf_path = os.path.abspath(pdf_path)
+        self.stamp = pdf_stamp(self.pdf_path)  # Of the PDF the edits apply to
+        self._file = None
+
+    def append(self, entry: JournalEntry) -> bool:
+        """Durably append an entry to the journal."""
+        try:
+            if self._file is None:
+                new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+                self._file = open(self.path, "a", encoding="utf-8")
+                if new:
+                    self._file.write(json.dumps({"pdf": self.stamp}, separators=(",", ":")) + "\n")
+            self._file.write(entry.to_json() + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            return True
+        except Exception as e:
+            logger.error(f"Error writing journal {self.path}: {e}")
+            return False
+
+    def read(self) -> List[JournalEntry]:
+        """Read all complete entries from the journal."""
+        entries = []
+        if not os.path.exists(self.path):
+            return entries
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line_no, line in enumerate(f, 1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        data = json.loads(line)
+                        if "pdf" in data:
+                            continue  # The header, see matches_pdf
+                        entries.append(JournalEntry.from_dict(data))
+                    except (ValueError, KeyError, TypeError) as e:
+                        # A crash can leave a partially written last line
+                        logger.warning(f"Skipping damaged journal line {line_no}: {e}")
+        except Exception as e:
+            logger.error(f"Error reading journal {self.path}: {e}")
+        return entries
+
+    def matches_pdf(self) -> bool:
+        """Whether the PDF is still the file the journaled edits were made to.
+
+        Journals without a header, written before it was added, cannot be
+        checked and are taken to match.
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.loads(f.readline() or "{}")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Cannot read the header of journal {self.path}: {e}")
+            return True
+        if not isinstance(data, dict) or "pdf" not in data:
+            return True
+        return data["pdf"] is not None and data["pdf"] == self.stamp
+
+    def set_aside(self) -> Optional[str]:
+        """Rename the journal so it is kept but not replayed; returns its new path."""
+        self.close()
+        stale_path = f"{self.path}{self.STALE_SUFFIX}-{time.strftime('%Y%m%d-%H%M%S')}"
+        try:
+            os.replace(self.path, stale_path)
+            return stale_path
+        except Exception as e:
+            logger.error(f"Error setting journal {self.path} aside: {e}")
+            return None
+
+    def clear(self) -> None:
+        """Remove the journal after its entries have been saved."""
+        self.close()
+        try:
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        except Exception as e:
+            logger.error(f"Error clearing journal {self.path}: {e}")
+
+    def close(self) -> None:
+        """Close the journal file handle, keeping its contents."""
+        try:
+            if self._file is not None:
+                self._file.close()
+        except Exception as e:
+            logger.error(f"Error closing journal {self.path}: {e}")
+        finally:
+            self._file = None
@@ -0,0 +1,194 @@
+"""
+PDF Highlighter 2.0 - Field Extraction
+Last Updated: 2026-10-19 11:08:03 UTC
+Author: 5446-boop
+"""
+
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class FieldSpec:
+    """How to find one field on a page.
+
+    The value is the first group of `pattern`, or the whole match if it has
+    no group. A value directly after one of the `anchors` labels (on the
+    same line, or at the start of the next one) wins; without an anchored
+    value the `occurrence`-th match on the page is taken, falling back to
+    the last earlier one, unless `anchor_required` is set. `region` limits
+    the field to part of the page, as fractions (x0, y0, x1, y1) of its
+    width and height.
+    """
+    name: str
+    pattern: str
+    anchors: List[str] = field(default_factory=list)
+    anchor_required: bool = False
+    occurrence: int = 0
+    last_anchored: bool = False  # Prefer the last anchored value, e.g. a grand total
+    region: Optional[Tuple[float, float, float, float]] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "FieldSpec":
+        data = dict(data)
+        if data.get("region") is not None:
+            data["region"] = tuple(data["region"])
+        return cls(**data)
+
+INVOICE_NUMBER = "invoice_number"
+DELIVERY_NUMBER = "delivery_number"
+INVOICE_DATE = "invoice_date"
+TOTAL = "total"
+
+DEFAULT_FIELDS = [
+    # Without a label, the second 8-digit number on the page, as always
+    FieldSpec(INVOICE_NUMBER, r"(?<!\d)(\d{8})(?!\d)",
+              anchors=[r"\binvoice\s*(?:no\.?|number|#)", r"\bfaktura\s*(?:nr\.?|nummer)"],
+              occurrence=1),
+    FieldSpec(DELIVERY_NUMBER, r"(\d{5,12})",
+              anchors=[r"\bdelivery(?:[-\s])?(?:no\.?|number:?|#)?"],
+              anchor_required=True),
+    FieldSpec(INVOICE_DATE, r"\b(\d{4}-\d{2}-\d{2}|\d{1,2}[./-]\d{1,2}[./-]\d{2,4})\b",
+              anchors=[r"\b(?:invoice\s*)?date\b:?", r"\b(?:faktura)?dato\b:?"]),
+    FieldSpec(TOTAL, r"(-?\d{1,3}(?:[.,\s]?\d{3})*[.,]\d{2})\b",
+              anchors=[r"\btotal(?:\s*amount)?\b", r"\bamount\s*due\b", r"\bi\s*alt\b"],
+              anchor_required=True, last_anchored=True),
+]
+
+# Between a label and its value: separators, and at most one line break
+_SEPARATORS = r"[ \t:#.\-]*(?:\r?\n[ \t:#.\-]*)?"
+
+FIELDS_ENV = "PDF_HIGHLIGHTER_FIELDS"
+
+def load_field_specs(path: str) -> List[FieldSpec]:
+    """Read field specs from a JSON list of FieldSpec objects."""
+    with open(path, encoding="utf-8") as f:
+        return [FieldSpec.from_dict(data) for data in json.load(f)]
+
+def default_field_specs() -> List[FieldSpec]:
+    """Specs in the JSON file named by PDF_HIGHLIGHTER_FIELDS, or DEFAULT_FIELDS.
+
+    Being read from the environment, the same specs also reach worker
+    processes.
+    """
+    path = os.environ.get(FIELDS_ENV)
+    if not path:
+        return DEFAULT_FIELDS
+    try:
+        return load_field_specs(path)
+    except (OSError, ValueError, TypeError) as e:
+        logger.warning(f"Ignoring field specs in {path}: {e}")
+        return DEFAULT_FIELDS
+
+class _CompiledField:
+    """A FieldSpec compiled into one regex per lookup strategy.
+
+    Both run over a page's whole text at once, so a field costs one or two
+    regex scans per page however many lines the page has.
+    """
+
+    def __init__(self, spec: FieldSpec):
+        self.spec = spec
+        self.value = re.compile(spec.pattern, re.IGNORECASE)
+        self.anchored = None
+        if spec.anchors:
+            labels = "|".join(f"(?:{anchor})" for anchor in spec.anchors)
+            self.anchored = re.compile(f"(?:{labels}){_SEPARATORS}(?P<value>{spec.pattern})",
+                                       re.IGNORECASE)
+
+    def _group(self, match, name=None) -> str:
+        if name is None:
+            return match.group(1) if self.value.groups else match.group(0)
+        # The value's own first group follows the named group wrapping it
+        index = match.re.groupindex[name]
+        return match.group(index + 1) if self.value.groups else match.group(index)
+
+    def evaluate(self, text: str) -> Optional[str]:
+        """Value of the field in a page's text."""
+        if self.anchored is not None:
+            if self.spec.last_anchored:
+                match = None
+                for match in self.anchored.finditer(text):
+                    pass
+            else:
+                match = self.anchored.search(text)
+            if match is not None:
+                return self._group(match, "value")
+            if self.spec.anchor_required:
+                return None
+
+        found = None
+        for count, match in enumerate(self.value.finditer(text)):
+            found = match
+            if count == self.spec.occurrence:
+                break
+        return self._group(found) if found is not None else None
+
+class FieldExtractor:
+    """Evaluates a set of field specs against one extraction of a page.
+
+    Fields without a region are read from the page text; the words of the
+    layout are only needed, and grouped into lines once, for fields
+    limited to a region of the page.
+    """
+
+    def __init__(self, specs: Optional[List[FieldSpec]] = None):
+        self.specs = list(specs if specs is not None else default_field_specs())
+        self._fields = [_CompiledField(spec) for spec in self.specs]
+        # Changes whenever the extraction would, for use in cache keys
+        self.signature = json.dumps([asdict(spec) for spec in self.specs], sort_keys=True)
+
+    @property
+    def names(self) -> List[str]:
+        return [spec.name for spec in self.specs]
+
+    @property
+    def needs_layout(self) -> bool:
+        """Check whether any field needs word positions."""
+        return any(spec.region is not None for spec in self.specs)
+
+    @staticmethod
+    def region_text(words: List[tuple], page_rect, region: Tuple[float, float, float, float]) -> str:
+        """Text of the words centered inside a region, one line per text line."""
+        x0, y0, x1, y1 = page_rect
+        width, height = x1 - x0, y1 - y0
+        rx0, ry0 = x0 + region[0] * width, y0 + region[1] * height
+        rx1, ry1 = x0 + region[2] * width, y0 + region[3] * height
+
+        lines = []
+        current_key = None
+        for word in words:
+            if not (rx0 <= (word[0] + word[2]) / 2 <= rx1 and ry0 <= (word[1] + word[3]) / 2 <= ry1):
+                continue
+            key = (word[5], word[6])  # block, line
+            if key != current_key:
+                lines.append([])
+                current_key = key
+            lines[-1].append(word[4])
+        return "\n".join(" ".join(line) for line in lines)
+
+    def extract(self, text: str, words: Optional[List[tuple]] = None,
+                page_rect=None) -> Dict[str, Optional[str]]:
+        """All fields of a page.
+
+        words (page.get_text("words") tuples) and page_rect are needed for
+        fields with a region; without them such fields are read from the
+        whole page.
+        """
+        texts: Dict[Optional[tuple], str] = {None: text}
+        values = {}
+        for compiled in self._fields:
+            region = compiled.spec.region if words is not None else None
+            if region not in texts:
+                texts[region] = self.region_text(words, tuple(page_rect), region)
+            try:
+                values[compiled.spec.name] = compiled.evaluate(texts[region])
+            except Exception as e:
+                logger.warning(f"Error extracting field {compiled.spec.name}: {e}")
+                values[compiled.spec.name] = None
+        return values
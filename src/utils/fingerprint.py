@@ -0,0 +1,117 @@
+"""
+PDF Highlighter 2.0 - Content Fingerprints
+Last Updated: 2026-10-19 10:10:10 UTC
+Author: 5446-boop
+
+Fingerprints that stay the same for the same content, so a file or page
+that arrives twice is recognized and its extraction reused instead of
+repeated.
+"""
+
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+def file_fingerprint(filepath: str) -> str:
+    """SHA-256 of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class PageFingerprinter:
+    """Fingerprints of the pages of one document.
+
+    A page's fingerprint hashes its normalized text together with the
+    contents of the images and form XObjects it draws. Contents rather
+    than xref numbers are hashed, so the same page matches across files;
+    a stream used by many pages is hashed once. Pages without any text
+    also hash their content streams, so that blank or purely vector pages
+    only match when they draw the same thing.
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self._digests: Dict[int, bytes] = {}  # xref -> digest of its stream
+
+    def _stream_digest(self, xref: int) -> bytes:
+        digest = self._digests.get(xref)
+        if digest is None:
+            digest = hashlib.sha1(self.doc.xref_stream_raw(xref) or b"").digest()
+            self._digests[xref] = digest
+        return digest
+
+    def fingerprint(self, page, normalized_text: str) -> str:
+        """Fingerprint of a page, given its text as normalize_text returns it."""
+        normalized_text = normalized_text.strip()
+        xrefs = {image[0] for image in page.get_images(full=True)}
+        xrefs.update(xobject[0] for xobject in page.get_xobjects())
+        if not normalized_text:
+            xrefs.update(page.get_contents())
+        digest = hashlib.sha1(normalized_text.encode("utf-8"))
+        for stream_digest in sorted(self._stream_digest(xref) for xref in xrefs if xref > 0):
+            digest.update(stream_digest)
+        return digest.hexdigest()
+
+@dataclass
+class Duplicate:
+    """A file or page whose content was seen before in the same run."""
+    filepath: str
+    page_num: Optional[int]  # 1-based, None for a whole file
+    original_filepath: str
+    original_page_num: Optional[int]
+
+    def describe(self) -> str:
+        if self.page_num is None:
+            return f"{self.filepath} is a duplicate of {self.original_filepath}"
+        return (f"{self.filepath} page {self.page_num} is a duplicate of "
+                f"{self.original_filepath} page {self.original_page_num}")
+
+class DuplicateTracker:
+    """First occurrence of every file and page fingerprint seen in a batch run.
+
+    Check each file before its pages: the pages of a duplicate file are
+    not recorded, since their first occurrences are already known.
+    """
+
+    def __init__(self):
+        self._files: Dict[str, str] = {}  # fingerprint -> filepath
+        self._pages: Dict[str, Tuple[str, int]] = {}  # fingerprint -> filepath, page
+        self.duplicates: List[Duplicate] = []
+
+    def check_file(self, filepath: str, fingerprint: str) -> Optional[Duplicate]:
+        """Record a file, or return the duplicate it is."""
+        original = self._files.setdefault(fingerprint, filepath)
+        if original == filepath:
+            return None
+        duplicate = Duplicate(filepath, None, original, None)
+        self.duplicates.append(duplicate)
+        logger.info(duplicate.describe())
+        return duplicate
+
+    def check_page(self, filepath: str, page_num: int, fingerprint: Optional[str]) -> Optional[Duplicate]:
+        """Record a 1-based page, or return the duplicate it is."""
+        if fingerprint is None:
+            return None
+        original = self._pages.setdefault(fingerprint, (filepath, page_num))
+        if original == (filepath, page_num):
+            return None
+        duplicate = Duplicate(filepath, page_num, *original)
+        self.duplicates.append(duplicate)
+        logger.debug(duplicate.describe())
+        return duplicate
+
+    def counts(self) -> Tuple[int, int]:
+        """Number of duplicate files and duplicate pages found."""
+        files = sum(1 for duplicate in self.duplicates if duplicate.page_num is None)
+        return files, len(self.duplicates) - files
+
+    def summary(self) -> str:
+        files, pages = self.counts()
+        return f"{files} duplicate files, {pages} duplicate pages"
@@ -0,0 +1,215 @@
+"""
+PDF Highlighter 2.0 - Watch Folder Ingestion
+Last Updated: 2026-10-19 11:08:03 UTC
+Author: 5446-boop
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from .field_extraction import FieldExtractor
+from .index_store import IndexStore
+from .pdf_handler import PDFHandler
+
+logger = logging.getLogger(__name__)
+
+def index_file(filepath: str, cache_dir: Optional[str] = None) -> Tuple[int, Optional[str]]:
+    """Extract and store the text and numbers of one PDF.
+
+    Runs in a worker process. Returns the number of pages indexed and,
+    for a copy of a file indexed before, the file whose index it reused.
+    Raises if the document cannot be loaded.
+    """
+    handler = PDFHandler(IndexStore(cache_dir))
+    try:
+        handler.load_document(filepath, background_index=False)
+        return handler.build_index(), handler.duplicate_of
+    finally:
+        handler.close()
+
+@dataclass
+class IngestStats:
+    """Throughput counters of a watcher."""
+    started: float = field(default_factory=time.perf_counter)
+    files: int = 0
+    pages: int = 0
+    failures: int = 0
+    retries: int = 0
+    duplicates: int = 0  # Files whose index was reused from a copy
+    busy_seconds: float = 0.0  # Summed worker time of indexed files
+
+    def pages_per_second(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.pages / elapsed if elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return (f"{self.files} files, {self.pages} pages "
+                f"({self.pages_per_second():.1f} pages/s), "
+                f"{self.duplicates} duplicates, {self.failures} failed, {self.retries} retries")
+
+@dataclass
+class _Candidate:
+    """A PDF seen in the folder that is not indexed in its current state."""
+    stamp: Tuple[int, int]  # size, mtime_ns at the last poll
+    stable_polls: int = 0
+    attempts: int = 0
+    not_before: float = 0.0  # Earliest retry time
+
+class FolderWatcher:
+    """Polls a folder for new or changed PDFs and indexes them in worker processes.
+
+    Polling keeps the watcher portable and free of extra dependencies; a
+    file is only picked up once its size and modification time have held
+    still for a poll, so files that are still being written are left alone.
+    At most max_pending files are handed to the pool at a time, and the
+    rest wait in the folder until a worker frees up.
+    """
+
+    STABLE_POLLS = 1  # Unchanged polls before a file is considered complete
+    MAX_ATTEMPTS = 3
+    RETRY_DELAY = 5.0  # Seconds, doubled after each failed attempt
+    STATS_INTERVAL = 60.0  # Seconds between throughput log lines
+
+    def __init__(self, folder: str, cache_dir: Optional[str] = None,
+                 workers: Optional[int] = None, interval: float = 2.0,
+                 max_pending: Optional[int] = None, recursive: bool = False):
+        self.folder = os.path.abspath(folder)
+        self.cache_dir = cache_dir
+        self.store = IndexStore(cache_dir)
+        self.fields_signature = FieldExtractor().signature  # Of the fields index_file extracts
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.interval = interval
+        self.max_pending = max_pending or self.workers * 2
+        self.recursive = recursive
+        self.stats = IngestStats()
+        self._candidates: Dict[str, _Candidate] = {}
+        self._indexed: Dict[str, Tuple[int, int]] = {}  # path -> stamp it was indexed at
+        self._pending: Dict[Future, Tuple[str, _Candidate, float]] = {}
+        self._stop_event = threading.Event()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        """Size and mtime of every PDF in the folder."""
+        found = {}
+        for root, dirs, files in os.walk(self.folder):
+            if not self.recursive:
+                dirs.clear()
+            for name in files:
+                if not name.lower().endswith(".pdf"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue  # Removed since listing
+                found[path] = (stat.st_size, stat.st_mtime_ns)
+        return found
+
+    def _is_warm(self, path: str) -> bool:
+        """Check whether the store already has a current index of a file."""
+        return self.store.load(path, self.fields_signature) is not None
+
+    def poll(self) -> None:
+        """Scan the folder once and submit files that are ready."""
+        now = time.monotonic()
+        found = self._scan()
+        in_flight = {path for path, _, _ in self._pending.values()}
+
+        for path in [path for path in self._candidates if path not in found]:
+            del self._candidates[path]
+
+        for path, stamp in found.items():
+            if path in in_flight or self._indexed.get(path) == stamp:
+                continue
+            candidate = self._candidates.get(path)
+            if candidate is None:
+                if path not in self._indexed and self._is_warm(path):
+                    self._indexed[path] = stamp
+                    continue
+                self._candidates[path] = _Candidate(stamp)
+            elif candidate.stamp != stamp:
+                # Still being written
+                candidate.stamp = stamp
+                candidate.stable_polls = 0
+            else:
+                candidate.stable_polls += 1
+
+        for path, candidate in list(self._candidates.items()):
+            if len(self._pending) >= self.max_pending:
+                break  # Backpressure: the rest waits for the next poll
+            if candidate.stable_polls < self.STABLE_POLLS or candidate.not_before > now:
+                continue
+            del self._candidates[path]
+            candidate.attempts += 1
+            future = self._executor.submit(index_file, path, self.cache_dir)
+            self._pending[future] = (path, candidate, time.perf_counter())
+
+    def _collect(self) -> None:
+        """Account for finished jobs, rescheduling failed ones."""
+        for future in [future for future in self._pending if future.done()]:
+            path, candidate, submitted = self._pending.pop(future)
+            stamp = candidate.stamp
+            try:
+                pages, duplicate_of = future.result()
+                self._indexed[path] = stamp
+                self.stats.files += 1
+                self.stats.pages += pages
+                self.stats.busy_seconds += time.perf_counter() - submitted
+                if duplicate_of:
+                    self.stats.duplicates += 1
+                    logger.info(f"Indexed {path} ({pages} pages) as a duplicate of {duplicate_of}")
+                else:
+                    logger.info(f"Indexed {path} ({pages} pages)")
+            except Exception as e:
+                if candidate.attempts >= self.MAX_ATTEMPTS:
+                    # Given up until the file changes again
+                    self._indexed[path] = stamp
+                    self.stats.failures += 1
+                    logger.error(f"Giving up on {path} after {candidate.attempts} attempts: {e}")
+                else:
+                    self.stats.retries += 1
+                    candidate.not_before = (time.monotonic() +
+                                            self.RETRY_DELAY * 2 ** (candidate.attempts - 1))
+                    self._candidates.setdefault(path, candidate)
+                    logger.warning(f"Indexing {path} failed, retrying: {e}")
+
+    def queue_depth(self) -> int:
+        """Files waiting for or held by a worker."""
+        return len(self._candidates) + len(self._pending)
+
+    def run(self, once: bool = False) -> IngestStats:
+        """Watch the folder until stopped.
+
+        With once=True, index what is in the folder now and return.
+        """
+        logger.info(f"Watching {self.folder} with {self.workers} workers")
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        last_stats = time.monotonic()
+        try:
+            while not self._stop_event.is_set():
+                self._collect()
+                self.poll()
+                if once and not self._pending and not self._candidates:
+                    break
+                if time.monotonic() - last_stats >= self.STATS_INTERVAL:
+                    last_stats = time.monotonic()
+                    logger.info(f"Ingest: {self.stats.summary()}, queue {self.queue_depth()}")
+                self._stop_event.wait(self.interval)
+        finally:
+            # Files not started yet are picked up again by the next run
+            for future in [future for future in self._pending if future.cancel()]:
+                del self._pending[future]
+            self._executor.shutdown(wait=True)
+            self._collect()
+            self._executor = None
+            logger.info(f"Ingest finished: {self.stats.summary()}")
+        return self.stats
+
+    def stop(self) -> None:
+        """Make run() return after the current poll."""
+        self._stop_event.set()
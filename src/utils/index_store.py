@@ -0,0 +1,141 @@
+"""
+PDF Highlighter 2.0 - Persistent Index Store
+Last Updated: 2026-10-19 11:08:03 UTC
+Author: 5446-boop
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .metrics import count_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = Path.home() / ".pdf_highlighter" / "index"
+
+def default_cache_dir() -> Path:
+    """Cache directory, overridable with PDF_HIGHLIGHTER_CACHE."""
+    return Path(os.environ.get("PDF_HIGHLIGHTER_CACHE", DEFAULT_CACHE_DIR))
+
+class IndexStore:
+    """On-disk cache of extracted page text and fields, one file per PDF.
+
+    An entry is only valid while the PDF's size and modification time are
+    those it was built from, so a changed file is simply re-indexed. It is
+    also only valid for the field specs it was extracted with, named by
+    their FieldExtractor signature. Entries stored with the file's content
+    fingerprint can also be found by it, so a copy of an indexed file under
+    another name reuses its entries.
+    """
+
+    VERSION = 2
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = Path(cache_dir) if cache_dir else default_cache_dir()
+
+    def entry_path(self, filepath: str) -> Path:
+        """Cache file of a PDF."""
+        key = hashlib.sha1(os.path.abspath(filepath).encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{key}.json.gz"
+
+    def _stamp(self, filepath: str) -> Dict[str, int]:
+        stat = os.stat(filepath)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def content_link(self, fingerprint: str) -> Path:
+        """File naming the entry of a PDF's content fingerprint."""
+        return self.cache_dir / "content" / fingerprint
+
+    def _read(self, path: Path, fields_signature: Optional[str]) -> Optional[Dict]:
+        if not path.is_file():
+            return None
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != self.VERSION:
+            return None
+        if fields_signature is not None and data.get("fields_signature") != fields_signature:
+            logger.debug(f"Index in {path.name} was extracted with other field specs")
+            return None
+        return data
+
+    def load(self, filepath: str, fields_signature: Optional[str] = None) -> Optional[List[Dict]]:
+        """Per-page entries of a PDF, or None if missing or out of date.
+
+        Each page entry has the page's "text", its extracted "fields" and
+        its content "fingerprint" (None if not computed). Given the
+        signature of the field specs, entries extracted with others are
+        out of date too.
+        """
+        pages = None
+        try:
+            data = self._read(self.entry_path(filepath), fields_signature)
+            if data is not None:
+                stamp = self._stamp(filepath)
+                if data.get("size") != stamp["size"] or data.get("mtime_ns") != stamp["mtime_ns"]:
+                    logger.debug(f"Index of {filepath} is out of date")
+                else:
+                    pages = data["pages"]
+        except Exception as e:
+            logger.warning(f"Error reading index of {filepath}: {e}")
+        count_cache("index", pages is not None)
+        return pages
+
+    def load_by_content(self, fingerprint: str,
+                        fields_signature: Optional[str] = None) -> Optional[Tuple[str, List[Dict]]]:
+        """Path and per-page entries of an indexed file with the given content."""
+        try:
+            link = self.content_link(fingerprint)
+            if not link.is_file():
+                return None
+            data = self._read(self.cache_dir / link.read_text(encoding="utf-8").strip(), fields_signature)
+            if data is None or data.get("fingerprint") != fingerprint:
+                return None  # Replaced by an entry of other content since
+            return data["filepath"], data["pages"]
+        except Exception as e:
+            logger.warning(f"Error reading index of content {fingerprint}: {e}")
+            return None
+
+    def save(self, filepath: str, pages: List[Dict], fingerprint: Optional[str] = None,
+             fields_signature: Optional[str] = None) -> bool:
+        """Store the per-page entries of a PDF as of its current state.
+
+        Given the file's content fingerprint, the entries can also be
+        found by it from then on. fields_signature names the field specs
+        the entries' fields were extracted with.
+        """
+        path = self.entry_path(filepath)
+        temp_path = path.with_suffix(".tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            data = {
+                "version": self.VERSION,
+                "filepath": os.path.abspath(filepath),
+                **self._stamp(filepath),
+                "fingerprint": fingerprint,
+                "fields_signature": fields_signature,
+                "pages": pages
+            }
+            with gzip.open(temp_path, "wt", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(temp_path, path)
+            if fingerprint:
+                link = self.content_link(fingerprint)
+                link.parent.mkdir(exist_ok=True)
+                temp_link = link.with_name(f"{fingerprint}.{os.getpid()}.tmp")
+                temp_link.write_text(path.name, encoding="utf-8")
+                os.replace(temp_link, link)
+            logger.debug(f"Stored index of {filepath} ({len(pages)} pages)")
+            return True
+        except Exception as e:
+            logger.error(f"Error writing index of {filepath}: {e}")
+            try:
+                if temp_path.exists():
+                    temp_path.unlink()
+            except Exception:
+                pass
+            return False
@@ -0,0 +1,198 @@
+"""
+PDF Highlighter 2.0 - Split by Invoice
+Last Updated: 2026-10-19 10:54:02 UTC
+Author: 5446-boop
+
+Splits a batch PDF into one file per invoice. Pages are grouped by the
+invoice number extracted from each of them: a page with a new number
+starts an invoice, and pages without one belong to the invoice before
+them. The groups are written by worker processes that open the source
+once each and copy page ranges out of it with insert_pdf, and a manifest
+lists every file written.
+"""
+
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Set, Tuple
+
+from .fingerprint import file_fingerprint
+from .index_store import IndexStore
+from .pdf_handler import PDFHandler
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+NO_INVOICE = "no_invoice"  # File name stem of pages before the first invoice number
+CHUNK_GROUPS = 16  # Groups handed to a worker at a time
+
+@dataclass
+class InvoiceGroup:
+    """Consecutive pages of one invoice, 1-based and inclusive."""
+    invoice_number: Optional[str]
+    first_page: int
+    last_page: int
+    delivery_numbers: List[str] = field(default_factory=list)
+    file: str = ""  # Name of the file written, relative to the output folder
+    bytes: int = 0
+    error: Optional[str] = None
+
+    @property
+    def pages(self) -> int:
+        return self.last_page - self.first_page + 1
+
+def group_pages(numbers: Iterable[Tuple[int, Optional[str], Optional[str]]]) -> List[InvoiceGroup]:
+    """Group (page, invoice number, delivery number) rows into invoices."""
+    groups: List[InvoiceGroup] = []
+    for page_num, invoice_number, delivery_number in numbers:
+        current = groups[-1] if groups else None
+        if current is None or (invoice_number and invoice_number != current.invoice_number):
+            current = InvoiceGroup(invoice_number, page_num, page_num)
+            groups.append(current)
+        current.last_page = page_num
+        if delivery_number and delivery_number not in current.delivery_numbers:
+            current.delivery_numbers.append(delivery_number)
+    return groups
+
+def assign_filenames(groups: List[InvoiceGroup]) -> None:
+    """Name every group's file after its invoice number.
+
+    An invoice whose pages are not all consecutive gets one file per run,
+    numbered from the second on. So does any other name already taken,
+    e.g. by invoices "A/1" and "A_1", or "A" and "A_2", so that no file
+    overwrites another. Names are compared ignoring case, as on Windows.
+    """
+    taken: Set[str] = set()
+    for group in groups:
+        if group.invoice_number:
+            stem = re.sub(r"[^\w.-]+", "_", group.invoice_number).strip("._") or NO_INVOICE
+        else:
+            stem = f"{NO_INVOICE}_p{group.first_page}-{group.last_page}"
+        name, n = f"{stem}.pdf", 1
+        while name.lower() in taken:
+            n += 1
+            name = f"{stem}_{n}.pdf"
+        taken.add(name.lower())
+        group.file = name
+
+@dataclass
+class SplitReport:
+    """Outcome and throughput of a split."""
+    source: str
+    output_dir: str
+    pages: int = 0
+    groups: List[InvoiceGroup] = field(default_factory=list)
+    extract_seconds: float = 0.0
+    write_seconds: float = 0.0
+
+    @property
+    def failed(self) -> List[InvoiceGroup]:
+        return [group for group in self.groups if group.error]
+
+    def pages_per_second(self) -> float:
+        seconds = self.extract_seconds + self.write_seconds
+        return self.pages / seconds if seconds > 0 else 0.0
+
+    def summary(self) -> str:
+        written = len(self.groups) - len(self.failed)
+        return (f"{self.source}: {self.pages} pages into {written} invoices "
+                f"({self.pages_per_second():.1f} pages/s; numbers {self.extract_seconds:.2f}s, "
+                f"writing {self.write_seconds:.2f}s), {len(self.failed)} failed")
+
+# Runs in the worker processes, each with its own copy of the source
+
+_worker_source = None
+
+def _init_worker(source: str) -> None:
+    global _worker_source
+    import fitz  # PyMuPDF
+    _worker_source = fitz.open(source)
+
+def _write_group(output_dir: str, group: Tuple[str, int, int]) -> Tuple[int, Optional[str]]:
+    """Write pages of the source to a file; returns its size or the error."""
+    import fitz  # PyMuPDF
+
+    name, first_page, last_page = group
+    path = os.path.join(output_dir, name)
+    temp_path = f"{path}.tmp"
+    try:
+        out = fitz.open()
+        try:
+            out.insert_pdf(_worker_source, from_page=first_page - 1, to_page=last_page - 1)
+            out.save(temp_path, garbage=1, deflate=True)
+        finally:
+            out.close()
+        os.replace(temp_path, path)
+        return os.path.getsize(path), None
+    except Exception as e:
+        try:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        except OSError:
+            pass
+        return 0, f"{type(e).__name__}: {e}"
+
+def _write_groups(output_dir: str, groups: List[Tuple[str, int, int]]) -> List[Tuple[int, Optional[str]]]:
+    return [_write_group(output_dir, group) for group in groups]
+
+def write_manifest(report: SplitReport) -> str:
+    """Write the manifest of a split next to its files; returns its path."""
+    path = os.path.join(report.output_dir, MANIFEST_NAME)
+    manifest = {
+        "source": os.path.abspath(report.source),
+        "source_fingerprint": file_fingerprint(report.source),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "pages": report.pages,
+        "invoices": [dict(asdict(group), pages=group.pages) for group in report.groups]
+    }
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_path, path)
+    return path
+
+def split_by_invoice(source: str, output_dir: str, workers: Optional[int] = None,
+                     cache_dir: Optional[str] = None) -> SplitReport:
+    """Split a PDF into one file per invoice in output_dir, with a manifest.
+
+    Invoice numbers come from the index store when the source was indexed
+    before, and are extracted page by page otherwise. Raises PDFError if
+    the source cannot be loaded; groups that fail to be written are
+    reported in the manifest with their error.
+    """
+    report = SplitReport(source, output_dir)
+    started = time.perf_counter()
+    handler = PDFHandler(IndexStore(cache_dir))
+    try:
+        handler.load_document(source, background_index=False)
+        report.pages = len(handler.doc)
+        report.groups = group_pages(handler.iter_page_numbers())
+    finally:
+        handler.close()
+    assign_filenames(report.groups)
+    report.extract_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [(group.file, group.first_page, group.last_page) for group in report.groups]
+    chunks = [jobs[start:start + CHUNK_GROUPS] for start in range(0, len(jobs), CHUNK_GROUPS)]
+    workers = min(workers or max(1, (os.cpu_count() or 2) - 1), max(1, len(chunks)))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(os.path.abspath(source),)) as executor:
+        results = [result for chunk in executor.map(_write_groups, [output_dir] * len(chunks), chunks)
+                   for result in chunk]
+    for group, (size, error) in zip(report.groups, results):
+        group.bytes = size
+        group.error = error
+        if error:
+            logger.error(f"Failed to write {group.file}: {error}")
+    report.write_seconds = time.perf_counter() - started
+
+    write_manifest(report)
+    logger.info(report.summary())
+    return report
@@ -0,0 +1,85 @@
+"""
+PDF Highlighter 2.0 - Document Service Load Test
+Last Updated: 2026-10-19 09:17:36 UTC
+Author: 5446-boop
+
+Drives a running document service with concurrent keep-alive clients and
+reports requests per second and latency percentiles.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class LoadTestReport:
+    requests: int = 0
+    errors: int = 0
+    elapsed: float = 0.0
+    latencies: List[float] = field(default_factory=list)  # Seconds, successful requests
+
+    def percentile(self, fraction: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def requests_per_second(self) -> float:
+        return self.requests / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return (f"{self.requests} requests in {self.elapsed:.2f}s: "
+                f"{self.requests_per_second():.1f} req/s, "
+                f"p50 {self.percentile(0.50) * 1000:.1f} ms, "
+                f"p99 {self.percentile(0.99) * 1000:.1f} ms, "
+                f"{self.errors} errors")
+
+async def _client(host: str, port: int, endpoint: str, payload: bytes,
+                  count: int, report: LoadTestReport) -> None:
+    """Send requests one after another over a single connection."""
+    reader, writer = await asyncio.open_connection(host, port)
+    request = (f"POST {endpoint} HTTP/1.1\r\nHost: {host}\r\n"
+               f"Content-Type: application/json\r\n"
+               f"Content-Length: {len(payload)}\r\n\r\n").encode("latin-1") + payload
+    try:
+        for _ in range(count):
+            started = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.strip().lower() == "content-length":
+                    length = int(value)
+            await reader.readexactly(length)
+            report.requests += 1
+            if status == 200:
+                report.latencies.append(time.perf_counter() - started)
+            else:
+                report.errors += 1
+    finally:
+        writer.close()
+
+async def run_load_test(endpoint: str, body: Dict, host: str = "127.0.0.1", port: int = 8765,
+                        requests: int = 1000, concurrency: int = 16) -> LoadTestReport:
+    """Send `requests` copies of one request from `concurrency` clients."""
+    payload = json.dumps(body).encode("utf-8")
+    report = LoadTestReport()
+    per_client = [requests // concurrency + (1 if i < requests % concurrency else 0)
+                  for i in range(concurrency)]
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        _client(host, port, endpoint, payload, count, report)
+        for count in per_client if count
+    ))
+    report.elapsed = time.perf_counter() - started
+    return report
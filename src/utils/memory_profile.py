@@ -0,0 +1,311 @@
+"""
+PDF Highlighter 2.0 - Memory Profiling Harness
+Last Updated: 2026-10-19 10:53:38 UTC
+Author: 5446-boop
+
+Runs the main document operations over synthetic PDFs of increasing size
+and measures, per stage, the process RSS, which also covers MuPDF's own
+allocations, and for the stages that are mostly Python the heap as seen
+by tracemalloc. Tracing is left off for highlighting, saving and
+rendering: it slows the PyMuPDF calls they make by some 15 to 20 times. Memory that grows with the
+page count faster than a set bound is reported as a violation.
+
+Every size runs in a fresh process after a small warm-up document, so
+freed memory kept by one run, and one-off costs like loading Qt, do not
+hide in the numbers of another.
+"""
+
+import ctypes
+import ctypes.util
+import gc
+import multiprocessing
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence
+
+import fitz  # PyMuPDF
+
+from .index_store import IndexStore
+from .pdf_handler import PDFHandler
+
+logger = logging.getLogger(__name__)
+
+STAGE_LOAD = "load"
+STAGE_SEARCH = "search"
+STAGE_HIGHLIGHT = "highlight"
+STAGE_SAVE = "save"
+STAGE_RENDER = "render"
+STAGES = [STAGE_LOAD, STAGE_SEARCH, STAGE_HIGHLIGHT, STAGE_SAVE, STAGE_RENDER]
+TRACED_STAGES = {STAGE_LOAD, STAGE_SEARCH}
+
+DEFAULT_SIZES = (25, 100, 400)
+DEFAULT_BOUND_KB_PER_PAGE = 160.0  # Saving in rect mode peaks at about 115
+WARMUP_PAGES = 2
+SEARCH_QUERY = "hello"
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes, 0 if it cannot be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        return 0
+
+def _libc():
+    try:
+        return ctypes.CDLL(ctypes.util.find_library("c"))
+    except (OSError, TypeError):
+        return None
+
+_LIBC = _libc()
+
+def release_free_memory() -> None:
+    """Collect garbage and hand free heap back to the OS where glibc allows.
+
+    Without it the RSS keeps memory that was freed, and retained memory
+    could not be told apart from memory the allocator holds on to.
+    """
+    gc.collect()
+    malloc_trim = getattr(_LIBC, "malloc_trim", None)
+    if malloc_trim is not None:
+        malloc_trim(0)
+
+class RssSampler(threading.Thread):
+    """Samples the RSS in the background to catch its peak during a stage."""
+
+    INTERVAL = 0.005
+
+    def __init__(self):
+        super().__init__(daemon=True, name="RssSampler")
+        self.peak = current_rss()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.INTERVAL):
+            self.peak = max(self.peak, current_rss())
+
+    def stop(self) -> int:
+        """Stop sampling and return the peak RSS."""
+        self._stop_event.set()
+        self.join()
+        self.peak = max(self.peak, current_rss())
+        return self.peak
+
+@dataclass
+class StageMemory:
+    """Memory used by one stage on one document, in bytes above the stage's start."""
+    stage: str
+    pages: int
+    seconds: float
+    traced_peak: int
+    traced_retained: int
+    rss_peak: int
+    rss_retained: int
+
+    @property
+    def peak(self) -> int:
+        """The larger of the two peaks."""
+        return max(self.traced_peak, self.rss_peak)
+
+@dataclass
+class MemoryReport:
+    bound_kb_per_page: float
+    stages: List[StageMemory] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+
+    def growth_per_page(self, retained: bool = False) -> Dict[str, float]:
+        """Peak (or retained) memory added per extra page, in KB, for each stage.
+
+        The slope between the smallest and largest document, so the fixed
+        cost of a stage does not count.
+        """
+        def used(run: StageMemory) -> int:
+            return max(run.traced_retained, run.rss_retained) if retained else run.peak
+
+        growth = {}
+        for stage in STAGES:
+            runs = sorted((run for run in self.stages if run.stage == stage), key=lambda run: run.pages)
+            if len(runs) >= 2 and runs[-1].pages > runs[0].pages:
+                growth[stage] = (used(runs[-1]) - used(runs[0])) / 1024 / (runs[-1].pages - runs[0].pages)
+        return growth
+
+    def violations(self) -> List[str]:
+        """Stages whose peak or retained memory grows faster than the bound."""
+        return [
+            f"{stage}: {kind} {kb:.1f} KB/page exceeds {self.bound_kb_per_page:.1f} KB/page"
+            for kind, retained in (("peak", False), ("retained", True))
+            for stage, kb in self.growth_per_page(retained).items()
+            if kb > self.bound_kb_per_page
+        ]
+
+    def summary(self) -> str:
+        lines = [f"{'stage':<10} {'pages':>6} {'time s':>8} {'py peak':>10} {'py kept':>10} "
+                 f"{'rss peak':>10} {'rss kept':>10}"]
+        for run in self.stages:
+            lines.append(
+                f"{run.stage:<10} {run.pages:>6} {run.seconds:>8.2f} "
+                f"{_mb(run.traced_peak, run.stage):>10} {_mb(run.traced_retained, run.stage):>10} "
+                f"{_mb(run.rss_peak):>10} {_mb(run.rss_retained):>10}"
+            )
+        retained = self.growth_per_page(retained=True)
+        for stage, kb in self.growth_per_page().items():
+            lines.append(f"{stage} grows {kb:.1f} KB per page at peak, keeps {retained[stage]:.1f} "
+                         f"(bound {self.bound_kb_per_page:.1f})")
+        for reason in self.skipped:
+            lines.append(f"skipped: {reason}")
+        violations = self.violations()
+        lines.append("FAIL: " + "; ".join(violations) if violations else "OK")
+        return "\n".join(lines)
+
+def _mb(value: int, stage: Optional[str] = None) -> str:
+    if stage is not None and stage not in TRACED_STAGES:
+        return "-"
+    return f"{value / (1024 * 1024):.2f} MB"
+
+def make_synthetic_pdf(path: str, pages: int) -> None:
+    """Write an invoice-like PDF where every page has numbers and search hits."""
+    doc = fitz.open()
+    for page_idx in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Invoice No. {87650000 + page_idx}", fontsize=11)
+        page.insert_text((72, 92), f"Delivery No. {55550 + page_idx}", fontsize=11)
+        for line in range(8):
+            page.insert_text((72, 130 + line * 18), "hello world, hello again and some more text",
+                             fontsize=11)
+        page.insert_text((72, 300), f"Total 1.{page_idx % 1000:03d},00", fontsize=11)
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+
+def _measure(stage: str, pages: int, job: Callable[[], None]) -> StageMemory:
+    """Run one stage and record the memory it needed and kept."""
+    traced = stage in TRACED_STAGES
+    release_free_memory()
+    if traced:
+        tracemalloc.start()
+    rss_before = current_rss()
+    sampler = RssSampler()
+    sampler.start()
+    started = time.perf_counter()
+    try:
+        job()
+    finally:
+        seconds = time.perf_counter() - started
+        rss_peak = sampler.stop()
+        traced_peak = traced_retained = 0
+        if traced:
+            gc.collect()
+            traced_retained, traced_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+    release_free_memory()
+    return StageMemory(
+        stage=stage,
+        pages=pages,
+        seconds=seconds,
+        traced_peak=traced_peak,
+        traced_retained=traced_retained,
+        rss_peak=max(0, rss_peak - rss_before),
+        rss_retained=current_rss() - rss_before
+    )
+
+def _qt_view():
+    """A PDFView on an offscreen-capable QApplication, or None without Qt."""
+    if not os.environ.get("DISPLAY") and not os.environ.get("WAYLAND_DISPLAY"):
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PyQt5.QtWidgets import QApplication
+        from ..ui.pdf_view import PDFView
+    except ImportError as e:
+        logger.warning(f"Skipping render stage: {e}")
+        return None
+    app = QApplication.instance() or QApplication([])
+    return app, PDFView()
+
+def _profile_document(path: str, pages: int, cache_dir: str, render: bool,
+                      report: MemoryReport) -> None:
+    """Run every stage over one document, adding the results to the report."""
+    handler = PDFHandler(IndexStore(cache_dir))
+    state = {}
+    try:
+        report.stages.append(_measure(STAGE_LOAD, pages, lambda: handler.load_document(
+            path, background_index=False)))
+        report.stages.append(_measure(STAGE_SEARCH, pages, lambda: state.update(
+            results=handler.search_text(SEARCH_QUERY))))
+
+        def highlight():
+            for result in state["results"]:
+                handler.highlight_text(result.page_num, result.bboxes, (1, 1, 0), SEARCH_QUERY)
+        report.stages.append(_measure(STAGE_HIGHLIGHT, pages, highlight))
+        state.clear()
+
+        def save():
+            if not handler.save():
+                raise RuntimeError(f"Saving {path} failed")
+        report.stages.append(_measure(STAGE_SAVE, pages, save))
+    finally:
+        handler.close()
+
+    if not render:
+        return
+    qt = _qt_view()
+    if qt is None:
+        report.skipped.append("render (PyQt5 not available)")
+        return
+    app, view = qt
+
+    def render_all():
+        view.load_document(path)
+        for page_idx in range(pages):
+            view.go_to_page(page_idx)
+            app.processEvents()
+        view.close_document()
+    try:
+        report.stages.append(_measure(STAGE_RENDER, pages, render_all))
+    finally:
+        view.deleteLater()
+        app.processEvents()
+
+def _profile_size(workdir: str, pages: int, render: bool) -> MemoryReport:
+    """Profile one document size; runs in a process of its own."""
+    logging.basicConfig(level=logging.WARNING)
+    for size in (WARMUP_PAGES, pages):
+        path = os.path.join(workdir, f"synthetic_{size}.pdf")
+        make_synthetic_pdf(path, size)
+        report = MemoryReport(DEFAULT_BOUND_KB_PER_PAGE)
+        _profile_document(path, size, os.path.join(workdir, "index"), render, report)
+    return report
+
+def profile_memory(sizes: Sequence[int] = DEFAULT_SIZES,
+                   bound_kb_per_page: float = DEFAULT_BOUND_KB_PER_PAGE,
+                   render: bool = True, workdir: Optional[str] = None) -> MemoryReport:
+    """Profile every stage on synthetic documents of the given page counts.
+
+    Documents are written to `workdir` (a temporary folder by default,
+    removed afterwards along with their journals and indexes).
+    """
+    report = MemoryReport(bound_kb_per_page)
+    own_dir = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix="pdf_highlighter_memprofile_")
+    try:
+        for pages in sorted(sizes):
+            logger.info(f"Profiling {pages} pages")
+            with ProcessPoolExecutor(max_workers=1,
+                                     mp_context=multiprocessing.get_context("spawn")) as pool:
+                run = pool.submit(_profile_size, workdir, pages, render).result()
+            report.stages.extend(run.stages)
+            report.skipped.extend(reason for reason in run.skipped if reason not in report.skipped)
+    finally:
+        if own_dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return report
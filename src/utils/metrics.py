@@ -0,0 +1,292 @@
+"""
+PDF Highlighter 2.0 - Metrics Registry
+Last Updated: 2026-10-19 10:31:00 UTC
+Author: 5446-boop
+
+Counters, gauges and latency histograms of the main operations, kept in process
+and written to a local file now and then, in the Prometheus text format
+or as a JSON snapshot, so that workstations can be compared without
+attaching a profiler. Worker processes keep metrics of their own, which
+are not included.
+
+Set PDF_HIGHLIGHTER_METRICS to a file path (.prom or .json) to have the
+application write its metrics there, every PDF_HIGHLIGHTER_METRICS_INTERVAL
+seconds (60 by default) and on exit.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+FORMAT_PROMETHEUS = "prometheus"
+FORMAT_JSON = "json"
+
+METRICS_ENV = "PDF_HIGHLIGHTER_METRICS"
+INTERVAL_ENV = "PDF_HIGHLIGHTER_METRICS_INTERVAL"
+DEFAULT_INTERVAL = 60.0
+
+# Seconds, from a cached search to an optimizing save of a large file
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def format_for_path(path: str) -> str:
+    """Metrics format implied by a file name, Prometheus text unless it ends in .json."""
+    return FORMAT_JSON if os.path.splitext(path)[1].lower() == ".json" else FORMAT_PROMETHEUS
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    """A named metric with one series per combination of label values."""
+
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str], lock: threading.Lock):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = lock
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    """A value that only goes up, like pages scanned."""
+
+    kind = "counter"
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def prometheus(self) -> List[str]:
+        lines = self._header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_label_text(self.labels, key)} {value:g}")
+        return lines
+
+    def snapshot(self) -> List[Dict]:
+        return [{"labels": dict(zip(self.labels, key)), "value": value}
+                for key, value in sorted(self._values.items())]
+
+class Gauge(Counter):
+    """A value that goes up and down, like bytes held by a cache."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(_Metric):
+    """Observed values, like durations, counted in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(*args)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List] = {}  # key -> [bucket counts, sum, count]
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe how long the body of a with statement takes."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return series[2] if series else 0
+
+    def prometheus(self) -> List[str]:
+        lines = self._header()
+        for key, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = _label_text(self.labels, key, 'le="%g"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            bucket_labels = _label_text(self.labels, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {total:g}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, key)} {count}")
+        return lines
+
+    def snapshot(self) -> List[Dict]:
+        return [{
+            "labels": dict(zip(self.labels, key)),
+            "count": count,
+            "sum": total,
+            "buckets": {f"{bound:g}": bucket_count for bound, bucket_count in zip(self.buckets, counts)}
+        } for key, (counts, total, count) in sorted(self._series.items())]
+
+class MetricsRegistry:
+    """The metrics of a process, by name.
+
+    Asking for a metric that exists returns it, so modules declare the
+    metrics they update at import time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _get(self, cls, name: str, help_text: str, labels: Sequence[str], **options) -> _Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, labels, self._lock, **options)
+            elif type(metric) is not cls or metric.labels != tuple(labels):
+                raise ValueError(f"Metric {name} is already registered differently")
+            return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._get(Gauge, name, help_text, labels)
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help_text, labels, buckets=buckets)
+
+    def to_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            lines = [line for metric in self._metrics.values() for line in metric.prometheus()]
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict:
+        """All metrics as JSON-ready data, with the hit rate of every cache."""
+        with self._lock:
+            data = {
+                "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "pid": os.getpid(),
+                "metrics": {name: {"type": metric.kind, "help": metric.help, "series": metric.snapshot()}
+                            for name, metric in self._metrics.items()}
+            }
+        data["cache_hit_rates"] = cache_hit_rates(data["metrics"].get(CACHE_REQUESTS.name))
+        return data
+
+    def write(self, path: str, fmt: Optional[str] = None) -> bool:
+        """Write all metrics to a file, replacing it in one step."""
+        fmt = fmt or format_for_path(path)
+        temp_path = f"{path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                if fmt == FORMAT_JSON:
+                    json.dump(self.snapshot(), f, indent=2)
+                else:
+                    f.write(self.to_prometheus())
+            os.replace(temp_path, path)
+            return True
+        except Exception as e:
+            logger.error(f"Error writing metrics to {path}: {e}")
+            return False
+
+registry = MetricsRegistry()  # The metrics of this process
+
+CACHE_REQUESTS = registry.counter(
+    "pdf_highlighter_cache_requests_total", "Cache lookups by cache and result (hit or miss)",
+    ("cache", "result")
+)
+
+def cache_hit_rates(cache_requests: Optional[Dict]) -> Dict[str, float]:
+    """Hit rate per cache from the snapshot of the cache request counter."""
+    totals: Dict[str, List[float]] = {}
+    for series in (cache_requests or {}).get("series", []):
+        hits_and_all = totals.setdefault(series["labels"]["cache"], [0, 0])
+        if series["labels"]["result"] == "hit":
+            hits_and_all[0] += series["value"]
+        hits_and_all[1] += series["value"]
+    return {cache: hits / requests for cache, (hits, requests) in totals.items() if requests}
+
+def count_cache(cache: str, hit: bool) -> None:
+    """Count a lookup in one of the caches."""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+class MetricsExporter:
+    """Writes a registry to a file every interval, and once more when stopped."""
+
+    def __init__(self, path: str, interval: float = DEFAULT_INTERVAL,
+                 metrics: Optional[MetricsRegistry] = None, fmt: Optional[str] = None):
+        self.path = path
+        self.interval = interval
+        self.registry = metrics or registry
+        self.format = fmt or format_for_path(path)
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "MetricsExporter":
+        self._thread = threading.Thread(target=self._run, name="MetricsExporter", daemon=True)
+        self._thread.start()
+        logger.info(f"Writing metrics to {self.path} every {self.interval:g}s")
+        return self
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self.registry.write(self.path, self.format)
+
+    def stop(self) -> None:
+        """Stop writing, after writing the final values."""
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+        self.registry.write(self.path, self.format)
+
+def exporter_from_env() -> Optional[MetricsExporter]:
+    """A started exporter if PDF_HIGHLIGHTER_METRICS names a file, else None."""
+    path = os.environ.get(METRICS_ENV)
+    if not path:
+        return None
+    try:
+        interval = float(os.environ.get(INTERVAL_ENV, DEFAULT_INTERVAL))
+    except ValueError:
+        logger.warning(f"Ignoring invalid {INTERVAL_ENV}")
+        interval = DEFAULT_INTERVAL
+    return MetricsExporter(path, interval).start()
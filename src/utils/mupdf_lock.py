@@ -0,0 +1,21 @@
+"""
+PDF Highlighter 2.0 - MuPDF Lock
+Last Updated: 2026-10-19 11:07:00 UTC
+Author: 5446-boop
+
+PyMuPDF does not support being called from several threads at once, not
+even on different documents. Every thread of the process that calls it
+holds MUPDF_LOCK while doing so: workspace searches not run in worker
+processes, the background text indexer, the in-process page renderer
+and the GUI.
+
+The lock is taken for one page or one call at a time, so long jobs take
+turns instead of waiting for each other to finish. It is always taken
+last: code holding it never waits for a handler's lock or for another
+thread, which keeps lock order free of cycles. Worker processes have
+MuPDF to themselves and take it uncontended.
+"""
+
+import threading
+
+MUPDF_LOCK = threading.RLock()
@@ -0,0 +1,74 @@
+"""
+PDF Highlighter 2.0 - Page Rendering
+Last Updated: 2026-10-19 10:43:08 UTC
+Author: 5446-boop
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+    logging.error("PyMuPDF not installed. Please install with: pip install PyMuPDF")
+
+from .metrics import registry
+from .mupdf_lock import MUPDF_LOCK
+
+logger = logging.getLogger(__name__)
+
+RENDER_SECONDS = registry.histogram(
+    "pdf_highlighter_render_seconds", "Page render time, in this process or through the render workers",
+    ("where",))
+
+FORMAT_RGB888 = "RGB888"
+FORMAT_RGBA8888 = "RGBA8888"
+
+@dataclass
+class RenderedPage:
+    """Raw raster of a page that shares its sample buffer with the pixmap.
+
+    ``samples`` is a view into the memory of the pixmap, or of another
+    owner such as a shared memory block, which must stay alive for as long
+    as anything (e.g. a QImage) refers to the buffer.
+    """
+    page_num: int  # 1-based page number
+    width: int
+    height: int
+    stride: int  # Bytes per row
+    format: str  # FORMAT_RGB888 or FORMAT_RGBA8888
+    samples: memoryview
+    pixmap: Any  # fitz.Pixmap owning the samples, or None
+    owner: Any = None  # Owner of the samples when there is no pixmap
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the sample buffer in bytes."""
+        return self.stride * self.height
+
+    def to_png(self) -> bytes:
+        """Encode the raster as PNG."""
+        pixmap = self.pixmap
+        if pixmap is None:
+            pixmap = fitz.Pixmap(fitz.csRGB, self.width, self.height, bytes(self.samples),
+                                 self.format == FORMAT_RGBA8888)
+        return pixmap.tobytes("png")
+
+def render_page(page, zoom: float = 1.0, alpha: bool = False) -> RenderedPage:
+    """Rasterize a page without copying or encoding the pixel data."""
+    started = time.perf_counter()
+    with MUPDF_LOCK:
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=alpha)
+    RENDER_SECONDS.observe(time.perf_counter() - started, where="process")
+    return RenderedPage(
+        page_num=page.number + 1,
+        width=pix.width,
+        height=pix.height,
+        stride=pix.stride,
+        format=FORMAT_RGBA8888 if pix.alpha else FORMAT_RGB888,
+        samples=pix.samples_mv,
+        pixmap=pix
+    )
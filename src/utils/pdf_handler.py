@@ -1,6 +1,6 @@
 """
 PDF Highlighter 2.0 - PDF Handler
-Last Updated: 2025-02-24 19:01:23 UTC
+Last Updated: 2026-10-19 11:10:25 UTC
 Author: 5446-boop
 """
 
@@ -8,13 +8,70 @@ import logging
 import traceback
 import os
 import re
+import datetime
+import itertools
+import threading
+import time
 from dataclasses import dataclass
-from typing import List, Tuple, Optional
+from typing import Dict, Iterable, Iterator, List, Set, Tuple, Optional
 from pathlib import Path
 import fitz  # PyMuPDF
 
+from .edit_journal import (
+    EditJournal, JournalEntry, RemovedHighlight, OP_HIGHLIGHT, OP_REMOVE, OP_UNDO, OP_REDO, replay_undo
+)
+from .text_index import (
+    TextIndex, TextIndexer, extract_page_layout, extract_page_text, normalize_text, search_text_flags
+)
+from .fingerprint import PageFingerprinter, file_fingerprint
+from .query_cache import QueryCache
+from .mupdf_lock import MUPDF_LOCK
+from .page_render import RenderedPage, render_page
+from .metrics import registry
+from .index_store import IndexStore
+from .field_extraction import FieldExtractor, FieldSpec, INVOICE_NUMBER, DELIVERY_NUMBER
+from .bbox_ops import dedupe, line_groups, merge_lines, right_of
+
 logger = logging.getLogger(__name__)
 
+# Highlight status of a page's matches
+STATUS_NONE = "none"
+STATUS_HIGHLIGHTED = "highlighted"  # Saved in the PDF
+STATUS_PENDING = "pending"  # Journaled, written on the next save
+
+# How highlights are written into the PDF
+ANNOT_MODE_RECT = "rect"  # A highlight and a timestamp per matched box
+ANNOT_MODE_LINE = "line"  # A multi-quad highlight per text line, a timestamp per page
+ANNOT_MODE_PAGE = "page"  # A multi-quad highlight per page, a timestamp per page
+ANNOTATION_MODES = (ANNOT_MODE_RECT, ANNOT_MODE_LINE, ANNOT_MODE_PAGE)
+
+# A plain save only writes what changed in the document
+SAVE_OPTIONS = {"garbage": 0, "deflate": True, "clean": False}
+# An optimizing save rewrites the file: unused objects are dropped, duplicate
+# objects and streams merged, objects packed into compressed object streams
+# and any uncompressed stream, fonts and images included, compressed
+OPTIMIZE_SAVE_OPTIONS = {
+    "garbage": 4, "deflate": True, "deflate_images": True, "deflate_fonts": True,
+    "use_objstms": 1, "clean": False
+}
+
+SEARCH_SECONDS = registry.histogram(
+    "pdf_highlighter_search_seconds", "Time spent searching pages, per search or lookup", ("kind",))
+SEARCH_PAGES = registry.counter(
+    "pdf_highlighter_search_pages_scanned_total", "Pages searched rather than answered from the query cache",
+    ("kind",))
+SEARCH_MATCHES = registry.counter("pdf_highlighter_search_matches_total", "Matches returned, cached ones included", ("kind",))
+EDIT_SECONDS = registry.histogram(
+    "pdf_highlighter_edit_seconds", "Time to apply and journal a highlight edit, undo or redo", ("op",))
+SAVE_SECONDS = registry.histogram("pdf_highlighter_save_seconds", "Duration of successful saves", ("mode",))
+SAVE_BYTES = registry.counter("pdf_highlighter_save_bytes_written_total", "Bytes of PDF written by saves")
+SAVE_FAILURES = registry.counter("pdf_highlighter_save_failures_total", "Saves that failed")
+
+def _count_search(kind: str, seconds: float, pages: int, matches: int) -> None:
+    SEARCH_SECONDS.observe(seconds, kind=kind)
+    SEARCH_PAGES.inc(pages, kind=kind)
+    SEARCH_MATCHES.inc(matches, kind=kind)
+
 @dataclass
 class SearchResult:
     """Data class for search results."""
@@ -26,196 +83,854 @@ class SearchResult:
     annot_xrefs: Optional[List[int]] = None
     delivery_number: Optional[str] = None
     invoice_number: Optional[str] = None
+    filepath: Optional[str] = None
 
     def format_page_number(self, total_pages: int) -> str:
         """Format the page number as 'current/total'"""
         return f"{self.page_num}/{total_pages}"
 
+@dataclass
+class SaveReport:
+    """Outcome of a successful save."""
+    filepath: str
+    optimized: bool
+    edits: int  # Pending edits written
+    bytes_before: int
+    bytes_after: int
+    seconds: float
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_before - self.bytes_after
+
+    def summary(self) -> str:
+        action = "Optimized" if self.optimized else "Saved"
+        change = (f"{self.bytes_saved / 1024:.0f} KB saved" if self.bytes_saved >= 0 else
+                  f"{-self.bytes_saved / 1024:.0f} KB added")
+        return (f"{action} {os.path.basename(self.filepath)} in {self.seconds:.2f}s: "
+                f"{self.bytes_before / 1024:.0f} KB -> {self.bytes_after / 1024:.0f} KB ({change})")
+
 class PDFError(Exception):
     """Custom exception for PDF operations."""
     pass
 
 class PDFHandler:
-    def __init__(self):
+    def __init__(self, index_store: Optional[IndexStore] = None,
+                 fields: Optional[List[FieldSpec]] = None,
+                 annotation_mode: str = ANNOT_MODE_RECT):
+        if annotation_mode not in ANNOTATION_MODES:
+            raise ValueError(f"Unknown annotation mode: {annotation_mode}")
         self.doc = None
         self.filepath = None
+        self.lock = threading.RLock()  # Held by whichever thread uses the document
+        self.journal = None
+        self.pending_edits: List[JournalEntry] = []  # Applied in memory, not saved yet
+        self.undone_edits: List[JournalEntry] = []  # Taken back since the last save, last undone last
+        self.text_index: Optional[TextIndex] = None
+        self._index_stored = False  # Whether the text index is in the index store as it is
+        self.indexer: Optional[TextIndexer] = None
+        self.query_cache = QueryCache()
+        self.index_store = index_store or IndexStore()
+        self.annotation_mode = annotation_mode  # Applies to edits written from now on
+        self.optimize_after_edits = 0  # Optimize a save once this many edits were saved plainly; 0 never
+        self.edits_since_optimize = 0
+        self.last_save_report: Optional[SaveReport] = None
+        self.duplicate_of: Optional[str] = None  # File whose stored index this one reused
+        self._file_fingerprint: Optional[str] = None
+        self._fingerprinter: Optional[PageFingerprinter] = None
         
-        # Keep both patterns
-        self.delivery_pattern = re.compile(
-            r"Delivery(?:[-\s])?(?:No\.?|Number:?|#)?\s*(\d{5,12})",
-            re.IGNORECASE | re.MULTILINE
-        )
-        self.number_pattern = re.compile(r'\d{8}')
-        logger.debug("PDFHandler initialized with dual pattern detection")
+        self.field_extractor = FieldExtractor(fields)
+        logger.debug(f"PDFHandler initialized with fields: {self.field_extractor.names}")
+
+    @property
+    def text_index(self) -> Optional[TextIndex]:
+        """Text index of the document, read back from the store if it was released."""
+        if self._index_released:
+            with MUPDF_LOCK:  # Not self.lock, which callers holding MUPDF_LOCK must not wait for
+                if self._index_released:
+                    self._index_released = False
+                    self._start_indexing()
+                    logger.debug(f"Reloaded released text index of {self.filepath}")
+        return self._text_index
+
+    @text_index.setter
+    def text_index(self, text_index: Optional[TextIndex]) -> None:
+        self._text_index = text_index
+        self._index_released = False
+
+    def text_index_size(self) -> int:
+        """Approximate bytes held by the text index, 0 while it is released."""
+        text_index = self._text_index
+        return text_index.memory_size() if text_index is not None else 0
+
+    def release_text_index(self) -> int:
+        """Drop the text index and memoized searches from memory until next needed.
+
+        Only a complete index that is in the index store is released, since
+        it is read back from there; a document another thread is using keeps
+        its index. Returns the approximate number of bytes released.
+        """
+        if not self.lock.acquire(blocking=False):
+            return 0
+        try:
+            text_index = self._text_index
+            if text_index is None or not self._index_stored or not text_index.is_complete():
+                return 0
+            size = text_index.memory_size()
+            self._index_released = True  # Before the index goes, so readers reload rather than see None
+            self._text_index = None
+            self.query_cache = QueryCache()
+            logger.debug(f"Released text index of {self.filepath} ({size} bytes)")
+            return size
+        finally:
+            self.lock.release()
+
+    def _page_text(self, page) -> str:
+        """Get a page's text from the index, extracting it if needed."""
+        if self.text_index is not None:
+            return self.text_index.text_for(page)
+        return page.get_text()
 
     def _extract_invoice_number(self, page) -> Optional[str]:
-        """Extract the second 8-digit number found on the page."""
+        """Extract the invoice number of the page."""
+        return self.page_fields(page).get(INVOICE_NUMBER)
+
+    def page_fields(self, page, textpage=None) -> Dict[str, Optional[str]]:
+        """All configured fields of a page, cached in the text index.
+
+        The page's text and fields come from one layout extraction, and the
+        text is indexed along the way if it was not yet.
+        """
+        fields = self.text_index.get_fields(page.number) if self.text_index else None
+        if fields is not None:
+            return fields
         try:
-            # Get all text from the page
-            text = page.get_text()
-            
-            # Find all 8-digit numbers
-            matches = self.number_pattern.findall(text)
-            logger.debug(f"Found {len(matches)} 8-digit numbers: {matches}")
-            
-            # If we found at least two numbers
-            if len(matches) >= 2:
-                invoice_num = matches[1]  # Get the second number
-                logger.debug(f"Using second 8-digit number as invoice number: {invoice_num}")
-                return invoice_num
-            elif len(matches) == 1:
-                logger.debug(f"Found only one 8-digit number: {matches[0]}")
-                return matches[0]
-            else:
-                logger.debug("No 8-digit numbers found")
-                return None
+            text, words = extract_page_layout(page, textpage, self.field_extractor.needs_layout)
+            fields = self.field_extractor.extract(text, words, page.rect)
+        except Exception as e:
+            logger.warning(f"Error extracting fields of page {page.number + 1}: {e}")
+            return {name: None for name in self.field_extractor.names}
+        if self.text_index is not None:
+            if self.text_index.get(page.number) is None:
+                self.text_index.put(page.number, text)
+            self.text_index.put_fields(page.number, fields)
+        return fields
+
+    def extract_numbers(self, page) -> Tuple[Optional[str], Optional[str]]:
+        """Invoice and delivery number of a page."""
+        fields = self.page_fields(page)
+        return fields.get(INVOICE_NUMBER), fields.get(DELIVERY_NUMBER)
+
+    def file_fingerprint(self) -> Optional[str]:
+        """Content fingerprint of the loaded file as it is on disk."""
+        if self._file_fingerprint is None and self.filepath:
+            try:
+                self._file_fingerprint = file_fingerprint(self.filepath)
+            except OSError as e:
+                logger.warning(f"Error fingerprinting {self.filepath}: {e}")
+        return self._file_fingerprint
 
+    def page_fingerprint(self, page_idx: int) -> Optional[str]:
+        """Content fingerprint of a 0-based page, kept in the text index."""
+        fingerprint = self.text_index.get_fingerprint(page_idx) if self.text_index else None
+        if fingerprint is not None or not self.doc:
+            return fingerprint
+        try:
+            with MUPDF_LOCK:
+                page = self.doc[page_idx]
+                normalized = self.text_index.normalized(page_idx) if self.text_index else None
+                if normalized is None:
+                    normalized = normalize_text(extract_page_text(page))
+                if self._fingerprinter is None:
+                    self._fingerprinter = PageFingerprinter(self.doc)
+                fingerprint = self._fingerprinter.fingerprint(page, normalized)
         except Exception as e:
-            logger.warning(f"Error extracting invoice number: {str(e)}\nTraceback:\n{traceback.format_exc()}")
+            logger.warning(f"Error fingerprinting page {page_idx + 1}: {e}")
             return None
+        if self.text_index is not None:
+            self.text_index.put_fingerprint(page_idx, fingerprint)
+        return fingerprint
+
+    def build_index(self) -> int:
+        """Extract the text and numbers of every page now and store them.
+
+        This is the synchronous counterpart of the background indexer, for
+        headless use. Returns the number of pages indexed.
+        """
+        with self.lock:
+            if not self.doc:
+                return 0
+            self._stop_indexing()
+            for page_idx in range(len(self.doc)):
+                with MUPDF_LOCK:
+                    self.extract_numbers(self.doc[page_idx])
+                self.page_fingerprint(page_idx)
+            self._store_index(self.filepath, self.text_index)
+            return len(self.doc)
+
+    def _store_index(self, filepath: str, text_index: TextIndex) -> None:
+        """Persist a complete text index so the next load starts warm."""
+        if text_index is not None and text_index.is_complete():
+            fingerprint = self.file_fingerprint() if filepath == self.filepath else file_fingerprint(filepath)
+            stored = self.index_store.save(filepath, text_index.to_entries(self.field_extractor.extract),
+                                           fingerprint, self.field_extractor.signature)
+            if filepath == self.filepath and text_index is self._text_index:
+                self._index_stored = stored
 
     def process_page(self, page, query):
         """Process a page for highlighting."""
         try:
-            text = page.get_text()
-            matches = self.number_pattern.findall(text)
-            
-            if len(matches) >= 2:
-                invoice_num = matches[1]  # Get the second number
-                if query.lower() in invoice_num.lower():
-                    # Create highlight for the found number
-                    instances = []
-                    text_instances = page.search_for(invoice_num)
-                    if text_instances:
-                        instances.extend(text_instances)
-                    return instances
+            invoice_num = self._extract_invoice_number(page)
+            if invoice_num and query.lower() in invoice_num.lower():
+                # Create highlight for the found number
+                return page.search_for(invoice_num)
             return []
 
         except Exception as e:
             logger.warning(f"Error processing page {page.number}: {str(e)}")
             return []
 
-    def search_text(self, query: str) -> List[SearchResult]:
-        """Search for text in the document."""
-        if not self.doc or not query:
-            return []
+    def _search_page(self, page_num: int, query: str) -> Optional[SearchResult]:
+        """Search a single 0-based page, returning None if it has no match."""
+        with MUPDF_LOCK:
+            page = self.doc[page_num]
+        
+            # One layout extraction serves the index, the fields and the search
+            textpage = None
+            if self.text_index is not None and self.text_index.get_fields(page_num) is None:
+                textpage = page.get_textpage(flags=search_text_flags())
+                self.page_fields(page, textpage)
+        
+            # Indexed text rules out most pages without a layout search
+            if self.text_index is not None and not self.text_index.may_contain(page, query):
+                return None
+            matches = page.search_for(query, textpage=textpage)
+            if not matches:
+                return None
 
-        page_results = []
+            invoice_number, delivery_number = self.extract_numbers(page)
+            bboxes = dedupe(matches)
+        
+            return SearchResult(
+                page_num=page_num + 1,
+                text=query,
+                bboxes=bboxes,
+                total_matches=len(bboxes),
+                highlight_color=None,
+                annot_xrefs=None,
+                delivery_number=delivery_number,
+                invoice_number=invoice_number,
+                filepath=self.filepath
+            )
+
+    def _search_key(self, query: str) -> tuple:
+        """Cache key of a search: the query and the options shaping its results."""
+        return (query, self.field_extractor.signature)
+
+    def _narrowed_pages(self, query: str, narrow_from: Optional[str]) -> List[int]:
+        """Pages that can match a query, given an earlier query it contains.
+
+        A string containing the earlier query can only occur on pages where
+        the earlier query matched, plus any page edited since.
+        """
+        if narrow_from:
+            previous = self.query_cache.peek(self._search_key(narrow_from))
+            if previous is not None and normalize_text(narrow_from) in normalize_text(query):
+                return sorted(set(previous.page_results) |
+                              set(self.query_cache.stale_pages(previous)))
+        return list(range(len(self.doc)))
+
+    def iter_page_results(self, query: str, narrow_from: Optional[str] = None,
+                          memoize: bool = True,
+                          only_pages: Optional[Set[int]] = None) -> Iterator[Tuple[int, Optional[SearchResult]]]:
+        """Search page by page, yielding (0-based page, result or None).
+
+        Memoizes the results once the search runs to completion; closing the
+        generator early leaves the cache untouched. With memoize=False no
+        results are kept, so memory use does not grow with the document.
+        only_pages limits the search to some 0-based pages and, the results
+        being partial, disables memoizing. The handler's lock is taken for
+        one page at a time.
+        """
+        key = self._search_key(query)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            known = cached.page_results
+            stale = set(self.query_cache.stale_pages(cached))
+            pages = sorted(set(known) | stale)
+            logger.debug(f"Cached search for '{query}', re-evaluating {len(stale)} edited pages")
+        else:
+            known = {}
+            stale = set()
+            pages = self._narrowed_pages(query, narrow_from)
+            logger.debug(f"Starting search for query: '{query}' over {len(pages)} pages")
+        if only_pages is not None:
+            pages = [page_num for page_num in pages if page_num in only_pages]
+            memoize = False
+
+        page_results = {}
+        failed = False
+        seconds = 0.0
+        scanned = matches = 0
         try:
-            logger.debug(f"Starting search for query: '{query}'")
-            for page_num in range(len(self.doc)):
-                try:
-                    page = self.doc[page_num]
-                    matches = page.search_for(query)
-
-                    if matches:
-                        invoice_number = self._extract_invoice_number(page)
-                        delivery_match = self.delivery_pattern.search(page.get_text("text"))
-                        
-                        result = SearchResult(
-                            page_num=page_num + 1,
-                            text=query,
-                            bboxes=[tuple(rect) for rect in matches],
-                            total_matches=len(matches),
-                            highlight_color=None,
-                            annot_xrefs=None,
-                            delivery_number=delivery_match.group(1) if delivery_match else None,
-                            invoice_number=invoice_number
-                        )
-                        page_results.append(result)
+            for page_num in pages:
+                if page_num in known and page_num not in stale:
+                    result = known[page_num]
+                else:
+                    started = time.perf_counter()
+                    try:
+                        # Locked page by page, so edits and saves never wait for a whole search
+                        with self.lock:
+                            if not self.doc:
+                                return
+                            result = self._search_page(page_num, query)
+                    except Exception as e:
+                        logger.warning(f"Error processing page {page_num + 1}: {e}")
+                        failed = True
+                        result = None
+                    seconds += time.perf_counter() - started
+                    scanned += 1
+                if result is not None:
+                    matches += result.total_matches
+                    if memoize:
+                        page_results[page_num] = result
+                yield page_num, result
+
+            # A page that failed might match next time, so do not memoize it
+            if memoize and not failed:
+                self.query_cache.put(key, page_results)
+        finally:
+            _count_search("search", seconds, scanned, matches)
+
+    def _lookup_order(self, query: str) -> List[int]:
+        """Pages to scan for a lookup, the likeliest matches first.
 
+        A memoized search already knows its pages; otherwise the text
+        index ranks the indexed pages and those not indexed yet follow in
+        page order.
+        """
+        cached = self.query_cache.peek(self._search_key(query))
+        if cached is not None:
+            return sorted(set(cached.page_results) | set(self.query_cache.stale_pages(cached)))
+        if self.text_index is None:
+            return list(range(len(self.doc)))
+        candidates, unindexed = self.text_index.rank_pages(query)
+        return candidates + unindexed
+
+    def iter_lookup(self, query: str, cancelled: Optional[threading.Event] = None) -> Iterator[SearchResult]:
+        """Yield the results of a query in lookup order, likeliest pages first.
+
+        Meant for unique values like an invoice number: stop consuming
+        after the first result and only a few pages have been touched.
+        The lookup stops before the next page once `cancelled` is set.
+        Nothing is memoized.
+        """
+        if not self.doc or not query:
+            return
+        scanned = matches = 0
+        seconds = 0.0
+        try:
+            for page_num in self._lookup_order(query):
+                if cancelled is not None and cancelled.is_set():
+                    logger.info(f"Lookup for '{query}' cancelled after {scanned} pages")
+                    return
+                scanned += 1
+                started = time.perf_counter()
+                try:
+                    with self.lock:
+                        if not self.doc:
+                            return
+                        result = self._search_page(page_num, query)
                 except Exception as e:
                     logger.warning(f"Error processing page {page_num + 1}: {e}")
                     continue
+                finally:
+                    seconds += time.perf_counter() - started
+                if result is not None:
+                    matches += result.total_matches
+                    logger.debug(f"Lookup for '{query}' matched page {page_num + 1} "
+                                 f"after scanning {scanned} pages")
+                    yield result
+        finally:
+            _count_search("lookup", seconds, scanned, matches)
+
+    def pages_to_search(self, query: str, lookup: bool = False) -> List[int]:
+        """0-based pages a query can match on, for searching them elsewhere.
+
+        Pages the text index or a memoized search rules out are left out.
+        They come in page order, or in lookup order for a lookup.
+        """
+        if not self.doc or not query:
+            return []
+        pages = self._lookup_order(query)
+        return pages if lookup else sorted(pages)
 
-            logger.info(f"Search complete - found results on {len(page_results)} pages")
-            return page_results
+    def loaded_stamp(self) -> Optional[Dict[str, int]]:
+        """Size and modification time of the file as loaded (see pdf_stamp).
 
+        While the file on disk still has them, it holds the same text as
+        the document in memory, whose edits are only highlights.
+        """
+        return self.journal.stamp if self.journal else None
+
+    def lookup(self, query: str, limit: int = 1) -> List[SearchResult]:
+        """The first `limit` results of a query in lookup order (see iter_lookup)."""
+        return list(itertools.islice(self.iter_lookup(query), limit))
+
+    def iter_search(self, query: str, pages: Optional[Iterable[int]] = None,
+                    cancelled: Optional[threading.Event] = None,
+                    narrow_from: Optional[str] = None,
+                    memoize: bool = True) -> Iterator[SearchResult]:
+        """Yield the results of a search as pages match, in page order.
+
+        pages limits the search to some 1-based page numbers, e.g. a
+        range; out of range pages are ignored. The search stops before the
+        next page once `cancelled` is set. A page that fails is logged and
+        skipped, so one bad page costs only its own results.
+        """
+        if not self.doc or not query:
+            return
+        only_pages = None
+        if pages is not None:
+            only_pages = {page_num - 1 for page_num in pages if 1 <= page_num <= len(self.doc)}
+        for page_num, result in self.iter_page_results(query, narrow_from, memoize, only_pages):
+            if result is not None:
+                yield result
+            if cancelled is not None and cancelled.is_set():
+                logger.info(f"Search for '{query}' cancelled after page {page_num + 1}")
+                return
+
+    def search_text(self, query: str, narrow_from: Optional[str] = None) -> List[SearchResult]:
+        """Search for text in the document.
+
+        Results are memoized per query; a repeated search only re-evaluates
+        the pages edited since it last ran. If the query contains
+        narrow_from, only the pages that matched narrow_from are scanned.
+        """
+        results = []
+        try:
+            for result in self.iter_search(query, narrow_from=narrow_from):
+                results.append(result)
         except Exception as e:
             logger.error(f"Search error: {str(e)}")
-            return []
+        if query and self.doc:
+            logger.info(f"Search complete - found results on {len(results)} pages")
+        return results
 
     def highlight_text(self, page_num: int, bboxes: List[Tuple[float, float, float, float]], 
-                      color: Tuple[float, float, float], query: str) -> Optional[List[int]]:
-        """Add highlights to text on the specified page."""
-        if not self.doc:
-            return None
+                      color: Tuple[float, float, float], query: str) -> bool:
+        """Record highlights for text on the specified page.
 
-        xrefs = []
+        The highlights are added to the document in memory and the edit is
+        appended to the journal; the file is written on the next save.
+        Repeated bboxes are dropped and touching ones on a line become one
+        highlight.
+        """
+        if not self.doc or page_num < 1 or page_num > len(self.doc):
+            return False
+
+        entry = JournalEntry(
+            op=OP_HIGHLIGHT,
+            page_num=page_num,
+            timestamp=datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            text=query,
+            rects=merge_lines(dedupe(bboxes)),
+            color=tuple(color)
+        )
+        return self._record_edit(entry)
+
+    def remove_highlight_by_text(self, page_num: int, text: str) -> bool:
+        """Record removal of highlights for specific text on a page."""
         try:
+            with self.lock:
+                if not self.doc or page_num < 1 or page_num > len(self.doc):
+                    return False
+
+                if not self._has_highlights(page_num, text):
+                    return False
+
+                entry = JournalEntry(
+                    op=OP_REMOVE,
+                    page_num=page_num,
+                    timestamp=datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    text=text
+                )
+                return self._record_edit(entry)
+
+        except Exception as e:
+            logger.error(f"Error removing highlights: {e}")
+            return False
+
+    def has_pending_edits(self) -> bool:
+        """Check whether there are edits not yet written to the PDF."""
+        return bool(self.pending_edits)
+
+    def _record_edit(self, entry: JournalEntry) -> bool:
+        """Apply an edit to the document in memory and journal it.
+
+        Waits for a save running on another thread, which would otherwise
+        drop the edit along with the ones it wrote. A new edit ends the
+        edits that could be redone.
+        """
+        started = time.perf_counter()
+        with self.lock:
+            if not self.doc or not self.journal:
+                return False
+            try:
+                self._apply_edit(entry, stamp=self._needs_stamp(entry.page_num))
+            except Exception as e:
+                logger.error(f"Error applying {entry.op} on page {entry.page_num}: {e}")
+                return False
+            if not self.journal.append(entry):
+                self._revert_edit(entry)
+                return False
+            self.pending_edits.append(entry)
+            self.undone_edits = []
+            self.query_cache.mark_page_edited(entry.page_num - 1)
+            EDIT_SECONDS.observe(time.perf_counter() - started, op=entry.op)
+            logger.debug(f"Journaled {entry.op} on page {entry.page_num} "
+                         f"({len(self.pending_edits)} pending edits)")
+            return True
+
+    def can_undo(self) -> bool:
+        return bool(self.pending_edits)
+
+    def can_redo(self) -> bool:
+        return bool(self.undone_edits)
+
+    def unsaved_pages(self) -> Set[int]:
+        """0-based indexes of the pages edited in memory since the last save."""
+        return {entry.page_num - 1 for entry in itertools.chain(self.pending_edits, self.undone_edits)}
+
+    def render_unsaved_page(self, page_idx: int, zoom: float = 1.0) -> Optional[RenderedPage]:
+        """Render a page from the document in memory if it has unsaved edits.
+
+        Returns None for a page that is as it is in the file, which
+        renderers reading the file show correctly.
+        """
+        with self.lock:
+            if not self.doc or page_idx not in self.unsaved_pages():
+                return None
+            with MUPDF_LOCK:
+                return render_page(self.doc[page_idx], zoom)
+
+    def _journal_step(self, op: str, entry: JournalEntry) -> bool:
+        """Journal an undo or redo of an edit."""
+        return self.journal is not None and self.journal.append(JournalEntry(
+            op=op,
+            page_num=entry.page_num,
+            timestamp=datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        ))
+
+    def undo(self) -> Optional[JournalEntry]:
+        """Take back the last edit made since the last save.
+
+        The annotations the edit added are deleted by xref, or those it
+        deleted are recreated, in the document in memory only; nothing is
+        written but one journal line, whatever the size of the file.
+        Returns the edit taken back, or None if there is none.
+        """
+        started = time.perf_counter()
+        with self.lock:
+            if not self.doc or not self.pending_edits:
+                return None
+            entry = self.pending_edits[-1]
+            if not self._journal_step(OP_UNDO, entry):
+                return None
+            self.pending_edits.pop()
+            self._revert_edit(entry)
+            self.undone_edits.append(entry)
+            self.query_cache.mark_page_edited(entry.page_num - 1)
+            EDIT_SECONDS.observe(time.perf_counter() - started, op=OP_UNDO)
+            logger.debug(f"Undid {entry.op} on page {entry.page_num}")
+            return entry
+
+    def redo(self) -> Optional[JournalEntry]:
+        """Apply the last edit taken back again.
+
+        Returns the edit, or None if there is none or it cannot be applied;
+        a failed redo is cancelled in the journal and can be tried again.
+        """
+        started = time.perf_counter()
+        with self.lock:
+            if not self.doc or not self.undone_edits:
+                return None
+            entry = self.undone_edits[-1]
+            if not self._journal_step(OP_REDO, entry):
+                return None
+            try:
+                self._apply_edit(entry, stamp=self._needs_stamp(entry.page_num))
+            except Exception as e:
+                logger.error(f"Error redoing {entry.op} on page {entry.page_num}: {e}")
+                if not self._journal_step(OP_UNDO, entry):
+                    logger.error(f"Cannot cancel the failed redo in {self.journal.path}; "
+                                 f"a recovery would apply the edit again")
+                return None
+            self.undone_edits.pop()
+            self.pending_edits.append(entry)
+            self.query_cache.mark_page_edited(entry.page_num - 1)
+            EDIT_SECONDS.observe(time.perf_counter() - started, op=OP_REDO)
+            logger.debug(f"Redid {entry.op} on page {entry.page_num}")
+            return entry
+
+    def _highlight_matches(self, annot, text: str) -> bool:
+        """Check whether a highlight annotation belongs to the given text."""
+        highlighted_text = annot.info["content"] if "content" in annot.info else ""
+        return text in highlighted_text or not highlighted_text
+
+    def highlight_status(self, page_num: int, text: str) -> str:
+        """Highlight status of a text on a page, pending edits included."""
+        for entry in reversed(self.pending_edits):
+            if entry.page_num == page_num:
+                return STATUS_PENDING if entry.op == OP_HIGHLIGHT else STATUS_NONE
+        with MUPDF_LOCK:
             page = self.doc[page_num - 1]
-            
-            # Get current date and time in UTC
-            import datetime
-            now = datetime.datetime.now()
-            date_str = now.strftime("%Y-%m-%d")
-            time_str = now.strftime("%H:%M:%S")
-            timestamp = f"{date_str}\n{time_str}"  # Put time under the date
-            
-            for rect in bboxes:
-                # Create the highlight annotation (preserve original functionality)
-                annot = page.add_highlight_annot(fitz.Rect(rect))
+            for annot in page.annots(types=[fitz.PDF_ANNOT_HIGHLIGHT]):
+                if self._highlight_matches(annot, text):
+                    return STATUS_HIGHLIGHTED
+        return STATUS_NONE
+
+    def iter_page_numbers(self) -> Iterator[Tuple[int, Optional[str], Optional[str]]]:
+        """Yield (page, invoice number, delivery number) for every page.
+
+        Pages missing from the text index are extracted without being added
+        to it, so a pass over a large document runs in constant memory.
+        """
+        for page_idx in range(len(self.doc) if self.doc else 0):
+            fields = self.text_index.get_fields(page_idx) if self.text_index else None
+            if fields is None:
+                with MUPDF_LOCK:
+                    page = self.doc[page_idx]
+                    text, words = extract_page_layout(page, words=self.field_extractor.needs_layout)
+                    rect = page.rect
+                fields = self.field_extractor.extract(text, words, rect)
+            yield page_idx + 1, fields.get(INVOICE_NUMBER), fields.get(DELIVERY_NUMBER)
+
+    def _has_highlights(self, page_num: int, text: str) -> bool:
+        """Check for saved or pending highlights a removal would affect."""
+        with MUPDF_LOCK:
+            page = self.doc[page_num - 1]
+            for annot in page.annots(types=[fitz.PDF_ANNOT_HIGHLIGHT]):
+                if self._highlight_matches(annot, text):
+                    return True
+            return False
+
+    @staticmethod
+    def _timestamp_rects(rects) -> List[Tuple[float, float, float, float]]:
+        """Timestamp boxes to the right of highlights, slightly above them to be more visible."""
+        return right_of(rects, gap=5, width=115, rise=3, height=15)
+
+    def _add_timestamp(self, page, timestamp_rect, timestamp: str) -> int:
+        """Add a timestamp as a free text annotation."""
+        timestamp_annot = page.add_freetext_annot(
+            timestamp_rect,
+            timestamp,
+            fontsize=5,            # Small but visible font
+            fontname="Helvetica",
+            text_color=(1, 0, 0),  # Black text
+            fill_color=None # Light yellow background
+        )
+        
+        timestamp_annot.set_border(width=0)  # No border
+        timestamp_annot.update()
+        return timestamp_annot.xref
+
+    def _apply_highlight(self, page, entry: JournalEntry, stamp: bool = True) -> List[int]:
+        """Add the annotations for a journaled highlight to the page.
+
+        Outside ANNOT_MODE_RECT the boxes become multi-quad highlights, one
+        per line or one for the page, and the timestamp is only added if
+        `stamp` is set; each annotation's appearance is generated once.
+        """
+        xrefs = []
+        timestamp = entry.timestamp.replace(" ", "\n")  # Put time under the date
+
+        if self.annotation_mode != ANNOT_MODE_RECT:
+            groups = line_groups(entry.rects) if self.annotation_mode == ANNOT_MODE_LINE else [entry.rects]
+            for rects in groups:
+                annot = page.add_highlight_annot(quads=rects)
                 if annot:
-                    annot.set_colors(stroke=color)
+                    annot.set_colors(stroke=entry.color)
                     annot.set_opacity(1)
                     annot.update()
                     xrefs.append(annot.xref)
-                    
-                    # Add timestamp as a free text annotation to the right of the highlight
-                    timestamp_rect = fitz.Rect(
-                        rect[2] + 5,           # 5 points to the right of highlight's right edge
-                        rect[1] - 3,           # Slightly above highlight to be more visible
-                        rect[2] + 120,         # Width for timestamp
-                        rect[1] + 12           # Height for timestamp
-                    )
-                    
-                    timestamp_annot = page.add_freetext_annot(
-                        timestamp_rect,
-                        timestamp,
-                        fontsize=5,            # Small but visible font
-                        fontname="Helvetica",
-                        text_color=(1, 0, 0),  # Black text
-                        fill_color=None # Light yellow background
-                    )
-                    
-                    timestamp_annot.set_border(width=0)  # No border
-                    timestamp_annot.update()
-                    xrefs.append(timestamp_annot.xref)
-            
-            # Preserve original behavior - save the document and return xrefs
-            return xrefs if self.save() else None
+            if stamp and entry.rects:
+                first = min(entry.rects, key=lambda rect: (rect[1], rect[0]))
+                xrefs.append(self._add_timestamp(page, self._timestamp_rects([first])[0], timestamp))
+            return xrefs
 
-        except Exception as e:
-            logger.error(f"Error adding highlights: {e}")
-            return None
+        for rect, timestamp_rect in zip(entry.rects, self._timestamp_rects(entry.rects)):
+            # Create the highlight annotation (preserve original functionality)
+            annot = page.add_highlight_annot(rect)
+            if annot:
+                annot.set_colors(stroke=entry.color)
+                annot.set_opacity(1)
+                annot.update()
+                xrefs.append(annot.xref)
+                xrefs.append(self._add_timestamp(page, timestamp_rect, timestamp))
+        return xrefs
 
-    def remove_highlight_by_text(self, page_num: int, text: str) -> bool:
-        """Remove highlights for specific text on a page."""
-        try:
-            if not self.doc or page_num < 1:
-                return False
+    def _apply_remove(self, page, entry: JournalEntry) -> List[int]:
+        """Delete the highlights a journaled removal refers to, keeping what undo needs."""
+        xrefs = []
+        entry.removed = []
+        for annot in list(page.annots(types=[fitz.PDF_ANNOT_HIGHLIGHT])):
+            if self._highlight_matches(annot, entry.text):
+                stroke = annot.colors.get("stroke")
+                entry.removed.append(RemovedHighlight(
+                    vertices=[tuple(point) for point in annot.vertices or []],
+                    color=tuple(stroke) if stroke else None,
+                    opacity=annot.opacity,
+                    info=dict(annot.info)
+                ))
+                xrefs.append(annot.xref)
+                page.delete_annot(annot)
+        return xrefs
 
-            page = self.doc[page_num - 1]
-            found = False
-
-            for annot in page.annots():
-                if annot.type[0] == 8:  # Highlight annotation
-                    # Get the highlighted text
-                    highlighted_text = annot.info["content"] if "content" in annot.info else ""
-                    if text in highlighted_text or not highlighted_text:
-                        page.delete_annot(annot)
-                        found = True
-
-            if found:
-                return self.save()
-            return False
+    def _restore_highlight(self, page, removed: RemovedHighlight) -> int:
+        """Recreate a highlight a removal deleted; returns its new xref."""
+        vertices = removed.vertices
+        annot = page.add_highlight_annot(quads=[fitz.Quad(vertices[i:i + 4])
+                                                for i in range(0, len(vertices), 4)])
+        if removed.color:
+            annot.set_colors(stroke=removed.color)
+        if removed.opacity >= 0:
+            annot.set_opacity(removed.opacity)
+        annot.set_info(content=removed.info.get("content"), title=removed.info.get("title"),
+                       subject=removed.info.get("subject"))
+        annot.update()
+        return annot.xref
 
-        except Exception as e:
-            logger.error(f"Error removing highlights: {e}")
-            return False
+    def _needs_stamp(self, page_num: int) -> bool:
+        """Check whether a highlight on a page gets a timestamp, in the compact modes."""
+        return not any(entry.op == OP_HIGHLIGHT and entry.page_num == page_num
+                       for entry in self.pending_edits)
+
+    def _apply_edit(self, entry: JournalEntry, stamp: bool = True) -> None:
+        """Apply an edit to the document in memory, recording its annotation xrefs."""
+        with MUPDF_LOCK:
+            page = self.doc[entry.page_num - 1]
+            if entry.op == OP_HIGHLIGHT:
+                entry.xrefs = self._apply_highlight(page, entry, stamp)
+            elif entry.op == OP_REMOVE:
+                entry.xrefs = self._apply_remove(page, entry)
+            else:
+                logger.warning(f"Ignoring unknown journal operation: {entry.op}")
+                return
+            logger.debug(f"Applied {entry.op} on page {entry.page_num}, xrefs: {entry.xrefs}")
 
-    def load_document(self, filepath: str) -> bool:
-        """Load a PDF document from the specified filepath."""
+    def _revert_edit(self, entry: JournalEntry) -> None:
+        """Take an applied edit back out of the document in memory by its xrefs."""
+        with MUPDF_LOCK:
+            page = self.doc[entry.page_num - 1]
+            if entry.op == OP_HIGHLIGHT:
+                for xref in entry.xrefs or []:
+                    try:
+                        page.delete_annot(page.load_annot(xref))
+                    except Exception as e:
+                        logger.warning(f"Cannot delete annotation {xref} on page {entry.page_num}: {e}")
+                entry.xrefs = None
+            elif entry.op == OP_REMOVE:
+                entry.xrefs = [self._restore_highlight(page, removed) for removed in entry.removed]
+            logger.debug(f"Reverted {entry.op} on page {entry.page_num}")
+
+    def _apply_pending_edits(self) -> int:
+        """Apply all pending edits to a freshly opened document in one pass."""
+        stamped = set()  # Pages given a timestamp, in the compact modes
+        for entry in self.pending_edits:
+            self._apply_edit(entry, stamp=entry.page_num not in stamped)
+            if entry.op == OP_HIGHLIGHT:
+                stamped.add(entry.page_num)
+        return len(self.pending_edits)
+
+    def _recover_journal(self) -> None:
+        """Reapply the edits left in the journal by a session that never saved.
+
+        A journal written for the file as it was before being replaced or
+        edited elsewhere is set aside instead.
+        """
+        if os.path.exists(self.journal.path) and not self.journal.matches_pdf():
+            stale_path = self.journal.set_aside()
+            logger.warning(f"{self.filepath} changed since its unsaved edits were journaled; "
+                           f"not replaying them (journal kept as {stale_path})")
+            return
+        entries = [
+            entry for entry in self.journal.read()
+            if 1 <= entry.page_num <= len(self.doc)
+        ]
+        done, undone = replay_undo(entries)
+        if done or undone:
+            self.pending_edits = done
+            self.undone_edits = undone
+            self._apply_pending_edits()
+            logger.info(f"Recovered {len(done)} unsaved edits from {self.journal.path}")
+
+    def indexing_progress(self) -> Tuple[int, int]:
+        """Number of pages with indexed text and total pages."""
+        if self._index_released:
+            return len(self.doc), len(self.doc)  # Only complete indexes are released
+        if self._text_index is None:
+            return 0, 0
+        return self._text_index.progress()
+
+    def _start_indexing(self, text_index: Optional[TextIndex] = None,
+                        background: bool = True) -> None:
+        """Index page text in the background, reusing a still valid index."""
+        stored = False
+        if text_index is None:
+            entries = self.index_store.load(self.filepath, self.field_extractor.signature)
+            if entries is None:
+                entries = self._load_duplicate_index()
+            if entries is not None and len(entries) == len(self.doc):
+                text_index = TextIndex.from_entries(entries)
+                stored = True
+                logger.debug(f"Loaded stored index of {len(entries)} pages")
+        if text_index is None or text_index.page_count != len(self.doc):
+            text_index = TextIndex(len(self.doc))
+            stored = False
+        self.text_index = text_index
+        self._index_stored = stored
+        if background and not text_index.is_complete():
+            filepath = self.filepath
+            self.indexer = TextIndexer(
+                filepath, text_index,
+                on_complete=lambda: self._store_index(filepath, text_index),
+                extractor=self.field_extractor
+            )
+            self.indexer.start()
+
+    def _load_duplicate_index(self) -> Optional[List[Dict]]:
+        """Stored entries of an indexed file with the same content as this one.
+
+        They are stored under this file's name too, so its next load finds
+        them directly.
+        """
+        fingerprint = self.file_fingerprint()
+        signature = self.field_extractor.signature
+        found = self.index_store.load_by_content(fingerprint, signature) if fingerprint else None
+        if found is None:
+            return None
+        original, entries = found
+        if os.path.abspath(original) != os.path.abspath(self.filepath):
+            self.duplicate_of = original
+            logger.info(f"{self.filepath} has the same content as {original}, reusing its index")
+        self.index_store.save(self.filepath, entries, fingerprint, signature)
+        return entries
+
+    def _stop_indexing(self) -> None:
+        """Stop the background indexer, keeping what it has indexed."""
+        if self.indexer is not None:
+            self.indexer.stop()
+            self.indexer = None
+
+    def load_document(self, filepath: str, text_index: Optional[TextIndex] = None,
+                      background_index: bool = True) -> bool:
+        """Load a PDF document from the specified filepath.
+
+        Page text is indexed in the background from here on, starting from
+        the stored index if the file has one; pass the index of a previous
+        load of the same content to keep it.
+        """
         try:
             self.close()
             logger.debug(f"Attempting to load PDF: {filepath}")
@@ -225,8 +940,12 @@ class PDFHandler:
                 logger.error(f"File not found: {filepath}")
                 raise PDFError(f"File not found: {filepath}")
 
-            self.doc = fitz.open(filepath)
-            self.filepath = str(filepath)
+            with MUPDF_LOCK:
+                self.doc = fitz.open(filepath)
+                self.filepath = str(filepath)
+                self.journal = EditJournal(self.filepath)
+                self._recover_journal()
+            self._start_indexing(text_index, background_index)
             logger.debug(f"Successfully loaded PDF with {len(self.doc)} pages")
             return True
 
@@ -236,35 +955,79 @@ class PDFHandler:
             self.close()
             raise PDFError(f"Failed to load PDF: {str(e)}")
 
-    def save(self) -> bool:
-        """Save the document to its current location."""
-        return self._save_document(self.filepath) if self.filepath else False
+    def save(self, optimize: bool = False) -> bool:
+        """Save the document to its current location.
+
+        With optimize, the file is rewritten compactly (see
+        OPTIMIZE_SAVE_OPTIONS); this is slower, so callers with a GUI run it
+        off the GUI thread. last_save_report tells how it went.
+        """
+        with self.lock:
+            return self._save_document(self.filepath, optimize) if self.filepath else False
 
-    def save_as(self, filepath: str) -> bool:
+    def save_as(self, filepath: str, optimize: bool = False) -> bool:
         """Save the document to a new location."""
-        return self._save_document(filepath)
+        with self.lock:
+            return self._save_document(filepath, optimize)
 
-    def _save_document(self, filepath: str) -> bool:
+    def _save_document(self, filepath: str, optimize: bool = False) -> bool:
         """Internal method to handle document saving."""
         if not self.doc:
             return False
 
+        edits = len(self.pending_edits)
+        edits_since_optimize = self.edits_since_optimize + edits
+        if self.optimize_after_edits and edits_since_optimize >= self.optimize_after_edits:
+            logger.info(f"{edits_since_optimize} edits since the last optimization, optimizing this save")
+            optimize = True
+
         temp_path = None
         original_doc = None
         try:
+            # The indexer holds the file open, which would block replacing it
+            self._stop_indexing()
             full_path = os.path.abspath(filepath)
             temp_path = f"{full_path}.temp"
             original_doc = self.doc
+            bytes_before = os.path.getsize(self.filepath)
+            started = time.perf_counter()
 
-            self.doc.save(temp_path, garbage=0, deflate=True, clean=False)
-            self.doc.close()
+            applied = edits  # Already in the document in memory
+            with MUPDF_LOCK:
+                self.doc.save(temp_path, **(OPTIMIZE_SAVE_OPTIONS if optimize else SAVE_OPTIONS))
+                self.doc.close()
             self.doc = None
 
             os.replace(temp_path, full_path)
-            return self.load_document(full_path)
+            report = SaveReport(full_path, optimize, applied, bytes_before,
+                                os.path.getsize(full_path), time.perf_counter() - started)
+            logger.debug(f"Saved {applied} pending edits to {full_path}")
+
+            # The edits are on disk now, so neither journal is needed
+            self.pending_edits = []
+            self.undone_edits = []
+            self.journal.clear()
+            EditJournal(full_path).clear()
+            # Highlights do not change the page text, so the index and the
+            # memoized searches (which name the file) stay valid
+            query_cache = self.query_cache
+            same_file = self.filepath == full_path
+            loaded = self.load_document(full_path, self.text_index)
+            if same_file:
+                self.query_cache = query_cache
+            # Re-stamp the stored index for the rewritten file
+            self._store_index(full_path, self.text_index)
+            self.edits_since_optimize = 0 if optimize else edits_since_optimize
+            self.last_save_report = report
+            SAVE_SECONDS.observe(report.seconds, mode="optimize" if optimize else "plain")
+            SAVE_BYTES.inc(report.bytes_after)
+            if optimize:
+                logger.info(report.summary())
+            return loaded
 
         except Exception as e:
             logger.error(f"Error saving PDF: {str(e)}")
+            SAVE_FAILURES.inc()
             if temp_path and os.path.exists(temp_path):
                 try:
                     os.unlink(temp_path)
@@ -272,15 +1035,44 @@ class PDFHandler:
                     pass
             if original_doc:
                 self.doc = original_doc
+            if self.filepath and (self.doc is None or self.doc.is_closed):
+                # Closed before the file could be replaced; the edits stay pending and journaled
+                try:
+                    with MUPDF_LOCK:
+                        self.doc = fitz.open(self.filepath)
+                        self._apply_pending_edits()
+                except Exception as reopen_error:
+                    logger.error(f"Error reopening PDF after failed save: {reopen_error}")
+            if self.doc and self.filepath and not self.doc.is_closed:
+                self._start_indexing(self.text_index)
             return False
 
     def close(self) -> None:
         """Close and clean up the document."""
+        with self.lock:
+            self._close()
+
+    def _close(self) -> None:
+        """Close the document; the caller holds the lock."""
         try:
+            self._stop_indexing()
             if self.doc:
-                self.doc.close()
+                with MUPDF_LOCK:
+                    self.doc.close()
+            if self.journal:
+                self.journal.close()
             self.doc = None
             self.filepath = None
+            self.journal = None
+            self.pending_edits = []
+            self.undone_edits = []
+            self.edits_since_optimize = 0
+            self.text_index = None
+            self._index_stored = False
+            self.query_cache = QueryCache()
+            self.duplicate_of = None
+            self._file_fingerprint = None
+            self._fingerprinter = None
         except Exception as e:
             logger.error(f"Error closing document: {e}")
 
@@ -1,6 +1,6 @@
 """
 PDF Highlighter 2.0 - PDF Search Engine
-Last Updated: 2025-02-24 17:55:36 UTC
+Last Updated: 2026-10-19 09:38:18 UTC
 """
 
 import logging
@@ -8,6 +8,9 @@ from pathlib import Path
 from typing import List, Tuple, Optional
 from dataclasses import dataclass
 
+from .page_render import RenderedPage, render_page
+from .bbox_ops import first_overlap
+
 try:
     import fitz  # PyMuPDF
 except ImportError:
@@ -151,16 +154,17 @@ class PDFSearchEngine:
             logger.error(f"Error removing highlight: {e}")
             return False
     
-    def get_page_image(self, page_num: int, scale: float = 1.0) -> Optional[bytes]:
+    def get_page_image(self, page_num: int, scale: float = 1.0) -> Optional[RenderedPage]:
         """
-        Get the page image with highlights rendered.
+        Get the raw page raster with highlights rendered.
         
         Args:
             page_num: 1-based page number
             scale: Zoom scale factor
             
         Returns:
-            Optional[bytes]: PNG image data if successful, None if failed
+            Optional[RenderedPage]: Sample buffer with its width, height, stride
+            and format if successful, None if failed
         """
         try:
             if not self.doc:
@@ -170,20 +174,26 @@ class PDFSearchEngine:
             if page_idx < 0 or page_idx >= len(self.doc):
                 return None
                 
-            page = self.doc[page_idx]
-            
-            # Create transformation matrix for scaling
-            matrix = fitz.Matrix(scale, scale)
-            
-            # Render page with highlights
-            pix = page.get_pixmap(matrix=matrix, alpha=False)
-            
-            # Convert to PNG data
-            return pix.tobytes("png")
+            # Render page with highlights, without encoding the pixels
+            return render_page(self.doc[page_idx], scale, alpha=False)
             
         except Exception as e:
             logger.error(f"Error getting page image: {e}")
             return None
+
+    def get_page_png(self, page_num: int, scale: float = 1.0) -> Optional[bytes]:
+        """
+        Get the page image encoded as PNG.
+        
+        Args:
+            page_num: 1-based page number
+            scale: Zoom scale factor
+            
+        Returns:
+            Optional[bytes]: PNG image data if successful, None if failed
+        """
+        rendered = self.get_page_image(page_num, scale)
+        return rendered.to_png() if rendered else None
     
     def search_text(self, query: str, case_sensitive: bool = False) -> List[SearchResult]:
         """
@@ -213,20 +223,20 @@ class PDFSearchEngine:
                 # Search for text on page with specified flags
                 search_results = page.search_for(query, flags=flags)
                 
-                for rect in search_results:
+                # Check which areas are already highlighted, all at once
+                highlights = self.highlights.get(page_num + 1, [])
+                overlapping = first_overlap(search_results, [highlight.bbox for highlight in highlights])
+                
+                for rect, index in zip(search_results, overlapping):
                     # Get the text within the found rectangle
                     words = page.get_textbox(rect)
                     
-                    # Check if this area is already highlighted
                     highlight_color = None
                     annot_xref = None
                     
-                    if page_num + 1 in self.highlights:
-                        for highlight in self.highlights[page_num + 1]:
-                            if self._rectangles_overlap(rect, highlight.bbox):
-                                highlight_color = highlight.highlight_color
-                                annot_xref = highlight.annot_xref
-                                break
+                    if index >= 0:
+                        highlight_color = highlights[index].highlight_color
+                        annot_xref = highlights[index].annot_xref
                     
                     result = SearchResult(
                         page_num=page_num + 1,
@@ -254,12 +264,4 @@ class PDFSearchEngine:
             
         except Exception as e:
             logger.error(f"Error saving PDF: {e}")
-            return False
-    
-    def _rectangles_overlap(self, rect1: tuple, rect2: tuple) -> bool:
-        """Check if two rectangles overlap."""
-        x1_min, y1_min, x1_max, y1_max = rect1
-        x2_min, y2_min, x2_max, y2_max = rect2
-        
-        return not (x1_max < x2_min or x1_min > x2_max or
-                   y1_max < y2_min or y1_min > y2_max)
\ No newline at end of file
+            return False
\ No newline at end of file
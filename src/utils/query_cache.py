@@ -0,0 +1,79 @@
+"""
+PDF Highlighter 2.0 - Search Query Cache
+Last Updated: 2026-10-19 10:25:01 UTC
+Author: 5446-boop
+"""
+
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, List, Optional
+
+from .metrics import count_cache
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class CachedQuery:
+    """Per-page results of one query, as of an edit revision."""
+    revision: int  # Edit revision the results are valid for
+    page_results: Dict[int, Any]  # 0-based page index -> result, matching pages only
+
+class QueryCache:
+    """LRU memo of search results invalidated per page by edit revisions.
+
+    Every edit bumps a document-wide revision counter and stamps the edited
+    page with it. A cached query is reused as-is except for the pages
+    stamped after it was computed, which the caller re-evaluates.
+    """
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self.revision = 0
+        self._page_revisions: Dict[int, int] = {}  # 0-based page index -> revision of last edit
+        self._entries: "OrderedDict[Hashable, CachedQuery]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def mark_page_edited(self, page_idx: int) -> None:
+        """Record an edit of a 0-based page."""
+        self.revision += 1
+        self._page_revisions[page_idx] = self.revision
+
+    def get(self, key: Hashable) -> Optional[CachedQuery]:
+        """Look up a query, marking it most recently used."""
+        entry = self._entries.get(key)
+        count_cache("query", entry is not None)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def peek(self, key: Hashable) -> Optional[CachedQuery]:
+        """Look up a query without touching recency or statistics."""
+        return self._entries.get(key)
+
+    def stale_pages(self, entry: CachedQuery) -> List[int]:
+        """Pages edited since the entry was computed, in page order."""
+        return sorted(
+            page_idx for page_idx, revision in self._page_revisions.items()
+            if revision > entry.revision
+        )
+
+    def put(self, key: Hashable, page_results: Dict[int, Any]) -> CachedQuery:
+        """Store the results of a query as of the current revision."""
+        entry = CachedQuery(self.revision, page_results)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def clear(self) -> None:
+        """Drop all cached queries."""
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
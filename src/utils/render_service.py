@@ -0,0 +1,371 @@
+"""
+PDF Highlighter 2.0 - Shared-Memory Render Service
+Last Updated: 2026-10-19 10:39:05 UTC
+Author: 5446-boop
+
+Renders pages in a small pool of worker processes, each with documents of
+its own. A worker rasterizes a page into a shared memory block
+and hands back only the block's name and geometry; the caller maps the
+same block, so pixel data is never pickled or copied between processes.
+MuPDF runs outside the GUI process, and pages render in parallel.
+
+multiprocessing.shared_memory needs Python 3.8; on 3.7 the service is
+never available, and callers render pages in-process instead.
+"""
+
+import atexit
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from .page_render import RenderedPage, FORMAT_RGB888, FORMAT_RGBA8888, RENDER_SECONDS
+from .pdf_handler import PDFError
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python 3.7
+    shared_memory = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+DEFAULT_MAX_OPEN = 4  # Documents kept open per worker
+RELEASE_TIMEOUT = 10.0  # Seconds to wait for workers to close a document
+POLL_INTERVAL = 1.0  # Seconds between checks that the workers are alive
+MAX_RESTARTS = 3  # Worker restarts before the service gives up
+
+@dataclass
+class SharedRaster:
+    """Where a worker left a rendered page: a shared memory block and its layout."""
+    name: str
+    page_num: int  # 1-based page number
+    width: int
+    height: int
+    stride: int
+    format: str
+
+class _MappedBlock(shared_memory.SharedMemory if shared_memory is not None else object):
+    """A shared memory block that may be outlived by views of its buffer."""
+
+    def __del__(self):
+        try:
+            self.close()
+        except BufferError:
+            pass  # A QImage still uses it; the mapping goes with the last view
+
+def attach_raster(raster: SharedRaster) -> RenderedPage:
+    """Map a worker's shared memory block as a RenderedPage.
+
+    The block's name is unlinked at once, so it is freed as soon as the
+    page (and any QImage wrapping its samples) is gone, even if the
+    process dies without cleaning up.
+    """
+    block = _MappedBlock(name=raster.name)
+    try:
+        block.unlink()
+    except FileNotFoundError:
+        pass  # Windows frees blocks with their last handle instead
+    return RenderedPage(
+        page_num=raster.page_num,
+        width=raster.width,
+        height=raster.height,
+        stride=raster.stride,
+        format=raster.format,
+        samples=block.buf[:raster.stride * raster.height],
+        pixmap=None,
+        owner=block
+    )
+
+# Runs in the worker processes
+
+def _open_document(docs: "OrderedDict", filepath: str, max_open: int):
+    """A worker's open document for a file, reopened when the file changed."""
+    import fitz  # PyMuPDF
+
+    stat = os.stat(filepath)
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    entry = docs.get(filepath)
+    if entry is not None and entry[1] == stamp:
+        docs.move_to_end(filepath)
+        return entry[0]
+    if entry is not None:
+        entry[0].close()
+    doc = fitz.open(filepath)
+    docs[filepath] = (doc, stamp)
+    docs.move_to_end(filepath)
+    while len(docs) > max_open:
+        _, (oldest, _) = docs.popitem(last=False)
+        oldest.close()
+    return doc
+
+def _render_to_shared(doc, page_idx: int, zoom: float, alpha: bool) -> SharedRaster:
+    """Rasterize a page and move its samples into a new shared memory block.
+
+    The one copy happens here, in the worker; the caller maps the block.
+    """
+    import fitz  # PyMuPDF
+
+    pix = doc[page_idx].get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=alpha)
+    size = pix.stride * pix.height
+    block = shared_memory.SharedMemory(create=True, size=max(1, size))
+    try:
+        block.buf[:size] = pix.samples_mv
+        return SharedRaster(block.name, page_idx + 1, pix.width, pix.height, pix.stride,
+                            FORMAT_RGBA8888 if pix.alpha else FORMAT_RGB888)
+    except Exception:
+        block.unlink()
+        raise
+    finally:
+        block.close()
+
+def _render_worker(requests: "multiprocessing.Queue", results: "multiprocessing.Queue",
+                   max_open: int) -> None:
+    """Serve render and release requests until told to stop."""
+    docs: "OrderedDict[str, Tuple[object, Tuple[int, int]]]" = OrderedDict()
+    try:
+        while True:
+            request = requests.get()
+            kind = request[0]
+            if kind == "stop":
+                break
+            if kind == "release":
+                _, filepath, token = request
+                entry = docs.pop(filepath, None)
+                if entry is not None:
+                    entry[0].close()
+                results.put(("released", token, None))
+                continue
+
+            _, job_id, filepath, page_idx, zoom, alpha = request
+            try:
+                doc = _open_document(docs, filepath, max_open)
+                results.put(("done", job_id, _render_to_shared(doc, page_idx, zoom, alpha)))
+            except Exception as e:
+                results.put(("error", job_id, f"{type(e).__name__}: {e}"))
+    finally:
+        for doc, _ in docs.values():
+            doc.close()
+
+class RenderService:
+    """Pool of render worker processes, started on first use.
+
+    Jobs go to the worker with the fewest jobs in flight. Every worker has
+    a queue of its own, so release() can reach all of them, e.g. so that
+    a document can be replaced on disk.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_open: int = DEFAULT_MAX_OPEN):
+        self.workers = workers or DEFAULT_WORKERS
+        self.max_open = max_open
+        self._lock = threading.Lock()
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: List[multiprocessing.Process] = []
+        self._queues: List[multiprocessing.Queue] = []
+        self._in_flight: List[int] = []  # Jobs per worker
+        self._jobs: Dict[int, Tuple[Future, int, float]] = {}  # job id -> future, worker, submit time
+        self._releases: Dict[int, List] = {}  # token -> [acks still due, event]
+        self._results: Optional[multiprocessing.Queue] = None
+        self._collector: Optional[threading.Thread] = None
+        self._ids = itertools.count(1)
+        self._restarts = 0
+        self._broken = False  # Workers kept exiting
+        self._closed = False
+
+    @property
+    def started(self) -> bool:
+        return self._collector is not None
+
+    @property
+    def available(self) -> bool:
+        """Check whether jobs can still be submitted."""
+        return shared_memory is not None and not (self._closed or self._broken)
+
+    def _start_worker(self, index: int) -> None:
+        process = self._context.Process(
+            target=_render_worker,
+            args=(self._queues[index], self._results, self.max_open),
+            name=f"RenderWorker-{index}",
+            daemon=True
+        )
+        process.start()
+        self._processes[index] = process
+
+    def start(self) -> None:
+        """Start the workers; submit() does so when needed."""
+        with self._lock:
+            if self.started or self._closed or shared_memory is None:
+                return
+            self._results = self._context.Queue()
+            self._queues = [self._context.Queue() for _ in range(self.workers)]
+            self._processes = [None] * self.workers
+            self._in_flight = [0] * self.workers
+            for index in range(self.workers):
+                self._start_worker(index)
+            self._collector = threading.Thread(target=self._collect, name="RenderCollector", daemon=True)
+            self._collector.start()
+            atexit.register(self.shutdown)
+        logger.info(f"Render service started with {self.workers} workers")
+
+    def submit(self, filepath: str, page_idx: int, zoom: float = 1.0, alpha: bool = False) -> Future:
+        """Render a 0-based page; the future resolves to a RenderedPage.
+
+        The future fails with PDFError if the page cannot be rendered or
+        the service is shut down. Cancelling it while pending drops the
+        result once it arrives.
+        """
+        self.start()
+        future = Future()
+        with self._lock:
+            if not self.available:
+                future.set_exception(PDFError("Render service is not available"))
+                return future
+            job_id = next(self._ids)
+            worker = min(range(self.workers), key=self._in_flight.__getitem__)
+            self._in_flight[worker] += 1
+            self._jobs[job_id] = (future, worker, time.perf_counter())
+            self._queues[worker].put(("render", job_id, os.path.abspath(filepath), page_idx, zoom, alpha))
+        return future
+
+    def render(self, filepath: str, page_idx: int, zoom: float = 1.0, alpha: bool = False) -> RenderedPage:
+        """Render a 0-based page and wait for it."""
+        return self.submit(filepath, page_idx, zoom, alpha).result()
+
+    def in_flight(self) -> int:
+        """Jobs submitted and not finished yet."""
+        with self._lock:
+            return len(self._jobs)
+
+    def release(self, filepath: str, timeout: float = RELEASE_TIMEOUT) -> bool:
+        """Have every worker close a document, after the jobs already queued.
+
+        Returns False if the workers did not confirm within the timeout.
+        """
+        if not self.started:
+            return True
+        event = threading.Event()
+        with self._lock:
+            if self._closed:
+                return True
+            token = next(self._ids)
+            self._releases[token] = [self.workers, event]
+            for worker_queue in self._queues:
+                worker_queue.put(("release", os.path.abspath(filepath), token))
+        released = event.wait(timeout)
+        with self._lock:
+            self._releases.pop(token, None)
+        if not released:
+            logger.warning(f"Render workers did not release {filepath} in time")
+        return released
+
+    def _finish(self, job_id: int, raster: Optional[SharedRaster], error: Optional[str]) -> None:
+        with self._lock:
+            entry = self._jobs.pop(job_id, None)
+            if entry is not None:
+                self._in_flight[entry[1]] -= 1
+        # Map the block even when nobody waits for it, so that it is freed
+        page = attach_raster(raster) if raster is not None else None
+        if entry is not None and page is not None:
+            RENDER_SECONDS.observe(time.perf_counter() - entry[2], where="service")
+        if entry is None or entry[0].cancelled():
+            return
+        if page is not None:
+            entry[0].set_result(page)
+        else:
+            entry[0].set_exception(PDFError(f"Failed to render page: {error}"))
+
+    def _check_workers(self) -> None:
+        """Fail the jobs of a worker that died, and replace it."""
+        with self._lock:
+            if self._closed or self._broken:
+                return
+            dead = [index for index, process in enumerate(self._processes) if not process.is_alive()]
+            if not dead:
+                return
+            lost = []
+            for index in dead:
+                logger.error(f"Render worker {index} exited with code {self._processes[index].exitcode}")
+                lost += [job_id for job_id, (_, worker, _) in self._jobs.items() if worker == index]
+                self._queues[index] = self._context.Queue()
+                self._in_flight[index] = 0
+            self._restarts += len(dead)
+            if self._restarts > MAX_RESTARTS:
+                logger.error("Render workers keep exiting; rendering in the GUI process again")
+                self._broken = True
+                lost = list(self._jobs)
+            else:
+                for index in dead:
+                    self._start_worker(index)
+            for entry in self._releases.values():
+                entry[0] -= len(dead)
+                if entry[0] <= 0:
+                    entry[1].set()
+            failed = [self._jobs.pop(job_id)[0] for job_id in lost]
+        for future in failed:
+            if not future.cancelled():
+                future.set_exception(PDFError("Render worker exited"))
+
+    def _collect(self) -> None:
+        """Hand results from the workers to their futures."""
+        checked = time.monotonic()
+        while True:
+            try:
+                message = self._results.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                message = ()
+            if time.monotonic() - checked >= POLL_INTERVAL:
+                self._check_workers()
+                checked = time.monotonic()
+            if message == ():
+                continue
+            if message is None:
+                break
+            kind, key, payload = message
+            try:
+                if kind == "released":
+                    with self._lock:
+                        entry = self._releases.get(key)
+                        if entry is not None:
+                            entry[0] -= 1
+                            if entry[0] <= 0:
+                                entry[1].set()
+                elif kind == "done":
+                    self._finish(key, payload, None)
+                else:
+                    self._finish(key, None, payload)
+            except Exception as e:
+                logger.error(f"Error handling render result: {e}")
+
+    def shutdown(self) -> None:
+        """Stop the workers and fail the jobs still pending."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            started = self.started
+            for worker_queue in self._queues:
+                worker_queue.put(("stop",))
+        if not started:
+            return
+        for process in self._processes:
+            if process is None:
+                continue
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._results.put(None)
+        self._collector.join()
+        atexit.unregister(self.shutdown)
+        with self._lock:
+            pending = [future for future, _, _ in self._jobs.values()]
+            self._jobs.clear()
+        for future in pending:
+            future.cancel()
+        logger.info("Render service stopped")
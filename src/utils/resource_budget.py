@@ -0,0 +1,220 @@
+"""
+PDF Highlighter 2.0 - Memory Budget
+Last Updated: 2026-10-19 11:07:00 UTC
+Author: 5446-boop
+
+One memory limit over the resources that grow while a session stays
+open: MuPDF's store of decoded fonts, images and objects, the rendered
+pages kept by the viewer and the text indexes of open documents. When
+together they pass the limit, they are evicted in turn, cheapest to
+rebuild first, until they are back under it with some room to spare.
+
+MuPDF fixes its store's own limit when the library starts, so the budget
+shrinks the store instead of lowering it. Render and search worker
+processes have stores of their own, which are not covered.
+
+Set PDF_HIGHLIGHTER_MEMORY_MB to change the limit from its default.
+"""
+
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from .memory_profile import current_rss, release_free_memory
+from .metrics import registry
+from .mupdf_lock import MUPDF_LOCK
+
+logger = logging.getLogger(__name__)
+
+MEMORY_ENV = "PDF_HIGHLIGHTER_MEMORY_MB"
+DEFAULT_LIMIT_MB = 512
+CHECK_INTERVAL = 30.0  # Seconds between checks in the application
+LOW_WATER = 0.8  # Eviction frees down to this share of the limit
+MB = 1024 * 1024
+
+POOL_MUPDF = "mupdf_store"
+POOL_RENDER = "render_cache"
+POOL_TEXT = "text_index"
+
+MEMORY_BYTES = registry.gauge(
+    "pdf_highlighter_memory_bytes", "Bytes held by each pool of the memory budget, and the process RSS",
+    ("pool",)
+)
+MEMORY_EVICTED = registry.counter(
+    "pdf_highlighter_memory_evicted_bytes_total", "Bytes freed by the memory budget", ("pool",)
+)
+
+_STORE_USAGE = re.compile(r"max=(\d+), size=(\d+)")
+
+def mupdf_store_usage() -> Optional[Tuple[int, int]]:
+    """Size and limit of MuPDF's store in bytes, None if they cannot be read.
+
+    PyMuPDF does not report them, so they are read from MuPDF's debug
+    listing of the store.
+    """
+    try:
+        mupdf = fitz.mupdf
+        with MUPDF_LOCK:
+            buffer = mupdf.fz_new_buffer(1024)
+            output = mupdf.FzOutput(buffer)
+            mupdf.fz_debug_store(output)
+            output.fz_close_output()
+            listing = bytes(mupdf.fz_buffer_extract(buffer)).decode("utf-8", "replace")
+        match = _STORE_USAGE.search(listing)
+        if match is None:
+            return None
+        return int(match.group(2)), int(match.group(1))
+    except Exception as e:
+        logger.debug(f"Cannot read the MuPDF store size: {e}")
+        return None
+
+def shrink_mupdf_store(needed: int) -> int:
+    """Evict at least `needed` bytes from MuPDF's store; returns bytes freed."""
+    usage = mupdf_store_usage()
+    if usage is None or usage[0] == 0:
+        return 0
+    size, maxsize = usage
+    target = max(0, size - needed)
+    with MUPDF_LOCK:
+        if maxsize == 0:
+            fitz.TOOLS.store_shrink(100)  # An unlimited store can only be emptied
+        else:
+            # MuPDF shrinks the store to a percentage of its limit
+            fitz.TOOLS.store_shrink(100 - target * 100 // maxsize)
+    after = mupdf_store_usage()
+    return size - after[0] if after else 0
+
+@dataclass
+class ResourcePool:
+    """Memory covered by the budget: how to measure it and how to free some."""
+    name: str
+    size: Callable[[], int]  # Bytes held
+    shrink: Callable[[int], int]  # Bytes wanted -> bytes freed
+
+@dataclass
+class MemoryBreakdown:
+    """Bytes held by every pool at one moment, with the process RSS."""
+    limit: int
+    pools: Dict[str, int]
+    rss: int
+    evicted: Dict[str, int] = field(default_factory=dict)  # Bytes freed by the check that measured this
+
+    @property
+    def total(self) -> int:
+        return sum(self.pools.values())
+
+    @property
+    def other(self) -> int:
+        """RSS not held by any pool: code, Qt, free heap not returned yet."""
+        return max(0, self.rss - self.total)
+
+    def summary(self) -> str:
+        lines = [f"Budgeted: {self.total / MB:.1f} of {self.limit / MB:.0f} MB"]
+        lines += [f"  {name}: {size / MB:.1f} MB" for name, size in self.pools.items()]
+        lines.append(f"Process: {self.rss / MB:.1f} MB ({self.other / MB:.1f} MB outside the budget)")
+        if self.evicted:
+            lines.append("Evicted: " + ", ".join(f"{name} {size / MB:.1f} MB" for name, size in self.evicted.items()))
+        return "\n".join(lines)
+
+class ResourceBudget:
+    """A memory limit shared by pools that are evicted in the order added.
+
+    The MuPDF store is always covered, as the first pool; the application
+    adds its own caches. Checks only run when enforce() is called, so the
+    limit can be passed in between.
+    """
+
+    def __init__(self, limit_mb: float = DEFAULT_LIMIT_MB):
+        self.limit = int(limit_mb * MB)
+        self._lock = threading.Lock()
+        self._pools: List[ResourcePool] = []
+        self.add_pool(POOL_MUPDF, lambda: (mupdf_store_usage() or (0, 0))[0], shrink_mupdf_store)
+
+    @property
+    def limit_mb(self) -> int:
+        return self.limit // MB
+
+    def set_limit_mb(self, limit_mb: float) -> None:
+        self.limit = int(limit_mb * MB)
+        logger.info(f"Memory budget set to {self.limit_mb} MB")
+
+    def add_pool(self, name: str, size: Callable[[], int], shrink: Callable[[int], int]) -> None:
+        """Cover a pool, evicted after those added before it."""
+        with self._lock:
+            self._pools = [pool for pool in self._pools if pool.name != name]
+            self._pools.append(ResourcePool(name, size, shrink))
+
+    def remove_pool(self, name: str) -> None:
+        with self._lock:
+            self._pools = [pool for pool in self._pools if pool.name != name]
+
+    @staticmethod
+    def _measure(pool: ResourcePool) -> int:
+        try:
+            return pool.size()
+        except Exception as e:
+            logger.warning(f"Error measuring {pool.name}: {e}")
+            return 0
+
+    def breakdown(self) -> MemoryBreakdown:
+        """Bytes held by every pool now."""
+        with self._lock:
+            pools = list(self._pools)
+        breakdown = MemoryBreakdown(self.limit, {pool.name: self._measure(pool) for pool in pools}, current_rss())
+        for name, size in breakdown.pools.items():
+            MEMORY_BYTES.set(size, pool=name)
+        MEMORY_BYTES.set(breakdown.rss, pool="rss")
+        return breakdown
+
+    def enforce(self) -> MemoryBreakdown:
+        """Evict from the pools if they hold more than the limit together.
+
+        Frees down to LOW_WATER of the limit, so that the next check does
+        not evict again straight away. Returns the breakdown after the
+        check, with what was evicted.
+        """
+        breakdown = self.breakdown()
+        if breakdown.total <= self.limit:
+            return breakdown
+
+        needed = breakdown.total - int(self.limit * LOW_WATER)
+        evicted: Dict[str, int] = {}
+        with self._lock:
+            pools = list(self._pools)
+        for pool in pools:
+            if needed <= 0:
+                break
+            try:
+                freed = pool.shrink(needed)
+            except Exception as e:
+                logger.error(f"Error evicting from {pool.name}: {e}")
+                continue
+            if freed > 0:
+                evicted[pool.name] = freed
+                MEMORY_EVICTED.inc(freed, pool=pool.name)
+                needed -= freed
+        release_free_memory()
+
+        after = self.breakdown()
+        after.evicted = evicted
+        logger.info(f"Memory budget of {self.limit_mb} MB exceeded "
+                    f"({breakdown.total / MB:.1f} MB), now {after.total / MB:.1f} MB")
+        if after.total > self.limit:
+            logger.warning("Memory budget still exceeded; what is left is in use")
+        return after
+
+def budget_from_env() -> ResourceBudget:
+    """A budget with the limit in PDF_HIGHLIGHTER_MEMORY_MB, or the default."""
+    try:
+        limit_mb = float(os.environ.get(MEMORY_ENV, DEFAULT_LIMIT_MB))
+        if limit_mb <= 0:
+            raise ValueError(limit_mb)
+    except ValueError:
+        logger.warning(f"Ignoring invalid {MEMORY_ENV}")
+        limit_mb = DEFAULT_LIMIT_MB
+    return ResourceBudget(limit_mb)
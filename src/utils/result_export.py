@@ -0,0 +1,144 @@
+"""
+PDF Highlighter 2.0 - Result Export
+Last Updated: 2026-10-19 10:10:10 UTC
+Author: 5446-boop
+"""
+
+import csv
+import json
+import logging
+import os
+import threading
+from typing import Iterable, Optional, Tuple
+
+from .fingerprint import DuplicateTracker
+from .pdf_handler import PDFHandler, SearchResult
+
+logger = logging.getLogger(__name__)
+
+FORMAT_CSV = "csv"
+FORMAT_JSONL = "jsonl"
+
+EXPORT_FIELDS = [
+    "file", "page", "match_count", "bboxes",
+    "delivery_number", "invoice_number", "highlight_status"
+]
+
+def format_for_path(path: str) -> str:
+    """Export format implied by a file name, CSV unless it ends in .jsonl/.ndjson."""
+    extension = os.path.splitext(path)[1].lower()
+    return FORMAT_JSONL if extension in (".jsonl", ".ndjson") else FORMAT_CSV
+
+class ResultWriter:
+    """Writes export rows to a file one at a time.
+
+    Nothing is buffered beyond the file object itself, so an export uses
+    the same memory for ten pages as for twenty thousand.
+    """
+
+    def __init__(self, path: str, fmt: Optional[str] = None):
+        self.path = path
+        self.format = fmt or format_for_path(path)
+        if self.format not in (FORMAT_CSV, FORMAT_JSONL):
+            raise ValueError(f"Unknown export format: {self.format}")
+        self.rows = 0
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._csv = None
+        if self.format == FORMAT_CSV:
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(EXPORT_FIELDS)
+
+    def write(self, filepath: Optional[str], page_num: int, match_count: int,
+              bboxes: Iterable[Tuple[float, float, float, float]],
+              delivery_number: Optional[str], invoice_number: Optional[str],
+              highlight_status: str) -> None:
+        """Write one row."""
+        boxes = [[round(value, 2) for value in bbox] for bbox in bboxes]
+        if self._csv is not None:
+            self._csv.writerow([
+                filepath or "", page_num, match_count,
+                json.dumps(boxes, separators=(",", ":")) if boxes else "",
+                delivery_number or "", invoice_number or "", highlight_status
+            ])
+        else:
+            self._file.write(json.dumps(dict(zip(EXPORT_FIELDS, [
+                filepath, page_num, match_count, boxes,
+                delivery_number, invoice_number, highlight_status
+            ]))) + "\n")
+        self.rows += 1
+
+    def write_result(self, result: SearchResult, highlight_status: str) -> None:
+        """Write the row of a search result."""
+        self.write(result.filepath, result.page_num, result.total_matches, result.bboxes,
+                   result.delivery_number, result.invoice_number, highlight_status)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "ResultWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+def _is_duplicate_file(handler: PDFHandler, duplicates: Optional[DuplicateTracker]) -> bool:
+    if duplicates is None:
+        return False
+    fingerprint = handler.file_fingerprint()
+    return fingerprint is not None and duplicates.check_file(handler.filepath, fingerprint) is not None
+
+def _is_duplicate_page(handler: PDFHandler, page_num: int,
+                       duplicates: Optional[DuplicateTracker]) -> bool:
+    if duplicates is None:
+        return False
+    fingerprint = handler.page_fingerprint(page_num - 1)
+    return duplicates.check_page(handler.filepath, page_num, fingerprint) is not None
+
+def export_search(handlers: Iterable[PDFHandler], query: str, writer: ResultWriter,
+                  cancelled: Optional[threading.Event] = None,
+                  pages: Optional[Iterable[int]] = None,
+                  duplicates: Optional[DuplicateTracker] = None) -> int:
+    """Stream the results of a search over some documents into a writer.
+
+    Each document is searched page by page under its handler's lock and
+    rows are written as pages match; results are not memoized. pages
+    limits every document to some 1-based page numbers. Given a duplicate
+    tracker, documents and pages whose content was seen before are left
+    out and recorded in it. Returns the number of rows written.
+    """
+    pages = list(pages) if pages is not None else None
+    for handler in handlers:
+        with handler.lock:
+            if not handler.doc or _is_duplicate_file(handler, duplicates):
+                continue
+            for result in handler.iter_search(query, pages, cancelled, memoize=False):
+                if _is_duplicate_page(handler, result.page_num, duplicates):
+                    continue
+                writer.write_result(result, handler.highlight_status(result.page_num, query))
+            if cancelled is not None and cancelled.is_set():
+                logger.info(f"Export cancelled after {writer.rows} rows")
+                return writer.rows
+    logger.info(f"Exported {writer.rows} results for '{query}' to {writer.path}")
+    return writer.rows
+
+def export_number_map(handler: PDFHandler, writer: ResultWriter,
+                      cancelled: Optional[threading.Event] = None,
+                      duplicates: Optional[DuplicateTracker] = None) -> int:
+    """Stream the invoice and delivery number of every page into a writer.
+
+    The highlight status of a row tells whether the page has any highlight.
+    Given a duplicate tracker, a document or pages seen before are left out.
+    """
+    with handler.lock:
+        if _is_duplicate_file(handler, duplicates):
+            return writer.rows
+        for page_num, invoice_number, delivery_number in handler.iter_page_numbers():
+            if cancelled is not None and cancelled.is_set():
+                logger.info(f"Export cancelled after {writer.rows} rows")
+                return writer.rows
+            if _is_duplicate_page(handler, page_num, duplicates):
+                continue
+            writer.write(handler.filepath, page_num, 0, [],
+                         delivery_number, invoice_number, handler.highlight_status(page_num, ""))
+    logger.info(f"Exported numbers of {writer.rows} pages to {writer.path}")
+    return writer.rows
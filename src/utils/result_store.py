@@ -0,0 +1,256 @@
+"""
+PDF Highlighter 2.0 - Columnar Result Store
+Last Updated: 2026-10-19 09:36:03 UTC
+Author: 5446-boop
+"""
+
+import bisect
+import logging
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .pdf_handler import SearchResult
+
+logger = logging.getLogger(__name__)
+
+BBox = Tuple[float, float, float, float]
+
+class BBoxView:
+    """Read-only sequence of bboxes over a flat run of coordinates.
+
+    Wraps a memoryview into the store's coordinate buffer, so handing
+    bboxes to a painter copies nothing until one is actually read.
+    """
+
+    __slots__ = ("coords",)
+
+    def __init__(self, coords: memoryview):
+        self.coords = coords
+
+    def __len__(self) -> int:
+        return len(self.coords) // 4
+
+    def __getitem__(self, index: int) -> BBox:
+        count = len(self)
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError("bbox index out of range")
+        base = index * 4
+        coords = self.coords
+        return (coords[base], coords[base + 1], coords[base + 2], coords[base + 3])
+
+    def __iter__(self) -> Iterator[BBox]:
+        coords = self.coords
+        for base in range(0, len(coords), 4):
+            yield (coords[base], coords[base + 1], coords[base + 2], coords[base + 3])
+
+    def tolist(self) -> List[BBox]:
+        return list(self)
+
+class ResultStore:
+    """Search results kept in columns rather than as one object per result.
+
+    Scalar fields live in typed arrays indexed by row, repeated strings are
+    interned, and the bboxes of all rows share fixed-size coordinate chunks
+    addressed by (chunk, start, count) per row. Chunks are allocated at
+    full size and never resized, so views into them stay valid while more
+    rows are appended. store[row] rebuilds a SearchResult for code that
+    wants one.
+    """
+
+    CHUNK_BBOXES = 16384  # Bboxes per coordinate chunk
+
+    def __init__(self):
+        self.page_nums = array("i")
+        self.match_counts = array("i")
+        self.bbox_chunks = array("I")
+        self.bbox_starts = array("I")  # In bboxes, within the chunk
+        self.bbox_counts = array("I")
+        self.file_ids = array("i")
+        self.text_ids = array("i")
+        self.delivery_ids = array("i")
+        self.invoice_ids = array("i")
+        self.highlight_colors: Dict[int, Tuple[float, float, float]] = {}  # Sparse, by row
+        self.annot_xrefs: Dict[int, List[int]] = {}  # Sparse, by row
+        self._chunks: List[array] = []
+        self._chunk_used = 0  # Bboxes used in the last chunk
+        self._strings: List[Optional[str]] = [None]  # Interned strings, id 0 is None
+        self._string_ids: Dict[str, int] = {}
+
+    def _intern(self, value: Optional[str]) -> int:
+        if value is None:
+            return 0
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = len(self._strings)
+            self._strings.append(value)
+            self._string_ids[value] = string_id
+        return string_id
+
+    def _store_bboxes(self, bboxes: List[BBox]) -> Tuple[int, int]:
+        """Copy bboxes into chunk space, returning (chunk, start)."""
+        count = len(bboxes)
+        if not self._chunks or self._chunk_used + count > len(self._chunks[-1]) // 4:
+            size = max(self.CHUNK_BBOXES, count)
+            self._chunks.append(array("d", bytes(size * 4 * 8)))
+            self._chunk_used = 0
+        chunk = self._chunks[-1]
+        start = self._chunk_used
+        base = start * 4
+        for x0, y0, x1, y1 in bboxes:
+            chunk[base] = x0
+            chunk[base + 1] = y0
+            chunk[base + 2] = x1
+            chunk[base + 3] = y1
+            base += 4
+        self._chunk_used += count
+        return len(self._chunks) - 1, start
+
+    def append(self, result: SearchResult) -> int:
+        """Add a result as a new row, returning the row."""
+        row = len(self.page_nums)
+        chunk, start = self._store_bboxes(result.bboxes)
+        self.page_nums.append(result.page_num)
+        self.match_counts.append(result.total_matches)
+        self.bbox_chunks.append(chunk)
+        self.bbox_starts.append(start)
+        self.bbox_counts.append(len(result.bboxes))
+        self.file_ids.append(self._intern(result.filepath))
+        self.text_ids.append(self._intern(result.text))
+        self.delivery_ids.append(self._intern(result.delivery_number))
+        self.invoice_ids.append(self._intern(result.invoice_number))
+        if result.highlight_color is not None:
+            self.highlight_colors[row] = tuple(result.highlight_color)
+        if result.annot_xrefs:
+            self.annot_xrefs[row] = list(result.annot_xrefs)
+        return row
+
+    def extend(self, results: Iterable[SearchResult]) -> range:
+        """Add several results, returning their rows."""
+        first = len(self)
+        for result in results:
+            self.append(result)
+        return range(first, len(self))
+
+    def __len__(self) -> int:
+        return len(self.page_nums)
+
+    def bboxes(self, row: int) -> BBoxView:
+        """Bboxes of a row, as a view into the store."""
+        start = self.bbox_starts[row] * 4
+        end = start + self.bbox_counts[row] * 4
+        return BBoxView(memoryview(self._chunks[self.bbox_chunks[row]])[start:end])
+
+    def filepath(self, row: int) -> Optional[str]:
+        return self._strings[self.file_ids[row]]
+
+    def text(self, row: int) -> Optional[str]:
+        return self._strings[self.text_ids[row]]
+
+    def delivery_number(self, row: int) -> Optional[str]:
+        return self._strings[self.delivery_ids[row]]
+
+    def invoice_number(self, row: int) -> Optional[str]:
+        return self._strings[self.invoice_ids[row]]
+
+    def set_highlight(self, row: int, color: Optional[Tuple[float, float, float]],
+                      xrefs: Optional[List[int]] = None) -> None:
+        """Record the highlight status of a row; None clears it."""
+        if color is None:
+            self.highlight_colors.pop(row, None)
+            self.annot_xrefs.pop(row, None)
+        else:
+            self.highlight_colors[row] = tuple(color)
+            if xrefs:
+                self.annot_xrefs[row] = list(xrefs)
+
+    def rows_for_file(self, filepath: Optional[str]) -> List[int]:
+        """Rows of one document, in insertion order."""
+        file_id = self._string_ids.get(filepath) if filepath is not None else 0
+        if file_id is None:
+            return []
+        return [row for row, row_file in enumerate(self.file_ids) if row_file == file_id]
+
+    def __getitem__(self, row: int) -> SearchResult:
+        """The row as a SearchResult."""
+        if row < 0:
+            row += len(self)
+        return SearchResult(
+            page_num=self.page_nums[row],
+            text=self.text(row),
+            bboxes=self.bboxes(row).tolist(),
+            total_matches=self.match_counts[row],
+            highlight_color=self.highlight_colors.get(row),
+            annot_xrefs=self.annot_xrefs.get(row),
+            delivery_number=self.delivery_number(row),
+            invoice_number=self.invoice_number(row),
+            filepath=self.filepath(row)
+        )
+
+    def __iter__(self) -> Iterator[SearchResult]:
+        for row in range(len(self)):
+            yield self[row]
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the columns and coordinate chunks."""
+        columns = (self.page_nums, self.match_counts, self.bbox_chunks, self.bbox_starts,
+                   self.bbox_counts, self.file_ids, self.text_ids, self.delivery_ids,
+                   self.invoice_ids)
+        return (sum(column.itemsize * len(column) for column in columns) +
+                sum(chunk.itemsize * len(chunk) for chunk in self._chunks))
+
+class HitIndex:
+    """The bboxes of some result rows as one flat, numbered list of hits.
+
+    Hit i is (0-based page, bbox); looking one up is a binary search over
+    per-row offsets, and nothing is copied out of the store.
+    """
+
+    def __init__(self, store: Optional[ResultStore] = None, rows: Iterable[int] = ()):
+        self.store = store
+        self.rows = array("I", rows)
+        self.offsets = array("I", [0])
+        for row in self.rows:
+            self.offsets.append(self.offsets[-1] + store.bbox_counts[row])
+
+    def __len__(self) -> int:
+        return self.offsets[-1]
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __getitem__(self, index: int) -> Tuple[int, BBox]:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("hit index out of range")
+        position = bisect.bisect_right(self.offsets, index) - 1
+        row = self.rows[position]
+        return self.store.page_nums[row] - 1, self.store.bboxes(row)[index - self.offsets[position]]
+
+    def first_on_page(self, page_idx: int) -> Optional[int]:
+        """Index of the first hit on a 0-based page."""
+        for position, row in enumerate(self.rows):
+            if self.store.page_nums[row] - 1 == page_idx and self.offsets[position + 1] > self.offsets[position]:
+                return self.offsets[position]
+        return None
+
+    def by_page(self) -> Dict[int, List[Tuple[int, BBoxView]]]:
+        """(first hit index, bboxes) of every row, by 0-based page."""
+        pages: Dict[int, List[Tuple[int, BBoxView]]] = {}
+        for position, row in enumerate(self.rows):
+            pages.setdefault(self.store.page_nums[row] - 1, []).append(
+                (self.offsets[position], self.store.bboxes(row))
+            )
+        return pages
+
+    def same_hits(self, other: "HitIndex") -> bool:
+        """Check whether two indexes list the same hits in the same order."""
+        if len(self) != len(other) or len(self.rows) != len(other.rows):
+            return False
+        for mine, theirs in zip(self.rows, other.rows):
+            if (self.store.page_nums[mine] != other.store.page_nums[theirs] or
+                    self.store.bboxes(mine).coords != other.store.bboxes(theirs).coords):
+                return False
+        return True
@@ -0,0 +1,242 @@
+"""
+PDF Highlighter 2.0 - Page Text Index
+Last Updated: 2026-10-19 10:43:08 UTC
+Author: 5446-boop
+"""
+
+import logging
+import re
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .fingerprint import PageFingerprinter
+from .mupdf_lock import MUPDF_LOCK
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+    logging.error("PyMuPDF not installed. Please install with: pip install PyMuPDF")
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+def search_text_flags() -> int:
+    """Text extraction flags matching the defaults of page.search_for."""
+    return (fitz.TEXT_DEHYPHENATE | fitz.TEXT_PRESERVE_WHITESPACE |
+            fitz.TEXT_PRESERVE_LIGATURES | fitz.TEXT_MEDIABOX_CLIP)
+
+def extract_page_text(page) -> str:
+    """Extract a page's text the way search_for sees it."""
+    return page.get_text("text", flags=search_text_flags())
+
+def extract_page_layout(page, textpage=None, words: bool = True) -> Tuple[str, Optional[List[tuple]]]:
+    """Text and, optionally, words of a page from a single layout extraction.
+
+    The text is identical to what extract_page_text returns. Pass the
+    page's TextPage if one was made already, to reuse it.
+    """
+    if textpage is None:
+        textpage = page.get_textpage(flags=search_text_flags())
+    return textpage.extractText(), textpage.extractWORDS() if words else None
+
+def normalize_text(text: str) -> str:
+    """Case- and whitespace-insensitive form used for containment checks."""
+    return _WHITESPACE.sub(" ", text).casefold()
+
+class TextIndex:
+    """Text of every page of a document, filled in the background and on demand."""
+
+    def __init__(self, page_count: int):
+        self._lock = threading.Lock()
+        self._texts: List[Optional[str]] = [None] * page_count
+        self._normalized: List[Optional[str]] = [None] * page_count
+        self._fields: List[Optional[Dict[str, Optional[str]]]] = [None] * page_count
+        self._fingerprints: List[Optional[str]] = [None] * page_count
+        self._indexed = 0
+
+    @classmethod
+    def from_entries(cls, entries: List[Dict]) -> "TextIndex":
+        """Build a complete index from stored per-page entries."""
+        index = cls(len(entries))
+        for page_idx, entry in enumerate(entries):
+            index.put(page_idx, entry["text"])
+            index.put_fields(page_idx, entry["fields"])
+            index.put_fingerprint(page_idx, entry.get("fingerprint"))
+        return index
+
+    def to_entries(self, fields_from_text: Callable[[str], Dict[str, Optional[str]]]) -> List[Dict]:
+        """Per-page entries of a complete index, for storing."""
+        entries = []
+        for page_idx, text in enumerate(self._texts):
+            fields = self._fields[page_idx]
+            if fields is None:
+                fields = fields_from_text(text)
+                self.put_fields(page_idx, fields)
+            entries.append({"text": text, "fields": fields, "fingerprint": self._fingerprints[page_idx]})
+        return entries
+
+    @property
+    def page_count(self) -> int:
+        return len(self._texts)
+
+    def get(self, page_idx: int) -> Optional[str]:
+        """Text of a 0-based page, or None if not indexed yet."""
+        return self._texts[page_idx]
+
+    def put(self, page_idx: int, text: str) -> None:
+        """Store the text of a 0-based page."""
+        normalized = normalize_text(text)
+        with self._lock:
+            if self._texts[page_idx] is None:
+                self._indexed += 1
+            self._texts[page_idx] = text
+            self._normalized[page_idx] = normalized
+
+    def get_fields(self, page_idx: int) -> Optional[Dict[str, Optional[str]]]:
+        """Extracted fields of a 0-based page, if extracted."""
+        return self._fields[page_idx]
+
+    def put_fields(self, page_idx: int, fields: Dict[str, Optional[str]]) -> None:
+        """Store the extracted fields of a 0-based page."""
+        self._fields[page_idx] = fields
+
+    def normalized(self, page_idx: int) -> Optional[str]:
+        """Text of a 0-based page as normalize_text returns it, if indexed."""
+        return self._normalized[page_idx]
+
+    def get_fingerprint(self, page_idx: int) -> Optional[str]:
+        """Content fingerprint of a 0-based page, if computed."""
+        return self._fingerprints[page_idx]
+
+    def put_fingerprint(self, page_idx: int, fingerprint: Optional[str]) -> None:
+        """Store the content fingerprint of a 0-based page."""
+        self._fingerprints[page_idx] = fingerprint
+
+    def text_for(self, page) -> str:
+        """Text of a page, extracting and indexing it if needed."""
+        text = self._texts[page.number]
+        if text is None:
+            text = extract_page_text(page)
+            self.put(page.number, text)
+        return text
+
+    def may_contain(self, page, query: str) -> bool:
+        """Check whether a page can contain a match for the query.
+
+        A False answer is certain, so callers may skip the page entirely.
+        """
+        self.text_for(page)
+        return normalize_text(query) in self._normalized[page.number]
+
+    def rank_pages(self, query: str) -> Tuple[List[int], List[int]]:
+        """Pages worth searching for a query, best first, and pages not indexed yet.
+
+        Pages with an extracted field equal to the query come first, then
+        the other pages whose indexed text contains it; indexed pages that
+        cannot match are left out altogether.
+        """
+        needle = normalize_text(query)
+        by_field, by_text, unindexed = [], [], []
+        for page_idx, normalized in enumerate(self._normalized):
+            if normalized is None:
+                unindexed.append(page_idx)
+            elif needle in normalized:
+                fields = self._fields[page_idx] or {}
+                if any(value is not None and normalize_text(value) == needle for value in fields.values()):
+                    by_field.append(page_idx)
+                else:
+                    by_text.append(page_idx)
+        return by_field + by_text, unindexed
+
+    def progress(self) -> Tuple[int, int]:
+        """Number of indexed pages and total pages."""
+        return self._indexed, self.page_count
+
+    def is_complete(self) -> bool:
+        return self._indexed == self.page_count
+
+    def memory_size(self) -> int:
+        """Approximate bytes held by the indexed text, fields and fingerprints."""
+        size = 0
+        for strings in (self._texts, self._normalized, self._fingerprints):
+            size += sum(sys.getsizeof(string) for string in strings if string is not None)
+        for fields in self._fields:
+            if fields is not None:
+                size += sys.getsizeof(fields) + sum(sys.getsizeof(value) for value in fields.values() if value)
+        return size
+
+class TextIndexer(threading.Thread):
+    """Background job that indexes a document's pages in page order.
+
+    The job opens its own copy of the document, since a fitz.Document must
+    not be shared between threads, and yields between pages so that it
+    only uses time the foreground leaves over. Given a field extractor, it
+    also extracts each page's fields from the same layout extraction, and
+    it fingerprints every page it indexes.
+    """
+
+    YIELD_SECONDS = 0.0005
+
+    def __init__(self, filepath: str, index: TextIndex,
+                 on_complete: Optional[Callable[[], None]] = None,
+                 extractor: Optional[Any] = None):
+        super().__init__(name="TextIndexer", daemon=True)
+        self.filepath = filepath
+        self.index = index
+        self.extractor = extractor
+        self.on_complete = on_complete
+        self._stop_event = threading.Event()
+
+    def run(self):
+        """Index every page that is not indexed yet."""
+        started = time.perf_counter()
+        try:
+            with MUPDF_LOCK:
+                doc = fitz.open(self.filepath)
+        except Exception as e:
+            logger.error(f"Text indexer could not open {self.filepath}: {e}")
+            return
+
+        fingerprinter = PageFingerprinter(doc)
+        try:
+            for page_idx in range(min(len(doc), self.index.page_count)):
+                if self._stop_event.is_set():
+                    logger.debug(f"Text indexing stopped at page {page_idx + 1}")
+                    return
+                if self.index.get(page_idx) is not None:
+                    continue
+                try:
+                    with MUPDF_LOCK:
+                        page = doc[page_idx]
+                        if self.extractor is None:
+                            self.index.put(page_idx, extract_page_text(page))
+                        else:
+                            text, words = extract_page_layout(page, words=self.extractor.needs_layout)
+                            self.index.put_fields(page_idx, self.extractor.extract(text, words, page.rect))
+                            self.index.put(page_idx, text)
+                        if self.index.get_fingerprint(page_idx) is None:
+                            self.index.put_fingerprint(
+                                page_idx, fingerprinter.fingerprint(page, self.index.normalized(page_idx))
+                            )
+                except Exception as e:
+                    # Left unindexed, so a search extracts it on demand
+                    logger.warning(f"Error indexing page {page_idx + 1}: {e}")
+                time.sleep(self.YIELD_SECONDS)
+
+            logger.info(f"Indexed text of {self.index.page_count} pages in "
+                        f"{time.perf_counter() - started:.2f}s")
+            if self.on_complete is not None and self.index.is_complete():
+                self.on_complete()
+        finally:
+            with MUPDF_LOCK:
+                doc.close()
+
+    def stop(self):
+        """Stop indexing and wait for the thread to finish."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
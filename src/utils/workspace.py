@@ -0,0 +1,388 @@
+"""
+PDF Highlighter 2.0 - Document Workspace
+Last Updated: 2026-10-19 11:07:00 UTC
+Author: 5446-boop
+
+Workspace searches run in a pool of worker processes, since PyMuPDF
+cannot search from several threads of one process at once. A document
+is searched in chunks of pages, each read by a worker from the file on
+disk; the document in memory only differs from it by unsaved highlights,
+which leave the text as it is. Every document has a thread that plans
+its search from the text index, hands its chunks to the pool a few at a
+time and queues the results in page order, so large documents do not
+hold up small ones.
+
+A document whose file changed on disk since it was loaded is searched in
+its thread instead, from the document in memory, taking the handler's
+lock and MUPDF_LOCK one page at a time. So is every document on a machine
+with a single CPU, where worker processes would only add overhead.
+"""
+
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from .bbox_ops import dedupe
+from .edit_journal import pdf_stamp
+from .field_extraction import FieldExtractor, FieldSpec, INVOICE_NUMBER, DELIVERY_NUMBER
+from .pdf_handler import PDFHandler, SearchResult, ANNOT_MODE_RECT, ANNOTATION_MODES
+from .text_index import extract_page_layout, search_text_flags
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()  # Queue marker for a finished document
+
+SEARCH_CHUNK_PAGES = 32  # Pages per job of a full search
+LOOKUP_CHUNK_PAGES = 4  # Pages per job of a lookup, which usually ends early
+WORKER_CACHE_BYTES = 128 * 1024 * 1024  # Files kept open in memory by each search worker
+
+class FileChanged(Exception):
+    """The file on disk is no longer the one a document was loaded from."""
+
+# Runs in the search worker processes, each keeping the files it searched
+# lately open. They are read into memory, as an open file could not be
+# replaced by a save on Windows.
+
+_worker_docs: "OrderedDict[str, Tuple[Dict[str, int], int, object]]" = OrderedDict()
+
+def _worker_document(filepath: str, stamp: Dict[str, int]):
+    """Open document of a file as it was with `stamp`; raises FileChanged if it is not."""
+    entry = _worker_docs.get(filepath)
+    if entry is not None and entry[0] == stamp:
+        _worker_docs.move_to_end(filepath)
+        return entry[2]
+    if entry is not None:
+        _worker_docs.pop(filepath)[2].close()
+    with open(filepath, "rb") as f:
+        data = f.read()
+    if pdf_stamp(filepath) != stamp:
+        raise FileChanged(filepath)
+    doc = fitz.open(stream=data, filetype="pdf")
+    _worker_docs[filepath] = (stamp, len(data), doc)
+    while len(_worker_docs) > 1 and sum(entry[1] for entry in _worker_docs.values()) > WORKER_CACHE_BYTES:
+        _worker_docs.popitem(last=False)[1][2].close()
+    return doc
+
+def _search_page(page, query: str, extractor: FieldExtractor, filepath: str) -> Optional[SearchResult]:
+    """Search one page as PDFHandler does, returning None if it has no match."""
+    textpage = page.get_textpage(flags=search_text_flags())
+    matches = page.search_for(query, textpage=textpage)
+    if not matches:
+        return None
+    text, words = extract_page_layout(page, textpage, extractor.needs_layout)
+    fields = extractor.extract(text, words, page.rect)
+    bboxes = dedupe(matches)
+    return SearchResult(
+        page_num=page.number + 1,
+        text=query,
+        bboxes=bboxes,
+        total_matches=len(bboxes),
+        delivery_number=fields.get(DELIVERY_NUMBER),
+        invoice_number=fields.get(INVOICE_NUMBER),
+        filepath=filepath
+    )
+
+def search_pages_job(filepath: str, stamp: Dict[str, int], query: str, pages: List[int],
+                     fields: List[FieldSpec]) -> List[SearchResult]:
+    """Results of a query on some 0-based pages of a file, in the order given.
+
+    Raises FileChanged if the file's size or modification time are no
+    longer `stamp`.
+    """
+    if pdf_stamp(filepath) != stamp:
+        raise FileChanged(filepath)
+    doc = _worker_document(filepath, stamp)
+    extractor = FieldExtractor(fields)
+    results = []
+    for page_num in pages:
+        try:
+            result = _search_page(doc[page_num], query, extractor, filepath)
+        except Exception as e:
+            logger.warning(f"Error processing page {page_num + 1} of {filepath}: {e}")
+            continue
+        if result is not None:
+            results.append(result)
+    return results
+
+class WorkspaceSearch:
+    """A search running over every document of a workspace.
+
+    Each document is searched in the worker processes as described in the
+    module docstring, or in its thread if there are none, and results are
+    queued as soon as they are found. With a limit, documents are scanned
+    in lookup order and the search stops once that many results were
+    found across all of them.
+    """
+
+    def __init__(self, query: str, handlers: List[PDFHandler], executor: ThreadPoolExecutor,
+                 limit: Optional[int] = None, processes: Optional[ProcessPoolExecutor] = None,
+                 window: int = 1):
+        self.query = query
+        self.limit = limit
+        self._processes = processes
+        self._window = max(1, window)  # Jobs of one document in the pool at a time
+        self._queue: "queue.Queue" = queue.Queue()
+        self._cancelled = threading.Event()
+        self._found = 0
+        self._found_lock = threading.Lock()
+        self._remaining = len(handlers)
+        self.failed: List[str] = []
+        for handler in handlers:
+            executor.submit(self._search_document, handler)
+
+    def _search_document(self, handler: PDFHandler):
+        """Search one document, queueing its results."""
+        try:
+            with handler.lock:  # Only while planning; pages are searched without it
+                if not handler.doc or self._cancelled.is_set():
+                    return
+                filepath, stamp = handler.filepath, handler.loaded_stamp()
+                pages = handler.pages_to_search(self.query, lookup=bool(self.limit))
+                fields = handler.field_extractor.specs
+            left = pages
+            if self._processes is not None and stamp is not None and pdf_stamp(filepath) == stamp:
+                left = self._search_in_processes(filepath, stamp, pages, fields)
+                if left:
+                    logger.info(f"{filepath} changed on disk, searching its last "
+                                f"{len(left)} pages in memory")
+            if left:
+                self._search_in_thread(handler, None if left is pages else left)
+        except Exception as e:
+            logger.error(f"Error searching {handler.filepath}: {e}")
+            self.failed.append(handler.filepath)
+        finally:
+            self._queue.put(_DONE)
+
+    def _search_in_processes(self, filepath: str, stamp: Dict[str, int], pages: List[int],
+                             fields: List[FieldSpec]) -> List[int]:
+        """Search pages in the worker processes; returns those left when the file changed."""
+        size = LOOKUP_CHUNK_PAGES if self.limit else SEARCH_CHUNK_PAGES
+        chunks = deque(pages[i:i + size] for i in range(0, len(pages), size))
+        running: Deque[Tuple[List[int], Future]] = deque()
+        try:
+            while chunks or running:
+                while chunks and len(running) < self._window:
+                    chunk = chunks.popleft()
+                    running.append((chunk, self._processes.submit(
+                        search_pages_job, filepath, stamp, self.query, chunk, fields)))
+                chunk, future = running.popleft()
+                try:
+                    results = future.result()
+                except (FileChanged, BrokenProcessPool) as e:
+                    if isinstance(e, BrokenProcessPool):
+                        logger.error(f"Search workers failed, searching {filepath} in memory")
+                    unsearched = [chunk] + [job[0] for job in running] + list(chunks)
+                    return [page for pages_left in unsearched for page in pages_left]
+                for result in results:
+                    if not self._put(result):
+                        return []
+                if self._cancelled.is_set():
+                    return []
+            return []
+        finally:
+            for _, future in running:
+                future.cancel()
+
+    def _search_in_thread(self, handler: PDFHandler, pages: Optional[List[int]] = None):
+        """Search the document in memory, all of it or some 0-based pages."""
+        if pages is not None:
+            results = handler.iter_search(self.query, pages=[page + 1 for page in pages],
+                                          cancelled=self._cancelled)
+        elif self.limit:
+            results = handler.iter_lookup(self.query, cancelled=self._cancelled)
+        else:
+            results = handler.iter_search(self.query, cancelled=self._cancelled)
+        for result in results:
+            if not self._put(result):
+                return
+
+    def _put(self, result: SearchResult) -> bool:
+        """Queue a result, False once the search is cancelled or its limit reached."""
+        if self._cancelled.is_set() or not self._claim():
+            return False
+        self._queue.put(result)
+        return True
+
+    def _claim(self) -> bool:
+        """Count a found result, False if the limit was already reached."""
+        if not self.limit:
+            return True
+        with self._found_lock:
+            if self._found >= self.limit:
+                self._cancelled.set()
+                return False
+            self._found += 1
+            if self._found >= self.limit:
+                self._cancelled.set()
+            return True
+
+    def is_done(self) -> bool:
+        """Check whether every document has been searched."""
+        return self._remaining == 0
+
+    def drain(self) -> List[SearchResult]:
+        """Take the results queued so far without blocking."""
+        results = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return results
+            if item is _DONE:
+                self._remaining -= 1
+            else:
+                results.append(item)
+
+    def results(self) -> Iterator[SearchResult]:
+        """Yield results as they arrive until every document is searched."""
+        try:
+            while self._remaining:
+                item = self._queue.get()
+                if item is _DONE:
+                    self._remaining -= 1
+                else:
+                    yield item
+        finally:
+            if self._remaining:
+                self.cancel()
+
+    def cancel(self):
+        """Stop the workers at their next page."""
+        self._cancelled.set()
+
+class Workspace:
+    """Set of open documents, each with its own PDFHandler."""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.handlers: "OrderedDict[str, PDFHandler]" = OrderedDict()
+        self.active_path: Optional[str] = None
+        self.annotation_mode = ANNOT_MODE_RECT
+        self.optimize_after_edits = 0
+        self._empty_handler = PDFHandler()
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or min(4, os.cpu_count() or 1),
+            thread_name_prefix="WorkspaceSearch"
+        )
+        # Started by the first search; spawned, as forking a process running Qt is unsafe.
+        # A single CPU gains nothing from them, so searches stay in threads there.
+        self.search_workers = max(1, (os.cpu_count() or 1) - 1)
+        self.use_search_processes = (os.cpu_count() or 1) > 1
+        self.search_processes: Optional[ProcessPoolExecutor] = None
+
+    def open_document(self, filepath: str) -> PDFHandler:
+        """Open a document, or activate it if already open.
+
+        Raises PDFError if the document cannot be loaded.
+        """
+        filepath = os.path.abspath(filepath)
+        handler = self.handlers.get(filepath)
+        if handler is None:
+            handler = PDFHandler(annotation_mode=self.annotation_mode)
+            handler.optimize_after_edits = self.optimize_after_edits
+            handler.load_document(filepath)
+            self.handlers[filepath] = handler
+            logger.info(f"Workspace opened {filepath} ({len(self.handlers)} documents)")
+        self.active_path = filepath
+        return handler
+
+    def close_document(self, filepath: str) -> None:
+        """Close an open document."""
+        filepath = os.path.abspath(filepath)
+        handler = self.handlers.pop(filepath, None)
+        if handler is not None:
+            handler.close()
+        if self.active_path == filepath:
+            self.active_path = next(reversed(self.handlers), None)
+
+    def set_annotation_mode(self, mode: str) -> None:
+        """Write highlights of every document in an annotation mode from now on."""
+        if mode not in ANNOTATION_MODES:
+            raise ValueError(f"Unknown annotation mode: {mode}")
+        self.annotation_mode = mode
+        for handler in self.handlers.values():
+            handler.annotation_mode = mode
+
+    def set_optimize_after_edits(self, edits: int) -> None:
+        """Optimize a document's save once this many edits were saved plainly; 0 never."""
+        self.optimize_after_edits = max(0, edits)
+        for handler in self.handlers.values():
+            handler.optimize_after_edits = self.optimize_after_edits
+
+    def handler_for(self, filepath: Optional[str]) -> Optional[PDFHandler]:
+        """Handler of an open document."""
+        if not filepath:
+            return None
+        return self.handlers.get(os.path.abspath(filepath))
+
+    def set_active(self, filepath: str) -> Optional[PDFHandler]:
+        """Make an open document the active one."""
+        handler = self.handler_for(filepath)
+        if handler is not None:
+            self.active_path = os.path.abspath(filepath)
+        return handler
+
+    def active_handler(self) -> PDFHandler:
+        """Handler of the active document, or an empty one if none is open."""
+        return self.handlers.get(self.active_path) or self._empty_handler
+
+    def text_index_size(self) -> int:
+        """Approximate bytes held by the text indexes of all open documents."""
+        return sum(handler.text_index_size() for handler in list(self.handlers.values()))
+
+    def release_text_indexes(self, needed: int) -> int:
+        """Release text indexes of inactive documents until `needed` bytes are freed.
+
+        Documents opened first go first; the active document keeps its
+        index. Returns the approximate number of bytes released.
+        """
+        released = 0
+        for filepath, handler in list(self.handlers.items()):
+            if released >= needed:
+                break
+            if filepath != self.active_path:
+                released += handler.release_text_index()
+        return released
+
+    def _search_processes(self) -> Optional[ProcessPoolExecutor]:
+        """The search worker pool, None if not used or it cannot be started."""
+        if self.search_processes is None and self.use_search_processes:
+            try:
+                self.search_processes = ProcessPoolExecutor(
+                    max_workers=self.search_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            except (OSError, ValueError) as e:
+                logger.warning(f"Cannot start search workers, searching in threads: {e}")
+        return self.search_processes
+
+    def start_search(self, query: str, limit: Optional[int] = None) -> WorkspaceSearch:
+        """Search all open documents in parallel, stopping after `limit` results if given."""
+        logger.debug(f"Searching {len(self.handlers)} documents for '{query}'")
+        return WorkspaceSearch(query, list(self.handlers.values()), self.executor, limit,
+                               self._search_processes(), self.search_workers)
+
+    def search_all(self, query: str) -> Iterator[SearchResult]:
+        """Yield results from all open documents as they are found."""
+        return self.start_search(query).results()
+
+    def close_all(self) -> None:
+        """Close every document and stop the worker pool."""
+        for handler in self.handlers.values():
+            handler.close()
+        self.handlers.clear()
+        self.active_path = None
+        self.executor.shutdown(wait=True)
+        if self.search_processes is not None:
+            self.search_processes.shutdown(wait=True)
+            self.search_processes = None
+
+    def __len__(self) -> int:
+        return len(self.handlers)
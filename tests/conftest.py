@@ -0,0 +1,57 @@
+"""
+PDF Highlighter 2.0 - Test Fixtures
+Last Updated: 2026-10-19 11:11:08 UTC
+Author: 5446-boop
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+fitz = pytest.importorskip("fitz")
+
+from src.utils.index_store import IndexStore
+from src.utils.pdf_handler import PDFHandler
+
+@pytest.fixture
+def make_pdf(tmp_path):
+    """Write a PDF with one line of text per page; returns its path."""
+    def make(texts, name="doc.pdf"):
+        path = tmp_path / name
+        doc = fitz.open()
+        for text in texts:
+            page = doc.new_page(width=300, height=200)
+            page.insert_text((50, 100), text, fontsize=12)
+        doc.save(str(path))
+        doc.close()
+        return str(path)
+    return make
+
+@pytest.fixture
+def open_handler(tmp_path):
+    """Load PDFs into handlers with a throwaway index store, closed afterwards."""
+    handlers = []
+
+    def open_pdf(path):
+        handler = PDFHandler(IndexStore(str(tmp_path / "index")))
+        handler.load_document(path, background_index=False)
+        handlers.append(handler)
+        return handler
+
+    yield open_pdf
+    for handler in handlers:
+        handler.close()
+
+def highlight_rects(handler, page_num, text):
+    """Bboxes of a text on a 1-based page, as the search results give them."""
+    with handler.lock:
+        page = handler.doc[page_num - 1]
+        return [tuple(rect) for rect in page.search_for(text)]
+
+def annotation_count(handler, page_num):
+    """Number of annotations on a 1-based page of the document in memory."""
+    with handler.lock:
+        return len(list(handler.doc[page_num - 1].annots()))
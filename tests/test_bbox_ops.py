@@ -0,0 +1,74 @@
+"""
+PDF Highlighter 2.0 - Bbox Operation Tests
+Last Updated: 2026-10-19 11:11:39 UTC
+Author: 5446-boop
+"""
+
+import random
+
+import pytest
+
+from src.utils import bbox_ops
+
+np = pytest.importorskip("numpy")
+
+def random_rects(count, seed):
+    """Word-like rects on a few text lines, with touching and repeated ones."""
+    rng = random.Random(seed)
+    rects = []
+    for _ in range(count):
+        line = rng.randrange(5)
+        x0 = rng.randrange(0, 400, 5) + rng.choice([0, 0.25])
+        y0 = 100 + line * 14 + rng.choice([0, 0.5, 1])
+        rects.append((x0, y0, x0 + rng.choice([5, 10, 20]), y0 + 10))
+    return rects + rects[: count // 4]
+
+def both_ways(monkeypatch, function, *args, **kwargs):
+    """Result of a bbox operation with NumPy and in plain Python."""
+    monkeypatch.setattr(bbox_ops, "VECTOR_MIN", 0)
+    vectorized = function(*args, **kwargs)
+    monkeypatch.setattr(bbox_ops, "np", None)
+    plain = function(*args, **kwargs)
+    return vectorized, plain
+
+@pytest.mark.parametrize("seed", range(5))
+def test_dedupe_parity(monkeypatch, seed):
+    rects = random_rects(60, seed)
+    vectorized, plain = both_ways(monkeypatch, bbox_ops.dedupe, rects)
+    assert vectorized == plain
+    assert len(plain) == len(set(plain))
+
+@pytest.mark.parametrize("seed", range(5))
+def test_merge_lines_parity(monkeypatch, seed):
+    rects = random_rects(60, seed)
+    vectorized, plain = both_ways(monkeypatch, bbox_ops.merge_lines, rects)
+    assert vectorized == pytest.approx(plain)
+
+@pytest.mark.parametrize("seed", range(5))
+def test_first_overlap_parity(monkeypatch, seed):
+    rects, others = random_rects(30, seed), random_rects(20, seed + 100)
+    vectorized, plain = both_ways(monkeypatch, bbox_ops.first_overlap, rects, others)
+    assert vectorized == plain
+
+@pytest.mark.parametrize("seed", range(3))
+def test_scale_parity(monkeypatch, seed):
+    vectorized, plain = both_ways(monkeypatch, bbox_ops.scale, random_rects(40, seed), 1.5, 10, 20)
+    assert vectorized == pytest.approx(plain)
+
+@pytest.mark.parametrize("seed", range(3))
+def test_right_of_parity(monkeypatch, seed):
+    vectorized, plain = both_ways(monkeypatch, bbox_ops.right_of, random_rects(40, seed), 2, 40, 3, 8)
+    assert vectorized == pytest.approx(plain)
+
+def test_merge_lines_joins_touching_rects_on_a_line():
+    rects = [(30, 0, 40, 10), (10, 0, 20, 10), (20.5, 0, 30, 10), (10, 50, 20, 60)]
+    assert bbox_ops.merge_lines(rects) == [(10, 0, 40, 10), (10, 50, 20, 60)]
+
+def test_first_overlap_counts_shared_edges():
+    assert bbox_ops.first_overlap([(0, 0, 10, 10), (50, 50, 60, 60)], [(10, 0, 20, 10)]) == [0, -1]
+
+def test_empty_inputs():
+    assert bbox_ops.dedupe([]) == []
+    assert bbox_ops.merge_lines([]) == []
+    assert bbox_ops.first_overlap([], [(0, 0, 1, 1)]) == []
+    assert bbox_ops.first_overlap([(0, 0, 1, 1)], []) == [-1]
@@ -0,0 +1,94 @@
+"""
+PDF Highlighter 2.0 - Edit Journal Tests
+Last Updated: 2026-10-19 11:11:08 UTC
+Author: 5446-boop
+"""
+
+import glob
+import os
+
+from conftest import annotation_count, highlight_rects
+from src.utils.edit_journal import (
+    EditJournal, JournalEntry, OP_HIGHLIGHT, OP_REDO, OP_UNDO, replay_undo
+)
+
+def entry(op, page_num=1):
+    return JournalEntry(op=op, page_num=page_num, timestamp="2026-01-01 00:00:00")
+
+def test_replay_undo_takes_back_and_restores_in_order():
+    first, second = entry(OP_HIGHLIGHT, 1), entry(OP_HIGHLIGHT, 2)
+    done, undone = replay_undo([first, second, entry(OP_UNDO), entry(OP_UNDO), entry(OP_REDO)])
+    assert done == [first]
+    assert undone == [second]
+
+def test_replay_undo_new_edit_ends_redo():
+    first, second = entry(OP_HIGHLIGHT, 1), entry(OP_HIGHLIGHT, 2)
+    done, undone = replay_undo([first, entry(OP_UNDO), second, entry(OP_REDO)])
+    assert done == [second]
+    assert undone == []
+
+def test_replay_undo_ignores_steps_with_nothing_to_step():
+    done, undone = replay_undo([entry(OP_UNDO), entry(OP_REDO)])
+    assert done == [] and undone == []
+
+def test_journal_skips_damaged_last_line(make_pdf):
+    journal = EditJournal(make_pdf(["hello"]))
+    assert journal.append(entry(OP_HIGHLIGHT))
+    journal.close()
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"op":"highlight","page_')
+    assert [e.op for e in journal.read()] == [OP_HIGHLIGHT]
+
+def test_unsaved_edits_are_recovered_on_load(make_pdf, open_handler):
+    path = make_pdf(["hello world", "hello again"])
+    handler = open_handler(path)
+    assert handler.highlight_text(2, highlight_rects(handler, 2, "hello"), (1, 1, 0), "hello")
+    handler.close()  # As after a crash: never saved, journal kept
+    assert os.path.exists(path + EditJournal.SUFFIX)
+
+    recovered = open_handler(path)
+    assert [(e.op, e.page_num) for e in recovered.pending_edits] == [(OP_HIGHLIGHT, 2)]
+    assert annotation_count(recovered, 2) > 0
+    assert annotation_count(recovered, 1) == 0
+
+def test_recovery_keeps_undone_edits_undone(make_pdf, open_handler):
+    path = make_pdf(["hello world"])
+    handler = open_handler(path)
+    assert handler.highlight_text(1, highlight_rects(handler, 1, "hello"), (1, 1, 0), "hello")
+    assert handler.undo() is not None
+    handler.close()
+
+    recovered = open_handler(path)
+    assert recovered.pending_edits == []
+    assert [e.op for e in recovered.undone_edits] == [OP_HIGHLIGHT]
+    assert annotation_count(recovered, 1) == 0
+    assert recovered.redo() is not None
+    assert annotation_count(recovered, 1) > 0
+
+def test_save_writes_edits_and_clears_journal(make_pdf, open_handler):
+    path = make_pdf(["hello world"])
+    handler = open_handler(path)
+    assert handler.highlight_text(1, highlight_rects(handler, 1, "hello"), (1, 1, 0), "hello")
+    assert handler.save()
+    assert not os.path.exists(path + EditJournal.SUFFIX)
+    handler.close()
+
+    reopened = open_handler(path)
+    assert reopened.pending_edits == []
+    assert annotation_count(reopened, 1) > 0
+
+def test_journal_of_changed_pdf_is_set_aside(make_pdf, open_handler):
+    path = make_pdf(["hello world"])
+    handler = open_handler(path)
+    assert handler.highlight_text(1, highlight_rects(handler, 1, "hello"), (1, 1, 0), "hello")
+    handler.close()
+
+    # The file is replaced by another program before the edits are recovered
+    make_pdf(["something else entirely", "and a second page"])
+    recovered = open_handler(path)
+    assert recovered.pending_edits == []
+    assert annotation_count(recovered, 1) == 0
+    assert not os.path.exists(path + EditJournal.SUFFIX)
+    stale = glob.glob(glob.escape(path + EditJournal.SUFFIX + EditJournal.STALE_SUFFIX) + "-*")
+    assert len(stale) == 1
+    assert [e.op for e in EditJournal(path).read()] == []
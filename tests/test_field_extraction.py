@@ -0,0 +1,66 @@
+"""
+PDF Highlighter 2.0 - Field Extraction Tests
+Last Updated: 2026-10-19 11:13:04 UTC
+Author: 5446-boop
+"""
+
+import json
+
+from src.utils.field_extraction import (
+    DEFAULT_FIELDS, DELIVERY_NUMBER, FIELDS_ENV, INVOICE_DATE, INVOICE_NUMBER, TOTAL,
+    FieldExtractor, FieldSpec, default_field_specs
+)
+
+def extract(text, specs=DEFAULT_FIELDS):
+    return FieldExtractor(specs).extract(text)
+
+def test_anchored_values_win():
+    fields = extract("Order 11111111 ref 22222222\nInvoice No: 33333333\nDelivery no. 4444444")
+    assert fields[INVOICE_NUMBER] == "33333333"
+    assert fields[DELIVERY_NUMBER] == "4444444"
+
+def test_value_on_the_line_after_its_label():
+    assert extract("Invoice number\n55555555")[INVOICE_NUMBER] == "55555555"
+
+def test_unanchored_invoice_number_is_the_second_eight_digit_number():
+    assert extract("11111111 and 22222222 and 33333333")[INVOICE_NUMBER] == "22222222"
+    assert extract("only 11111111 here")[INVOICE_NUMBER] == "11111111"
+
+def test_required_anchor_without_label_finds_nothing():
+    fields = extract("12345678 98765432")
+    assert fields[DELIVERY_NUMBER] is None
+    assert fields[TOTAL] is None
+
+def test_last_anchored_total_and_date():
+    fields = extract("Date: 2024-03-01\nSubtotal 1.000,00\nTotal 1.250,00\nTotal amount 2.500,00")
+    assert fields[INVOICE_DATE] == "2024-03-01"
+    assert fields[TOTAL] == "2.500,00"
+
+def test_region_limits_a_field_to_part_of_the_page():
+    spec = FieldSpec("code", r"([A-Z]{3}\d{3})", region=(0.5, 0.0, 1.0, 0.5))
+    words = [  # x0, y0, x1, y1, text, block, line, word
+        (10, 10, 60, 20, "ABC111", 0, 0, 0),
+        (160, 10, 210, 20, "XYZ999", 1, 0, 0),
+        (160, 150, 210, 160, "DEF222", 2, 0, 0),
+    ]
+    extractor = FieldExtractor([spec])
+    assert extractor.needs_layout
+    assert extractor.extract("ABC111 XYZ999 DEF222", words, (0, 0, 300, 200))["code"] == "XYZ999"
+    assert extractor.extract("ABC111 XYZ999 DEF222")["code"] == "ABC111"
+
+def test_signature_changes_with_the_specs():
+    changed = [FieldSpec(INVOICE_NUMBER, r"(\d{6})")]
+    assert FieldExtractor(DEFAULT_FIELDS).signature != FieldExtractor(changed).signature
+    assert FieldExtractor(DEFAULT_FIELDS).signature == FieldExtractor(list(DEFAULT_FIELDS)).signature
+
+def test_specs_from_the_environment(tmp_path, monkeypatch):
+    path = tmp_path / "fields.json"
+    path.write_text(json.dumps([{"name": "po", "pattern": r"PO-(\d+)"}]), encoding="utf-8")
+    monkeypatch.setenv(FIELDS_ENV, str(path))
+    assert FieldExtractor().extract("see PO-42") == {"po": "42"}
+
+    path.write_text("not json", encoding="utf-8")
+    assert default_field_specs() == DEFAULT_FIELDS
+
+    monkeypatch.delenv(FIELDS_ENV)
+    assert default_field_specs() == DEFAULT_FIELDS
@@ -0,0 +1,44 @@
+"""
+PDF Highlighter 2.0 - Content Fingerprint Tests
+Last Updated: 2026-10-19 11:12:19 UTC
+Author: 5446-boop
+"""
+
+import shutil
+
+from src.utils.fingerprint import DuplicateTracker
+
+def test_tracker_reports_repeated_files():
+    tracker = DuplicateTracker()
+    assert tracker.check_file("a.pdf", "f1") is None
+    assert tracker.check_file("a.pdf", "f1") is None  # The same file checked again
+    duplicate = tracker.check_file("b.pdf", "f1")
+    assert (duplicate.filepath, duplicate.original_filepath, duplicate.page_num) == ("b.pdf", "a.pdf", None)
+    assert tracker.check_file("c.pdf", "f2") is None
+
+def test_tracker_reports_repeated_pages():
+    tracker = DuplicateTracker()
+    assert tracker.check_page("a.pdf", 1, "p1") is None
+    assert tracker.check_page("a.pdf", 2, None) is None  # Could not be fingerprinted
+    assert tracker.check_page("b.pdf", 3, None) is None
+    duplicate = tracker.check_page("b.pdf", 4, "p1")
+    assert (duplicate.page_num, duplicate.original_filepath, duplicate.original_page_num) == (4, "a.pdf", 1)
+    assert tracker.counts() == (0, 1)
+    assert tracker.summary() == "0 duplicate files, 1 duplicate pages"
+
+def test_same_page_content_fingerprints_alike(make_pdf, open_handler):
+    first = open_handler(make_pdf(["shared page", "only here"], name="first.pdf"))
+    second = open_handler(make_pdf(["something else", "shared page"], name="second.pdf"))
+    assert first.page_fingerprint(0) == second.page_fingerprint(1)
+    assert first.page_fingerprint(1) != second.page_fingerprint(0)
+    assert first.file_fingerprint() != second.file_fingerprint()
+
+def test_copy_reuses_stored_index(make_pdf, open_handler, tmp_path):
+    original = make_pdf(["hello world", "second page"], name="original.pdf")
+    assert open_handler(original).build_index() == 2
+    copy = str(tmp_path / "copy.pdf")
+    shutil.copyfile(original, copy)
+
+    handler = open_handler(copy)
+    assert handler.duplicate_of == original
+    assert handler.text_index.is_complete()
@@ -0,0 +1,85 @@
+"""
+PDF Highlighter 2.0 - Invoice Split Tests
+Last Updated: 2026-10-19 11:12:04 UTC
+Author: 5446-boop
+"""
+
+import json
+import os
+
+import fitz  # PyMuPDF
+
+from src.utils.field_extraction import FIELDS_ENV
+from src.utils.invoice_split import (
+    MANIFEST_NAME, NO_INVOICE, InvoiceGroup, assign_filenames, group_pages, split_by_invoice
+)
+
+def page_count(path):
+    with fitz.open(path) as doc:
+        return len(doc)
+
+def names(invoice_numbers):
+    groups = [InvoiceGroup(number, page, page) for page, number in enumerate(invoice_numbers, 1)]
+    assign_filenames(groups)
+    return [group.file for group in groups]
+
+def test_group_pages_follows_invoice_numbers():
+    groups = group_pages([
+        (1, None, None),
+        (2, "A1", "D1"),
+        (3, None, "D2"),
+        (4, "A1", "D1"),
+        (5, "B2", None),
+    ])
+    assert [(g.invoice_number, g.first_page, g.last_page) for g in groups] == [
+        (None, 1, 1), ("A1", 2, 4), ("B2", 5, 5)
+    ]
+    assert groups[1].delivery_numbers == ["D1", "D2"]
+    assert groups[1].pages == 3
+
+def test_group_pages_splits_repeated_invoice_runs():
+    groups = group_pages([(1, "A", None), (2, "B", None), (3, "A", None)])
+    assert [(g.invoice_number, g.first_page) for g in groups] == [("A", 1), ("B", 2), ("A", 3)]
+
+def test_filenames_of_pages_without_invoice():
+    groups = group_pages([(1, None, None), (2, None, None), (3, "A", None)])
+    assign_filenames(groups)
+    assert [g.file for g in groups] == [f"{NO_INVOICE}_p1-2.pdf", "A.pdf"]
+
+def test_filenames_are_sanitized():
+    assert names(["INV/2024:001", "..x.."]) == ["INV_2024_001.pdf", "x.pdf"]
+
+def test_repeated_invoice_runs_are_numbered():
+    assert names(["A", "B", "A", "A"]) == ["A.pdf", "B.pdf", "A_2.pdf", "A_3.pdf"]
+
+def test_sanitized_collisions_get_unique_names():
+    assert names(["A/1", "A_1"]) == ["A_1.pdf", "A_1_2.pdf"]
+
+def test_numbered_name_taken_by_another_invoice():
+    assert names(["A", "A_2", "A"]) == ["A.pdf", "A_2.pdf", "A_3.pdf"]
+
+def test_names_differing_only_in_case_collide():
+    assert names(["abc", "ABC"]) == ["abc.pdf", "ABC_2.pdf"]
+
+def test_split_writes_one_file_per_invoice(make_pdf, tmp_path, monkeypatch):
+    monkeypatch.delenv(FIELDS_ENV, raising=False)
+    source = make_pdf([
+        "Invoice No: 10000001",
+        "continued",
+        "Invoice No: 10000002",
+        "Invoice No: 10000001",
+    ], name="batch.pdf")
+    output_dir = str(tmp_path / "split")
+
+    report = split_by_invoice(source, output_dir, workers=1, cache_dir=str(tmp_path / "index"))
+    assert [(g.file, g.pages) for g in report.groups] == [
+        ("10000001.pdf", 2), ("10000002.pdf", 1), ("10000001_2.pdf", 1)
+    ]
+    assert not report.failed
+    assert [page_count(os.path.join(output_dir, g.file)) for g in report.groups] == [2, 1, 1]
+    assert sorted(os.listdir(output_dir)) == sorted(
+        [MANIFEST_NAME, "10000001.pdf", "10000002.pdf", "10000001_2.pdf"])
+    with open(os.path.join(output_dir, MANIFEST_NAME), encoding="utf-8") as f:
+        manifest = json.load(f)
+    assert manifest["pages"] == 4
+    assert [invoice["file"] for invoice in manifest["invoices"]] == [g.file for g in report.groups]
@@ -0,0 +1,51 @@
+"""
+PDF Highlighter 2.0 - Query Cache Tests
+Last Updated: 2026-10-19 11:12:48 UTC
+Author: 5446-boop
+"""
+
+from src.utils.query_cache import QueryCache
+
+def test_edits_make_only_their_pages_stale():
+    cache = QueryCache()
+    cache.mark_page_edited(7)
+    entry = cache.put("query", {0: "a", 3: "b"})
+    assert cache.stale_pages(entry) == []
+
+    cache.mark_page_edited(5)
+    cache.mark_page_edited(2)
+    assert cache.stale_pages(cache.get("query")) == [2, 5]
+
+    # Results stored afterwards are current again
+    assert cache.stale_pages(cache.put("query", {0: "a"})) == []
+
+def test_least_recently_used_query_is_dropped():
+    cache = QueryCache(max_entries=2)
+    cache.put("a", {})
+    cache.put("b", {})
+    cache.get("a")
+    cache.put("c", {})
+    assert len(cache) == 2
+    assert cache.peek("b") is None
+    assert cache.peek("a") is not None and cache.peek("c") is not None
+
+def test_hits_and_misses_are_counted():
+    cache = QueryCache()
+    assert cache.get("a") is None
+    cache.put("a", {})
+    cache.get("a")
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_search_after_edit_reevaluates_edited_page(make_pdf, open_handler):
+    handler = open_handler(make_pdf(["hello a", "hello b", "nothing"]))
+    results = handler.search_text("hello")
+    assert [r.page_num for r in results] == [1, 2]
+
+    assert handler.highlight_text(2, results[1].bboxes, (1, 0, 0), "hello")
+    entry = handler.query_cache.peek(handler._search_key("hello"))
+    assert handler.query_cache.stale_pages(entry) == [1]
+
+    again = handler.search_text("hello")
+    assert [(r.page_num, r.bboxes) for r in again] == [(r.page_num, r.bboxes) for r in results]
+    assert handler.query_cache.hits == 1
+    assert handler.query_cache.stale_pages(handler.query_cache.peek(handler._search_key("hello"))) == []
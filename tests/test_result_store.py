@@ -0,0 +1,63 @@
+"""
+PDF Highlighter 2.0 - Result Store Tests
+Last Updated: 2026-10-19 11:13:00 UTC
+Author: 5446-boop
+"""
+
+import pytest
+
+from src.utils.pdf_handler import SearchResult
+from src.utils.result_store import HitIndex, ResultStore
+
+def result(page_num, bboxes, filepath="a.pdf", **fields):
+    return SearchResult(page_num=page_num, text="hello", bboxes=bboxes,
+                        total_matches=len(bboxes), filepath=filepath, **fields)
+
+def test_rows_round_trip():
+    store = ResultStore()
+    original = result(3, [(1.0, 2.0, 3.0, 4.0), (5.0, 6.0, 7.0, 8.0)],
+                      invoice_number="10000001", delivery_number=None,
+                      highlight_color=(1.0, 1.0, 0.0), annot_xrefs=[12])
+    assert store.append(original) == 0
+    assert store[0] == original
+    assert store[-1] == original
+
+def test_bbox_view_reads_the_store():
+    store = ResultStore()
+    store.extend([result(1, [(1, 2, 3, 4)]), result(2, [(5, 6, 7, 8), (9, 10, 11, 12)])])
+    view = store.bboxes(1)
+    assert len(view) == 2
+    assert view[-1] == (9, 10, 11, 12)
+    assert view.tolist() == [(5, 6, 7, 8), (9, 10, 11, 12)]
+    with pytest.raises(IndexError):
+        view[2]
+
+def test_views_stay_valid_across_chunks(monkeypatch):
+    monkeypatch.setattr(ResultStore, "CHUNK_BBOXES", 4)
+    store = ResultStore()
+    store.append(result(1, [(0, 0, 1, 1)] * 3))
+    first = store.bboxes(0)
+    store.append(result(2, [(2, 2, 3, 3)] * 3))  # Does not fit, starts a new chunk
+    store.append(result(3, [(4, 4, 5, 5)] * 6))  # Larger than a chunk
+    assert first.tolist() == [(0, 0, 1, 1)] * 3
+    assert [len(store.bboxes(row)) for row in range(3)] == [3, 3, 6]
+    assert store.bboxes(2)[5] == (4, 4, 5, 5)
+
+def test_highlights_and_rows_per_file():
+    store = ResultStore()
+    store.extend([result(1, [], "a.pdf"), result(1, [], "b.pdf"), result(2, [], "a.pdf")])
+    assert store.rows_for_file("a.pdf") == [0, 2]
+    assert store.rows_for_file("c.pdf") == []
+    store.set_highlight(2, (1, 0, 0), [7])
+    assert store[2].highlight_color == (1, 0, 0) and store[2].annot_xrefs == [7]
+    store.set_highlight(2, None)
+    assert store[2].highlight_color is None and store[2].annot_xrefs is None
+
+def test_hit_index_orders_hits_by_row():
+    store = ResultStore()
+    store.extend([result(2, [(1, 1, 2, 2), (3, 3, 4, 4)]), result(5, [(5, 5, 6, 6)])])
+    hits = HitIndex(store, range(len(store)))
+    assert len(hits) == 3
+    assert hits[2] == (4, (5, 5, 6, 6))  # 0-based page index
+    assert hits.first_on_page(4) == 2
+    assert hits.first_on_page(0) is None
@@ -0,0 +1,73 @@
+"""
+PDF Highlighter 2.0 - Undo and Redo Tests
+Last Updated: 2026-10-19 11:11:19 UTC
+Author: 5446-boop
+"""
+
+from conftest import annotation_count, highlight_rects
+from src.utils.edit_journal import OP_HIGHLIGHT, OP_REMOVE, replay_undo
+
+def highlight(handler, page_num=1, text="hello"):
+    return handler.highlight_text(page_num, highlight_rects(handler, page_num, text), (1, 1, 0), text)
+
+def test_undo_and_redo_highlight(make_pdf, open_handler):
+    handler = open_handler(make_pdf(["hello world"]))
+    assert highlight(handler)
+    added = annotation_count(handler, 1)
+    assert added > 0
+
+    undone = handler.undo()
+    assert undone.op == OP_HIGHLIGHT
+    assert annotation_count(handler, 1) == 0
+    assert not handler.can_undo() and handler.can_redo()
+
+    assert handler.redo() is undone
+    assert annotation_count(handler, 1) == added
+    assert handler.can_undo() and not handler.can_redo()
+
+def test_undo_removal_restores_highlights(make_pdf, open_handler):
+    handler = open_handler(make_pdf(["hello world"]))
+    assert highlight(handler)
+    added = annotation_count(handler, 1)
+    assert handler.remove_highlight_by_text(1, "hello")
+    assert annotation_count(handler, 1) < added
+
+    assert handler.undo().op == OP_REMOVE
+    assert annotation_count(handler, 1) == added
+
+def test_new_edit_ends_redo(make_pdf, open_handler):
+    handler = open_handler(make_pdf(["hello world", "hello again"]))
+    assert highlight(handler, 1)
+    handler.undo()
+    assert highlight(handler, 2)
+    assert not handler.can_redo()
+    assert handler.redo() is None
+
+def test_nothing_to_undo_or_redo(make_pdf, open_handler):
+    handler = open_handler(make_pdf(["hello world"]))
+    assert handler.undo() is None
+    assert handler.redo() is None
+
+def test_failed_redo_stays_undone(make_pdf, open_handler, monkeypatch):
+    handler = open_handler(make_pdf(["hello world"]))
+    assert highlight(handler)
+    entry = handler.undo()
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("cannot apply")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(handler, "_apply_edit", fail)
+        assert handler.redo() is None
+    assert handler.undone_edits == [entry]
+    assert handler.pending_edits == []
+    assert annotation_count(handler, 1) == 0
+
+    # The journal cancels the failed redo, so a recovery would not apply it
+    done, undone = replay_undo(handler.journal.read())
+    assert done == []
+    assert [e.op for e in undone] == [OP_HIGHLIGHT]
+
+    # And it can be tried again
+    assert handler.redo() is entry
+    assert annotation_count(handler, 1) > 0